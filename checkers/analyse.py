@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from checkers.engine import VARIANTS, move_to_text, position_from_fen, position_to_fen
+from checkers.pdn import read_games
+from checkers.search import Search, SearchLimits
+from checkers.tt import shared_table
+
+
+# ............................................. batch analysis ..........................................
+# Analyses many stored positions without the window:
+#
+#   python -m checkers.analyse positions.txt --depth 8 > evaluations.jsonl
+#   python -m checkers.analyse games.pdn --movetime 200 --workers 8
+#   python -m checkers.analyse positions10x10.txt --variant international
+#
+# Positions are read from a file or stdin, one FEN per line, or from a PDN file (every
+# position of every game, played with the variant of its GameType header).  They are
+# searched by a pool of worker processes and one JSON line per position is written to
+# stdout in input order.  Only a few positions per worker are in flight at any time, so
+# memory stays flat however long the input is.
+def analyse(item, depth, movetime, hash_mb=16, multipv=1):
+    """
+    This function runs in a worker process and analyses a single position.
+
+    Args:
+        item (tuple): (id, fen, variant name) of the position
+        depth (int): deepest iteration, None for no limit
+        movetime (float): seconds per position, None for no limit
+        hash_mb (int): size of the transposition table of the worker process
+        multipv (int): number of best moves to report, under "lines" if above 1
+
+    Returns:
+        dict: the JSON record of the position
+    """
+    key, fen, variant = item
+    try:
+        position = position_from_fen(fen, VARIANTS[variant])
+    except ValueError as error:
+        return {"id": key, "input": fen, "error": str(error)}
+
+    search = Search(
+        position, SearchLimits(depth=depth, movetime=movetime), tt=shared_table(hash_mb),
+        multipv=multipv,
+    )
+    score, move, pv = search.run()
+    stats = search.stats
+    record = {
+        "id": key,
+        "fen": fen,
+        "best": move_to_text(move) if move is not None else None,
+        "score": score,
+        "depth": stats.iterations[-1]["depth"] if stats.iterations else 0,
+        "nodes": stats.nodes,
+        "time": round(stats.time, 4),
+        "pv": [move_to_text(move) for move in pv],
+    }
+    if multipv > 1:
+        record["lines"] = [
+            {
+                "move": move_to_text(line[0]),
+                "score": score,
+                "pv": [move_to_text(move) for move in line],
+            }
+            for score, line in search.lines
+        ]
+    return record
+
+
+def read_fens(stream, variant="checkers"):
+    # yields (line number, fen, variant) for every non-empty line that is not a # comment
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield number, line, variant
+
+
+def read_pdn_positions(stream):
+    # yields ("game:ply", fen, variant) for the position before every move of every game
+    for index, game in enumerate(read_games(stream), 1):
+        try:
+            for ply, (position, move) in enumerate(game.positions()):
+                yield "%d:%d" % (index, ply), position_to_fen(position), game.variant.name
+        except ValueError as error:
+            print("game %d: %s" % (index, error), file=sys.stderr)
+
+
+def analyse_all(items, workers, depth, movetime, window=4, hash_mb=16, multipv=1):
+    """
+    This generator analyses positions in a process pool and yields the records in input
+    order, keeping at most window positions per worker in flight.
+
+    Args:
+        items (iterable): (id, fen, variant name) of the positions, read lazily
+        workers (int): number of worker processes
+        depth (int): deepest iteration, None for no limit
+        movetime (float): seconds per position, None for no limit
+        window (int): positions in flight per worker
+        hash_mb (int): size of the transposition table of every worker process
+        multipv (int): number of best moves to report for every position
+
+    Yields:
+        dict: the record of every position
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(analyse, item, depth, movetime, hash_mb, multipv))
+            if len(pending) >= workers * window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Analyse FEN positions or PDN games and print one JSON line per position."
+    )
+    parser.add_argument("input", nargs="?", default="-",
+                        help="file of FEN lines or a .pdn file (default: stdin)")
+    parser.add_argument("--pdn", action="store_true", help="read the input as PDN")
+    parser.add_argument("--variant", choices=sorted(VARIANTS), default="checkers",
+                        help="rules of FEN input (PDN games carry their own)")
+    parser.add_argument("--depth", type=int, help="search depth per position")
+    parser.add_argument("--movetime", type=int, help="milliseconds per position")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: one per core)")
+    parser.add_argument("--hash-mb", type=int, default=16,
+                        help="megabytes of transposition table per worker (default 16)")
+    parser.add_argument("--multipv", type=int, default=1,
+                        help="report this many best moves per position (default 1)")
+    args = parser.parse_args()
+    if args.depth is None and args.movetime is None:
+        args.depth = 6
+
+    stream = sys.stdin if args.input == "-" else open(args.input)
+    pdn = args.pdn or args.input.lower().endswith(".pdn")
+    items = read_pdn_positions(stream) if pdn else read_fens(stream, args.variant)
+    movetime = args.movetime / 1000 if args.movetime is not None else None
+
+    try:
+        for record in analyse_all(items, args.workers, args.depth, movetime,
+                                  hash_mb=args.hash_mb, multipv=args.multipv):
+            sys.stdout.write(json.dumps(record) + "\n")
+            sys.stdout.flush()
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import math
+import time
+import tracemalloc
+from checkers.engine import AI, generate_moves, iter_moves, position_from_fen
+from checkers.search import Search, SearchLimits, minimax
+from checkers.tt import TranspositionTable
+
+
+# ............................................ benchmark positions ..........................................
+# The start position and three positions reached by seeded random play (early, middle and
+# late game), all with the AI to move.
+BENCH_POSITIONS = [
+    "W:W1,2,3,4,5,6,7,8,9,10,11,12:B21,22,23,24,25,26,27,28,29,30,31,32",
+    "W:W1,3,4,6,7,8,9,10,11,13,16:B18,21,23,24,25,26,27,28,29,31,32",
+    "W:W1,2,3,4,5,8,9,12,13,15,K23:B6,16,17,19,20,25,28,29,30,31",
+    "W:W4,6,10,12,13,24:BK2,8,9,18,21,25,26,30,31",
+]
+
+
+# ................................................. expansion ................................................
+def counting(expand, counter):
+    # wraps a move generator so every move it hands out is counted
+    def counted(position, color):
+        for move in expand(position, color):
+            counter[0] += 1
+            yield move
+
+    return counted
+
+
+def counting_eager(counter):
+    # wraps generate_moves so every move it builds is counted, used or not
+    def counted(position, color):
+        moves = generate_moves(position, color)
+        counter[0] += len(moves)
+        return moves
+
+    return counted
+
+
+def run(fen, depth, expand):
+    # searches a benchmark position and returns its score and best move
+    position = position_from_fen(fen)
+    return minimax(position, depth, position.turn == AI, -math.inf, math.inf, expand)
+
+
+def measure(fen, depth, expand, repeat):
+    # returns the best wall time of a search over several runs
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(fen, depth, expand)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def allocations(fen, depth, expand):
+    # returns the peak traced memory of one search in bytes (move lists or generator frames)
+    tracemalloc.start()
+    run(fen, depth, expand)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+# ................................................. multi-PV ...............................................
+def multipv_cost(fen, depth, multipv):
+    # returns the seconds and nodes of a search to a fixed depth, with a table of its own
+    search = Search(position_from_fen(fen), SearchLimits(depth=depth),
+                    tt=TranspositionTable(16), multipv=multipv)
+    start = time.perf_counter()
+    search.run()
+    return time.perf_counter() - start, search.nodes
+
+
+def multipv_overhead(depth, multipv):
+    # prints what finding the multipv best moves costs over the best one at the same depth
+    print("%-4s %12s %12s %12s %12s %10s" % (
+        "pos", "1-PV ms", "%d-PV ms" % multipv, "1-PV nodes", "%d-PV nodes" % multipv,
+        "overhead"))
+    totals = [0.0, 0.0, 0, 0]
+    for index, fen in enumerate(BENCH_POSITIONS, 1):
+        single_time, single_nodes = multipv_cost(fen, depth, 1)
+        multi_time, multi_nodes = multipv_cost(fen, depth, multipv)
+        print("%-4d %12.1f %12.1f %12d %12d %9.0f%%" % (
+            index, single_time * 1000, multi_time * 1000, single_nodes, multi_nodes,
+            100 * (multi_time / single_time - 1)))
+        totals[0] += single_time
+        totals[1] += multi_time
+        totals[2] += single_nodes
+        totals[3] += multi_nodes
+    print("total: %.1f ms for 1 PV, %.1f ms for %d (%.0f%% more time, %.0f%% more nodes)" % (
+        totals[0] * 1000, totals[1] * 1000, multipv, 100 * (totals[1] / totals[0] - 1),
+        100 * (totals[3] / totals[2] - 1)))
+
+
+# .................................................. main ..................................................
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare eager and lazy move expansion on the benchmark positions."
+    )
+    parser.add_argument("--depth", type=int, default=6, help="search depth (default 6)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per position")
+    parser.add_argument("--multipv", type=int,
+                        help="measure the cost of this many best moves over one instead")
+    args = parser.parse_args()
+    if args.multipv:
+        multipv_overhead(args.depth, args.multipv)
+        return
+
+    print("%-4s %10s %10s %10s %10s %10s %10s" % (
+        "pos", "eager ms", "lazy ms", "eager mv", "lazy mv", "eager peak", "lazy peak"))
+    totals = [0.0, 0.0, 0, 0]
+    for index, fen in enumerate(BENCH_POSITIONS, 1):
+        # both expansions must pick the same move, only the cost differs
+        assert run(fen, args.depth, generate_moves) == run(fen, args.depth, iter_moves)
+
+        eager_time = measure(fen, args.depth, generate_moves, args.repeat)
+        lazy_time = measure(fen, args.depth, iter_moves, args.repeat)
+
+        eager_moves = [0]
+        lazy_moves = [0]
+        run(fen, args.depth, counting_eager(eager_moves))
+        run(fen, args.depth, counting(iter_moves, lazy_moves))
+
+        eager_peak = allocations(fen, args.depth, generate_moves)
+        lazy_peak = allocations(fen, args.depth, iter_moves)
+
+        print("%-4d %10.1f %10.1f %10d %10d %10.1f %10.1f" % (
+            index, eager_time * 1000, lazy_time * 1000, eager_moves[0], lazy_moves[0],
+            eager_peak / 1024, lazy_peak / 1024))
+        totals[0] += eager_time
+        totals[1] += lazy_time
+        totals[2] += eager_moves[0]
+        totals[3] += lazy_moves[0]
+
+    print("total: %.1f ms eager, %.1f ms lazy (%.0f%% saved); %d moves generated eagerly, "
+          "%d lazily (%.0f%% saved)" % (
+              totals[0] * 1000, totals[1] * 1000, 100 * (1 - totals[1] / totals[0]),
+              totals[2], totals[3], 100 * (1 - totals[3] / totals[2])))
+
+
+if __name__ == "__main__":
+    main()
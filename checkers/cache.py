@@ -0,0 +1,178 @@
+import hashlib
+import queue
+import sqlite3
+import sys
+import threading
+from checkers.engine import VARIANTS, generate_moves
+
+
+# ............................................. analysis cache .............................................
+# Remembers the AI's searches across sessions, so a position analysed in an earlier game is
+# answered at once instead of searched again: the opening moves of every game and the
+# endgames that keep coming back.
+#
+# The results live in an SQLite file, one row per position keyed by the variant and the
+# Zobrist hash, with the depth searched, the score for the side to move, the best move and
+# a fingerprint of the evaluation that searched it.  Rows of another evaluation, from before
+# checkers.tune rewrote the weights or with another network, are deleted when the file is
+# loaded and never played.
+# Nothing touches the disk on the caller's thread: a thread of the cache first loads the
+# rows of earlier sessions into a dict, then writes new results in batches of one
+# transaction each.  Lookups only read the dict, and a position looked up before the rows
+# are loaded is simply a miss.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis (
+    variant TEXT NOT NULL,
+    hash INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    score REAL NOT NULL,
+    move INTEGER NOT NULL,
+    evaluation TEXT NOT NULL,
+    PRIMARY KEY (variant, hash)
+) WITHOUT ROWID
+"""
+# a row is only replaced by a search at least as deep, or by one of another evaluation
+UPSERT = """
+INSERT INTO analysis VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (variant, hash) DO UPDATE
+SET depth = excluded.depth, score = excluded.score, move = excluded.move,
+    evaluation = excluded.evaluation
+WHERE excluded.depth >= analysis.depth OR excluded.evaluation != analysis.evaluation
+"""
+BATCH = 64  # results written in one transaction
+FLUSH_SECONDS = 2.0  # a smaller batch is written once no result came for this long
+
+
+class AnalysisCache:
+    """
+    Search results of earlier sessions and this one, saved to an SQLite file in the
+    background.
+
+    Args:
+        path (str): the SQLite file, created if needed
+        network (checkers.nnue.Network): the network the searches evaluate with, None for
+            the weights of the variant
+    """
+
+    def __init__(self, path, network=None):
+        self.path = path
+        # the evaluation of every variant, taken when the cache is opened
+        self.fingerprints = {
+            name: fingerprint(variant, network if network is not None
+                              and network.variant is variant else None)
+            for name, variant in VARIANTS.items()
+        }
+        self.entries = {}  # (variant name, hash) -> (depth, score, move)
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()  # rows to write, None once closed
+        self.ready = threading.Event()  # set once the rows of earlier sessions are loaded
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def lookup(self, position, depth=0):
+        """
+        This function looks up the saved result of a position.
+
+        Args:
+            position (Position): the board state
+            depth (int): the least depth the result must have been searched to
+
+        Returns:
+            (int, float, int): the depth, the score for the side to move and the best
+            move, or None if the position has no result that deep
+        """
+        entry = self.entries.get((position.variant.name, position.hash))
+        if entry is None or entry[0] < depth:
+            return None
+        # another position with the same hash would be very unlucky, but cheap to rule out
+        if entry[2] not in generate_moves(position, position.turn):
+            return None
+        return entry
+
+    def record(self, position, depth, score, move):
+        # saves the result of a search unless the position already has a deeper one
+        key = (position.variant.name, position.hash)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > depth:
+                return
+            self.entries[key] = (depth, score, move)
+        self.queue.put((key[0], to_signed(key[1]), depth, score, move,
+                        self.fingerprints[key[0]]))
+
+    def close(self):
+        # writes the results not saved yet and stops the thread
+        self.queue.put(None)
+        self.thread.join()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _run(self):
+        # loads the earlier sessions, then writes batches until closed
+        try:
+            connection = sqlite3.connect(self.path)
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(analysis)")]
+            if columns and "evaluation" not in columns:
+                # a file of before the fingerprints: nothing says what evaluated its rows
+                with connection:
+                    connection.execute("DROP TABLE analysis")
+            connection.execute(SCHEMA)
+            with connection:
+                for name, evaluation in self.fingerprints.items():
+                    connection.execute(
+                        "DELETE FROM analysis WHERE variant = ? AND evaluation != ?",
+                        (name, evaluation),
+                    )
+            rows = connection.execute("SELECT variant, hash, depth, score, move FROM analysis")
+            for variant, key, depth, score, move in rows:
+                key = (variant, key & 0xFFFFFFFFFFFFFFFF)
+                with self.lock:
+                    # this session may have searched the position deeper already
+                    entry = self.entries.get(key)
+                    if entry is None or entry[0] < depth:
+                        self.entries[key] = (depth, score, move)
+        except sqlite3.Error as error:
+            print("analysis cache %s: %s, results are not saved" % (self.path, error),
+                  file=sys.stderr)
+            connection = None
+        self.ready.set()
+
+        batch = []
+        while True:
+            try:
+                row = self.queue.get(timeout=FLUSH_SECONDS if batch else None)
+            except queue.Empty:
+                row = False  # quiet for a while: write what there is
+            if row:
+                batch.append(row)
+            if batch and (not row or len(batch) >= BATCH):
+                self._write(connection, batch)
+                batch = []
+            if row is None:
+                break
+        if connection is not None:
+            connection.close()
+
+    def _write(self, connection, batch):
+        if connection is None:
+            return
+        try:
+            with connection:
+                connection.executemany(UPSERT, batch)
+        except sqlite3.Error as error:
+            print("analysis cache %s: %s" % (self.path, error), file=sys.stderr)
+
+
+def fingerprint(variant, network=None):
+    # a digest of what the evaluation of a variant depends on: its weights, and the network
+    # when one evaluates instead
+    evaluation = repr(variant.weights)
+    if network is not None:
+        evaluation += repr((network.rows, network.base, network.w2, network.b2))
+    return hashlib.sha1(evaluation.encode()).hexdigest()[:16]
+
+
+def to_signed(key):
+    # SQLite integers are signed 64-bit, hashes are unsigned
+    return key - (1 << 64) if key >= 1 << 63 else key
@@ -1,8 +0,0 @@
-# ........................................ default theme...............................................
-AI_KEY = (255, 255, 255)  # white
-HUMAN_KEY = (0, 0, 0)  # black
-BACK_COLOR_1 = (225, 193, 110)  # brass
-BACK_COLOR_2 = (204, 119, 34)  # ochre
-VALID_DOT = (40, 99, 183)  # blue
-GREY = (128, 128, 128)  # grey
-# .....................................................................................................
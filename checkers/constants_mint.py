@@ -1,8 +0,0 @@
-# ........................................ default theme...............................................
-AI_KEY = (255, 255, 255)  # white
-HUMAN_KEY = (0, 0, 0)  # black
-BACK_COLOR_1 = (50, 205, 50)  # lime green
-BACK_COLOR_2 = (144, 238, 144)  # light green
-VALID_DOT = (40, 99, 183)  # blue
-GREY = (128, 128, 128)  # grey
-# .....................................................................................................
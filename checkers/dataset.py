@@ -0,0 +1,294 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import time
+import uuid
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from checkers.difficulty import SELFPLAY, SELFPLAY_OPENING_PLIES, DifficultySearch
+from checkers.engine import AI, DRAW, HUMAN, VARIANTS, Position
+from checkers.game import GameState
+
+
+# .............................................. training data ..............................................
+# Positions of self-play games, stored for tuning and learning evaluations:
+#
+#   python -m checkers.dataset data/ --games 2000 --workers 8
+#
+# A shard file is a 16 byte header followed by records of 32 bytes, so record i is at
+# HEADER.size + i * RECORD.size and a reader maps the file and reads any record without
+# looking at the ones before it:
+#   header   b"CKDS", format version, board size, record size
+#   record   bitboards of the AI's pieces, the human's pieces and the kings (3 x uint64),
+#            the search score for the side to move in thousandths of a man (int32), the
+#            side to move (uint8) and the result of the game for the side to move, 1 a win,
+#            0 a tie and -1 a loss (int8), then two bytes of padding
+#
+# Every writer names its shards after a random id of its own and writes each one to a
+# temporary file that is renamed into place once it is complete, so any number of generator
+# processes can write into one directory without coordinating, and readers never see a
+# half-written shard.
+MAGIC = b"CKDS"
+VERSION = 1
+HEADER = struct.Struct("<4sHHH6x")
+RECORD = struct.Struct("<QQQiBbxx")
+SCORE_SCALE = 1000
+SHARD_RECORDS = 1 << 16  # records per shard, 2 MB
+
+
+class ShardWriter:
+    """
+    Writes records to shards of a fixed number of records in a directory.
+
+    Args:
+        directory (str): where the shards go, created if needed
+        variant (Variant): the board size of the positions
+        records (int): records per shard
+    """
+
+    def __init__(self, directory, variant, records=SHARD_RECORDS):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.variant = variant
+        self.records = records
+        self.prefix = "%s-%s" % (variant.name, uuid.uuid4().hex[:16])  # unique to this writer
+        self.shards = 0  # shards completed
+        self.file = None
+        self.path = None
+        self.count = 0  # records in the open shard
+
+    def write(self, position, score, result):
+        # appends a position with the search score and the game result for its side to move
+        if self.file is None:
+            self.path = os.path.join(
+                self.directory, "%s-%05d.bin" % (self.prefix, self.shards)
+            )
+            self.file = open(self.path + ".part", "wb")
+            self.file.write(HEADER.pack(MAGIC, VERSION, self.variant.rows, RECORD.size))
+        self.file.write(RECORD.pack(
+            position.pieces[AI],
+            position.pieces[HUMAN],
+            position.kings,
+            int(round(score * SCORE_SCALE)),
+            position.turn,
+            result,
+        ))
+        self.count += 1
+        if self.count == self.records:
+            self.finish()
+
+    def finish(self):
+        # completes the open shard, if any, and moves it into place
+        if self.file is None:
+            return
+        self.file.close()
+        os.replace(self.path + ".part", self.path)
+        self.file = None
+        self.count = 0
+        self.shards += 1
+
+    def close(self):
+        self.finish()
+
+
+class Shard:
+    """
+    A shard mapped into memory, indexed like a list of records.
+
+    Every record is a tuple (AI pieces, human pieces, kings, score, side to move, result)
+    with the score in men and the score and result for the side to move.
+
+    Args:
+        path (str): the shard file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size:
+            raise ValueError("%s: not a shard" % path)
+        magic, version, size, record_size = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise ValueError("%s: not a shard of format %d" % (path, VERSION))
+        variants = [variant for variant in VARIANTS.values() if variant.rows == size]
+        if not variants:
+            raise ValueError("%s: no variant is played on a %dx%d board" % (path, size, size))
+        self.variant = variants[0]
+        self.length = (len(self.map) - HEADER.size) // RECORD.size
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("record %d of %d" % (index, self.length))
+        ai, human, kings, score, turn, result = RECORD.unpack_from(
+            self.map, HEADER.size + index * RECORD.size
+        )
+        return ai, human, kings, score / SCORE_SCALE, turn, result
+
+    def position(self, index):
+        # returns the Position of a record
+        ai, human, kings, score, turn, result = self[index]
+        position = Position(setup=False, variant=self.variant)
+        position.pieces = [ai, human]
+        position.kings = kings
+        position.turn = turn
+        position.rehash()
+        return position
+
+    def as_array(self):
+        # returns the records as a NumPy structured array over the mapped file, no copy;
+        # the shard cannot be closed while the array is in use
+        import numpy
+
+        dtype = numpy.dtype([
+            ("ai", "<u8"), ("human", "<u8"), ("kings", "<u8"), ("score", "<i4"),
+            ("turn", "u1"), ("result", "i1"), ("padding", "V2"),
+        ])
+        return numpy.frombuffer(self.map, dtype=dtype, count=self.length, offset=HEADER.size)
+
+    def close(self):
+        self.map.close()
+
+
+class Dataset:
+    """
+    Every complete shard of some directories or files, indexed as one list of records.
+
+    Args:
+        paths (list): shard files and directories of shards
+    """
+
+    def __init__(self, paths):
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                files.extend(
+                    os.path.join(path, name) for name in sorted(os.listdir(path))
+                    if name.endswith(".bin")
+                )
+            else:
+                files.append(path)
+        self.shards = [Shard(path) for path in files]
+        self.ends = []  # index one past the last record of every shard
+        total = 0
+        for shard in self.shards:
+            total += len(shard)
+            self.ends.append(total)
+
+    def __len__(self):
+        return self.ends[-1] if self.ends else 0
+
+    def locate(self, index):
+        # returns the shard of a record and the index of the record in it
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("record %d of %d" % (index, len(self)))
+        shard = bisect_right(self.ends, index)
+        return self.shards[shard], index - (self.ends[shard - 1] if shard else 0)
+
+    def __getitem__(self, index):
+        shard, index = self.locate(index)
+        return shard[index]
+
+    def position(self, index):
+        shard, index = self.locate(index)
+        return shard.position(index)
+
+    def __iter__(self):
+        for shard in self.shards:
+            for index in range(len(shard)):
+                yield shard[index]
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+
+# ................................................ generator ...............................................
+def generate(directory, games, variant_name, seed, records=SHARD_RECORDS):
+    """
+    This function plays self-play games and writes their positions, in a worker process.
+
+    Args:
+        directory (str): where the shards go
+        games (int): games to play
+        variant_name (str): the variant to play
+        seed (int): seed of the openings and the searches
+        records (int): records per shard
+
+    Returns:
+        int: the positions written
+    """
+    variant = VARIANTS[variant_name]
+    rng = random.Random(seed)
+    writer = ShardWriter(directory, variant, records)
+    written = 0
+    try:
+        for _ in range(games):
+            game = GameState(variant=variant)
+            for _ in range(SELFPLAY_OPENING_PLIES):
+                if game.is_over():
+                    break
+                game.play(rng.choice(game.legal_moves()))
+            searched = []  # (position, score for the side to move)
+            while not game.is_over():
+                search = DifficultySearch(game.position, SELFPLAY, rng.getrandbits(64))
+                score, move = search.choose(rng)
+                searched.append((game.position.copy(), score))
+                game.play(move)
+            result = game.result()
+            for position, score in searched:
+                writer.write(position, score, 0 if result == DRAW else (
+                    1 if result == position.turn else -1))
+            written += len(searched)
+    finally:
+        writer.close()
+    return written
+
+
+# .................................................. main ..................................................
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write the positions of self-play games to binary shards."
+    )
+    parser.add_argument("directory", help="directory of the shards")
+    parser.add_argument("--games", type=int, default=100, help="games per worker (default 100)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="generator processes (default: one per core)")
+    parser.add_argument("--variant", choices=sorted(VARIANTS), default="checkers")
+    parser.add_argument("--shard-records", type=int, default=SHARD_RECORDS,
+                        help="records per shard (default %d)" % SHARD_RECORDS)
+    parser.add_argument("--seed", type=int, help="seed of the first worker (default: random)")
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.getrandbits(32)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        written = sum(pool.map(
+            generate,
+            [args.directory] * args.workers,
+            [args.games] * args.workers,
+            [args.variant] * args.workers,
+            range(seed, seed + args.workers),
+            [args.shard_records] * args.workers,
+        ))
+    elapsed = time.perf_counter() - start
+    print("%d positions of %d games in %.0f s" % (
+        written, args.games * args.workers, elapsed))
+
+    dataset = Dataset([args.directory])
+    print("%s now holds %d positions in %d shards" % (
+        args.directory, len(dataset), len(dataset.shards)))
+    dataset.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import math
+import random
+from checkers.engine import make_move, unmake_move
+from checkers.search import Search, SearchLimits
+
+MASK64 = (1 << 64) - 1
+
+
+# ............................................... difficulty ...............................................
+# A difficulty level gives the AI a budget of nodes per move instead of a depth.  A depth
+# costs a handful of nodes in a quiet position and a hundred times more in a tactical one,
+# a node budget costs about the same everywhere, so every move of a level takes about the
+# same time.  The weaker levels also see a noisy evaluation and play any of the moves that
+# score nearly as well as the best one, so they make human mistakes rather than only
+# shallow ones.
+class Difficulty:
+    """
+    The search limits and the handicaps of one difficulty level.
+
+    Args:
+        name (str): the name shown in the menu
+        nodes (int): nodes the search may visit for one move
+        depth (int): deepest iteration, None for no limit but the nodes
+        noise (float): most the evaluation of a position is moved up or down, in men
+        margin (float): moves scoring within this of the best one are played as often as
+            the best one, in men
+        cache_depth (int): least depth a saved search must have reached to be played
+            instead of searching, about what the nodes reach; the depth limit if None
+    """
+
+    def __init__(self, name, nodes, depth=None, noise=0.0, margin=0.0, cache_depth=None):
+        self.name = name
+        self.nodes = nodes
+        self.depth = depth
+        self.noise = noise
+        self.margin = margin
+        self.cache_depth = cache_depth or depth
+
+    def limits(self):
+        return SearchLimits(depth=self.depth, nodes=self.nodes)
+
+    def __repr__(self):
+        return "Difficulty(%r)" % self.name
+
+
+# The levels of the start menu.  Easy searches a few dozen nodes, well under a millisecond
+# of CPU a move, Impossible about half a second, which reaches depth 8 to 9 in most
+# positions.
+PROFILES = {
+    "Easy": Difficulty("Easy", nodes=30, depth=2, noise=1.0, margin=0.75),
+    "Medium": Difficulty("Medium", nodes=1500, noise=0.35, margin=0.25),
+    "Impossible": Difficulty("Impossible", nodes=40000, cache_depth=8),
+}
+
+# The searches of self-play games played for training data: cheap, and noisy enough that
+# no two games are the same.  Every game starts with a few random plies as well.
+SELFPLAY = Difficulty("Self-play", nodes=400, noise=0.1, margin=0.05)
+SELFPLAY_OPENING_PLIES = 4
+
+
+class DifficultySearch(Search):
+    """
+    A Search handicapped by a difficulty level.  Its evaluation is noisy, and it keeps every
+    root move of the deepest completed iteration that scores within the margin of the best,
+    so choose() can play any of them.  Unlike Search, run() returns the best move of that
+    iteration even when a root move of the unfinished one beat it, so the best move and the
+    candidates always come from the same iteration.
+
+    The searches of a level must not share a transposition table with full-strength
+    searches, their scores are not the true ones.
+
+    Args:
+        position (Position): the board state to search, restored before run() returns
+        difficulty (Difficulty): the level to play at
+        seed (int): picks the noise, the same seed gives every position the same noise
+        token (CancelToken): stops the search when cancelled, a token of its own if None
+    """
+
+    def __init__(self, position, difficulty, seed=0, token=None):
+        Search.__init__(self, position, difficulty.limits(), token=token)
+        self.difficulty = difficulty
+        self.seed = seed
+        self.candidates = []  # (score, move) near the best of the deepest completed iteration
+
+    def evaluate(self):
+        # the static evaluation for the side to move, moved by the noise of the position
+        score = Search.evaluate(self)
+        noise = self.difficulty.noise
+        if noise:
+            # the noise only depends on the position and the seed, so a position met twice
+            # in the tree is scored the same both times
+            mixed = (self.position.hash ^ self.seed) * 0x9E3779B97F4A7C15 & MASK64
+            score += ((mixed >> 11) / (1 << 53) * 2 - 1) * noise
+        return score
+
+    def root(self, moves, depth):
+        # Search.root with the window of every move lowered by the margin, so the moves
+        # that score near the best one get their exact score instead of a bound.  Only the
+        # first iteration reports its best move so far to run() when it is stopped, there
+        # are no candidates yet to disagree with it
+        position = self.position
+        margin = self.difficulty.margin
+        alpha = -math.inf
+        scores = []
+        self.pv_table[0] = []
+        self.root_best = None
+        self.stats.expanded += 1
+        self.stats.children += len(moves)
+        for move in moves:
+            make_move(position, move)
+            score = -self.negamax(depth - 1, 1, -math.inf, -(alpha - margin))
+            unmake_move(position)
+            scores.append((score, move))
+            if score > alpha:
+                alpha = score
+                self.pv_table[0] = [move] + self.pv_table[1]
+                if not self.stats.iterations:
+                    self.root_best = (alpha, self.pv_table[0])
+        # moves scored below the window are only bounds, and at most alpha - margin
+        self.candidates = [(score, move) for score, move in scores if score > alpha - margin]
+        return alpha
+
+    def choose(self, rng=random):
+        """
+        This function searches the position and picks the move to play.
+
+        Args:
+            rng (random.Random): the source of the random choice
+
+        Returns:
+            (float, int): the score for the side to move and the packed move, None if the
+            side to move is stuck
+        """
+        score, move, pv = self.run()
+        if self.difficulty.margin and self.candidates:
+            return rng.choice(self.candidates)
+        return score, move
+
+
+def choose_move(position, difficulty, rng=random, token=None, cache=None):
+    """
+    This function picks the move the AI plays at a difficulty level.  A level without
+    handicaps plays the move of the cache when the position has been searched before, at
+    least as deep as the level's cache_depth, and saves what it searches to the cache;
+    the noisy levels leave the cache alone.
+
+    Args:
+        position (Position): the board state, restored before the function returns
+        difficulty (Difficulty): the level to play at
+        rng (random.Random): the source of the noise and of the random choice
+        token (CancelToken): stops the search early when cancelled
+        cache (checkers.cache.AnalysisCache): results of earlier searches, None for none
+
+    Returns:
+        (float, int): the score for the side to move and the packed move, None if the side
+        to move is stuck
+    """
+    if difficulty.noise or difficulty.margin:
+        cache = None
+    if cache is not None and difficulty.cache_depth is not None:
+        entry = cache.lookup(position, difficulty.cache_depth)
+        if entry is not None:
+            return entry[1], entry[2]
+    search = DifficultySearch(position, difficulty, rng.getrandbits(64), token)
+    score, move = search.choose(rng)
+    # a search cut short by the token is shallower than the level, and is not saved
+    if cache is not None and move is not None and search.stats.iterations and not search.stopped:
+        cache.record(position, search.stats.iterations[-1]["depth"], score, move)
+    return score, move
@@ -0,0 +1,720 @@
+# ........................................ engine ..................................................
+# Headless checkers engine: a bitboard position, compact integer moves and make/unmake.
+#
+# Only the dark squares are playable, so they are numbered row by row starting from the
+# AI's back rank (row 0 of the window): 0..31 on the 8x8 board, 0..49 on the 10x10 one.
+# Every bitboard is a plain int with one bit per playable square.
+#
+# The board size and the rules come from the Variant of the position.  CHECKERS plays the
+# rules the window has always enforced:
+#   - men move one square diagonally forwards, kings in every direction
+#   - capturing is optional
+#   - a capture can be continued by further captures in the same vertical direction and the
+#     player may stop on any landing square of the chain
+#   - a man that finishes its move on the far row is crowned
+# INTERNATIONAL plays 10x10 international draughts with flying kings.
+# ..................................................................................................
+import json
+import os
+import random
+from array import array
+
+# Sides of the game.  The AI starts on the top rows and moves down the board, the human starts
+# on the bottom rows, moves up and plays first.
+AI, HUMAN = 0, 1
+DRAW = 2
+
+# Diagonal directions as (row step, col step)
+UP_LEFT, UP_RIGHT, DOWN_LEFT, DOWN_RIGHT = 0, 1, 2, 3
+DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+# Directions a man of each side may move in
+FORWARD = {AI: (DOWN_LEFT, DOWN_RIGHT), HUMAN: (UP_LEFT, UP_RIGHT)}
+ALL_DIRECTIONS = (UP_LEFT, UP_RIGHT, DOWN_LEFT, DOWN_RIGHT)
+
+# Features of the evaluation, each counted as the AI's pieces minus the human's:
+#   man        men
+#   king       kings
+#   back_row   men still guarding their own back row
+#   centre     pieces on the central squares
+#   advanced   men in the opponent's half of the board
+FEATURES = ("man", "king", "back_row", "centre", "advanced")
+
+# Tuned evaluation weights, written by checkers.tune and loaded when the engine is imported
+WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "weights.json")
+
+# Directions a capture chain may continue in after jumping in a given direction
+CONTINUE = {
+    UP_LEFT: (UP_LEFT, UP_RIGHT),
+    UP_RIGHT: (UP_LEFT, UP_RIGHT),
+    DOWN_LEFT: (DOWN_LEFT, DOWN_RIGHT),
+    DOWN_RIGHT: (DOWN_LEFT, DOWN_RIGHT),
+}
+
+
+# ......................................... geometry ...............................................
+def is_playable(row, col):
+    # pieces only ever stand on the dark squares
+    return (row + col) % 2 == 1
+
+
+class Variant:
+    """
+    The board size and the rules a game is played with.
+
+    Every table the move generator needs is computed once here, so generating moves on a
+    bigger board costs no more per piece than on the 8x8 one.
+
+    Args:
+        name (str): the name the variant is chosen by
+        size (int): rows and columns of the board
+        start_rows (int): rows of men each side starts on
+        international (bool): play international rules instead of the ones of the window:
+            flying kings, men capturing backwards, the longest capture is compulsory and a
+            side that cannot move loses
+        king_value (float): worth of a king, a man being worth 1; the evaluation weighs
+            kings by it until tuned weights are loaded
+        game_type (int): the PDN GameType of the variant, None if there is none
+        draw_plies (int): plies without a capture or a man move after which the game is a tie
+    """
+
+    def __init__(self, name, size, start_rows, international=False, king_value=1.5,
+                 game_type=None, draw_plies=80):
+        self.name = name
+        self.rows = self.cols = size
+        self.squares = size * size // 2
+        self.start_rows = start_rows
+        self.international = international
+        self.stuck_loses = international  # otherwise the game is a tie once a side is stuck
+        self.king_value = king_value
+        self.game_type = game_type
+        self.draw_plies = draw_plies
+        # International FEN calls the side that moves first White
+        self.side_letter = {AI: "B", HUMAN: "W"} if international else {AI: "W", HUMAN: "B"}
+        self.letter_side = {letter: side for side, letter in self.side_letter.items()}
+        # English PDN numbers the 8x8 board from the back rank of the side that moves
+        # first, Black; the engine numbers it from the AI's, so PDN text is rotated
+        self.pdn_rotated = not international
+
+        # neighbour and jump target of every square in every direction, and the ray of
+        # squares a flying king sweeps, nearest first
+        self.neighbour = [[-1] * self.squares for _ in DIRECTIONS]
+        self.jump = [[-1] * self.squares for _ in DIRECTIONS]
+        self.rays = [[()] * self.squares for _ in DIRECTIONS]
+        for square in range(self.squares):
+            row, col = self.square_to_row_col(square)
+            for direction, (dr, dc) in enumerate(DIRECTIONS):
+                ray = []
+                step = 1
+                while self.row_col_to_square(row + step * dr, col + step * dc) >= 0:
+                    ray.append(self.row_col_to_square(row + step * dr, col + step * dc))
+                    step += 1
+                self.rays[direction][square] = tuple(ray)
+                self.neighbour[direction][square] = ray[0] if ray else -1
+                self.jump[direction][square] = ray[1] if len(ray) > 1 else -1
+
+        # bitboards of the rows a man of each side is crowned on
+        self.crown_row = {AI: self._row_mask(size - 1), HUMAN: self._row_mask(0)}
+        self.start = {
+            AI: sum(self._row_mask(row) for row in range(start_rows)),
+            HUMAN: sum(self._row_mask(row) for row in range(size - start_rows, size)),
+        }
+
+        # bitboards of the positional evaluation features
+        half = size // 2
+        self.back_row = {AI: self._row_mask(0), HUMAN: self._row_mask(size - 1)}
+        self.advanced = {
+            AI: sum(self._row_mask(row) for row in range(half, size)),
+            HUMAN: sum(self._row_mask(row) for row in range(half)),
+        }
+        self.centre = sum(
+            1 << self.row_col_to_square(row, col)
+            for row in (half - 1, half)
+            for col in range(size // 4, size - size // 4)
+            if is_playable(row, col)
+        )
+        self.set_weights({"man": 1.0, "king": king_value})
+
+        # Zobrist keys of a man and a king of each side on every square, indexed by
+        # color * 2 + king, and of the AI being to move.  They come from a fixed seed so
+        # every process hashes a position the same way.
+        rng = random.Random("zobrist %d" % size)
+        self.zobrist = [[rng.getrandbits(64) for _ in range(self.squares)] for _ in range(4)]
+        self.zobrist_turn = rng.getrandbits(64)
+
+    def row_col_to_square(self, row, col):
+        # returns the square number of a playable (row, col), or -1 for a light square.
+        if not (0 <= row < self.rows and 0 <= col < self.cols) or not is_playable(row, col):
+            return -1
+        return row * (self.cols // 2) + col // 2
+
+    def square_to_row_col(self, square):
+        # returns the (row, col) of a square number.
+        row = square // (self.cols // 2)
+        col = (square % (self.cols // 2)) * 2 + (1 - row % 2)
+        return row, col
+
+    def between(self, origin, destination):
+        # returns the bitboard of the squares strictly between two squares of a diagonal
+        for direction in ALL_DIRECTIONS:
+            ray = self.rays[direction][origin]
+            if destination in ray:
+                return sum(1 << square for square in ray[: ray.index(destination)])
+        return 0
+
+    def set_weights(self, weights):
+        # sets the evaluation weights from {feature: weight}, features left out weigh 0
+        self.weights = tuple(float(weights.get(feature, 0.0)) for feature in FEATURES)
+        # with material weights only the evaluation skips the positional features
+        self.positional = any(self.weights[2:])
+
+    def _row_mask(self, row):
+        # returns the bitboard of every playable square of a row
+        return sum(
+            1 << self.row_col_to_square(row, col)
+            for col in range(self.cols)
+            if is_playable(row, col)
+        )
+
+
+# The game of the window, and 10x10 international draughts
+CHECKERS = Variant("checkers", 8, 3)
+INTERNATIONAL = Variant(
+    "international", 10, 4, international=True, king_value=3.0, game_type=20, draw_plies=50
+)
+VARIANTS = {variant.name: variant for variant in (CHECKERS, INTERNATIONAL)}
+
+
+def load_weights(path=WEIGHTS_FILE):
+    # sets the evaluation weights of every variant in a weights file written by
+    # checkers.tune, {variant name: {"weights": {feature: weight}, ...}}; variants it
+    # leaves out keep theirs
+    with open(path) as file:
+        data = json.load(file)
+    for name, entry in data.items():
+        if name in VARIANTS:
+            VARIANTS[name].set_weights(entry["weights"])
+
+
+# the engine plays with the tuned weights whenever checkers.tune has written them
+if os.path.exists(WEIGHTS_FILE):
+    load_weights()
+
+
+def iter_squares(bitboard):
+    # yields the square number of every bit set in a bitboard, lowest first
+    while bitboard:
+        low = bitboard & -bitboard
+        yield low.bit_length() - 1
+        bitboard ^= low
+
+
+# ......................................... moves ..................................................
+# A move is packed into a single int:
+#   bits 0-5   origin square
+#   bits 6-11  destination square
+#   bits 12-   bitboard of the captured squares
+def encode_move(origin, destination, captures=0):
+    return origin | destination << 6 | captures << 12
+
+
+def move_from(move):
+    return move & 63
+
+
+def move_to(move):
+    return move >> 6 & 63
+
+
+def move_captures(move):
+    return move >> 12
+
+
+def is_capture(move):
+    return move >> 12 != 0
+
+
+# ......................................... position ...............................................
+class Position:
+    def __init__(self, setup=True, variant=CHECKERS):
+        self.variant = variant  # board size and rules
+        self.pieces = [0, 0]  # bitboards of the AI and the HUMAN pieces
+        self.kings = 0  # bitboard of every king, whichever side it belongs to
+        self.turn = HUMAN  # side to move
+        self.undo_stack = []  # (move, captured kings, promoted, quiet plies) of every move made
+        self.hash = 0  # Zobrist hash, kept up to date by make_move and unmake_move
+        self.history = array("Q")  # hashes of the positions before every move made
+        self.quiet_plies = 0  # plies since the last capture or man move
+        self.accumulator = None  # the first layer of a checkers.nnue network, if one follows the moves
+        if setup:
+            self.create_board()
+
+    def create_board(self):
+        # places the men of each side on their first rows
+        self.pieces = [self.variant.start[AI], self.variant.start[HUMAN]]
+        self.rehash()
+
+    def put(self, square, color, king=False):
+        # places a piece of the given side on an empty square
+        self.pieces[color] |= 1 << square
+        if king:
+            self.kings |= 1 << square
+        self.hash ^= self.variant.zobrist[color * 2 + king][square]
+
+    def set_turn(self, color):
+        # sets the side to move of a position being set up
+        if color != self.turn:
+            self.turn = color
+            self.hash ^= self.variant.zobrist_turn
+
+    def rehash(self):
+        # computes the Zobrist hash from scratch
+        keys = self.variant.zobrist
+        self.hash = self.variant.zobrist_turn if self.turn == AI else 0
+        for color in (AI, HUMAN):
+            for square in iter_squares(self.pieces[color]):
+                self.hash ^= keys[color * 2 + bool(self.kings & (1 << square))][square]
+
+    def piece_at(self, square):
+        # returns (side, king) of the piece on a square, or None if it is empty
+        bit = 1 << square
+        for color in (AI, HUMAN):
+            if self.pieces[color] & bit:
+                return color, bool(self.kings & bit)
+        return None
+
+    def count(self, color):
+        return self.pieces[color].bit_count()
+
+    def king_count(self, color):
+        return (self.pieces[color] & self.kings).bit_count()
+
+    def copy(self):
+        # returns an independent copy of the position without its undo history
+        position = Position(setup=False, variant=self.variant)
+        position.pieces = list(self.pieces)
+        position.kings = self.kings
+        position.turn = self.turn
+        # the hashes of earlier positions are kept to recognise repetitions
+        position.hash = self.hash
+        position.history = array("Q", self.history)
+        position.quiet_plies = self.quiet_plies
+        return position
+
+
+# ........................................ generation ...............................................
+def _iter_capture_chains(variant, square, directions, opponent, empty, captured, origin):
+    # yields every capture sequence that continues from square; each landing square of a
+    # chain is a legal place to stop, so every one of them is a move of its own.
+    for direction in directions:
+        over = variant.neighbour[direction][square]
+        land = variant.jump[direction][square]
+        if land < 0 or not opponent & (1 << over) or not empty & (1 << land):
+            continue
+        chain = captured | 1 << over
+        yield encode_move(origin, land, chain)
+        yield from _iter_capture_chains(
+            variant, land, CONTINUE[direction], opponent, empty, chain, origin
+        )
+
+
+def iter_moves(position, color):
+    """
+    This function lazily yields every legal move of a side in a position, captures first.
+
+    Nothing is generated ahead of the move being asked for, so when the search cuts off
+    after the first few moves the remaining ones are never built.  Under international
+    rules only the longest captures are legal, so all of them are found before the first
+    one is yielded.
+
+    Args:
+        position (Position): the current board state, must not change while iterating
+        color (int): AI or HUMAN
+
+    Yields:
+        int: the packed moves
+    """
+    if position.variant.international:
+        return _iter_international_moves(position, color)
+    return _iter_checkers_moves(position, color)
+
+
+def _iter_checkers_moves(position, color):
+    # the moves under the rules of the window
+    variant = position.variant
+    neighbour = variant.neighbour
+    jump = variant.jump
+    own = position.pieces[color]
+    opponent = position.pieces[1 - color]
+    empty = ~(own | opponent)
+    kings = position.kings
+    forward = FORWARD[color]
+
+    # captures
+    for square in iter_squares(own):
+        directions = ALL_DIRECTIONS if kings & (1 << square) else forward
+        for direction in directions:
+            target = neighbour[direction][square]
+            if target < 0 or not opponent & (1 << target):
+                continue
+            land = jump[direction][square]
+            if land >= 0 and empty & (1 << land):
+                chain = 1 << target
+                yield encode_move(square, land, chain)
+                yield from _iter_capture_chains(
+                    variant, land, CONTINUE[direction], opponent, empty, chain, square
+                )
+
+    # quiet moves
+    for square in iter_squares(own):
+        directions = ALL_DIRECTIONS if kings & (1 << square) else forward
+        for direction in directions:
+            target = neighbour[direction][square]
+            if target >= 0 and empty & (1 << target):
+                yield encode_move(square, target)
+
+
+def _international_captures(variant, origin, square, king, opponent, empty, captured, found):
+    # adds every complete capture sequence continuing from square to found.  Captured
+    # pieces stay on the board until the move is over: they cannot be jumped twice and
+    # block the way, and the square the piece left is free to pass or land on.
+    extended = False
+    if king:
+        for direction in ALL_DIRECTIONS:
+            ray = variant.rays[direction][square]
+            index = 0
+            while index < len(ray) and empty & (1 << ray[index]):
+                index += 1
+            if index + 1 >= len(ray):
+                continue
+            over = 1 << ray[index]
+            if not opponent & over or captured & over:
+                continue
+            # a flying king may land on any empty square behind the captured piece
+            index += 1
+            while index < len(ray) and empty & (1 << ray[index]):
+                extended = True
+                _international_captures(
+                    variant, origin, ray[index], True, opponent, empty, captured | over, found
+                )
+                index += 1
+    else:
+        for direction in ALL_DIRECTIONS:
+            land = variant.jump[direction][square]
+            if land < 0 or not empty & (1 << land):
+                continue
+            over = 1 << variant.neighbour[direction][square]
+            if opponent & over and not captured & over:
+                extended = True
+                _international_captures(
+                    variant, origin, land, False, opponent, empty, captured | over, found
+                )
+    if not extended and captured:
+        found.add(encode_move(origin, square, captured))
+
+
+def _iter_international_moves(position, color):
+    # the moves under international rules
+    variant = position.variant
+    own = position.pieces[color]
+    opponent = position.pieces[1 - color]
+    empty = ~(own | opponent)
+    kings = position.kings
+
+    # capturing is compulsory and so is taking the most pieces
+    found = set()
+    for square in iter_squares(own):
+        _international_captures(
+            variant, square, square, kings & (1 << square), opponent,
+            empty | 1 << square, 0, found
+        )
+    if found:
+        most = max((move >> 12).bit_count() for move in found)
+        for move in found:
+            if (move >> 12).bit_count() == most:
+                yield move
+        return
+
+    # quiet moves: men step forwards, kings fly along the empty diagonals
+    for square in iter_squares(own):
+        if kings & (1 << square):
+            for direction in ALL_DIRECTIONS:
+                for target in variant.rays[direction][square]:
+                    if not empty & (1 << target):
+                        break
+                    yield encode_move(square, target)
+        else:
+            for direction in FORWARD[color]:
+                target = variant.neighbour[direction][square]
+                if target >= 0 and empty & (1 << target):
+                    yield encode_move(square, target)
+
+
+def generate_moves(position, color):
+    """
+    This function generates every legal move of a side in a position.
+
+    Args:
+        position (Position): the current board state
+        color (int): AI or HUMAN
+
+    Returns:
+        list: the packed moves, captures first
+    """
+    return list(iter_moves(position, color))
+
+
+def has_moves(position, color):
+    # returns True as soon as a single legal move of the side is found
+    variant = position.variant
+    own = position.pieces[color]
+    opponent = position.pieces[1 - color]
+    empty = ~(own | opponent)
+    # under international rules men capture backwards as well
+    capture_directions = ALL_DIRECTIONS if variant.international else FORWARD[color]
+    for square in iter_squares(own):
+        king = position.kings & (1 << square)
+        for direction in ALL_DIRECTIONS if king else capture_directions:
+            target = variant.neighbour[direction][square]
+            if target < 0:
+                continue
+            if empty & (1 << target):
+                if king or direction in FORWARD[color]:
+                    return True
+                continue
+            land = variant.jump[direction][square]
+            if land >= 0 and opponent & (1 << target) and empty & (1 << land):
+                return True
+    return False
+
+
+# ......................................... notation ..............................................
+# Positions are written in the FEN of Portable Draughts Notation, e.g. "B:W1,2,K3:B21,22".
+# Squares are numbered from 1 starting at the AI's back rank.  On the 8x8 board the AI plays
+# White and the human Black; in international draughts the human, who moves first, is White.
+# 8x8 PDN files number the squares from the other side, checkers.pdn turns them around.
+def position_from_fen(fen, variant=CHECKERS):
+    # returns the Position described by a FEN string; raises ValueError if it is malformed.
+    # Runs of squares may be written as ranges, e.g. "W:W31-50:B1-20".
+    letter_side = variant.letter_side
+    fields = fen.strip().strip('"').split(":")
+    if len(fields) != 3 or fields[0].upper() not in letter_side:
+        raise ValueError("not a FEN position: %r" % fen)
+
+    position = Position(setup=False, variant=variant)
+    position.set_turn(letter_side[fields[0].upper()])
+    for field in fields[1:]:
+        color = letter_side.get(field[:1].upper())
+        if color is None:
+            raise ValueError("not a FEN position: %r" % fen)
+        for token in field[1:].split(","):
+            token = token.strip().rstrip(".")
+            if not token:
+                continue
+            king = token[0].upper() == "K"
+            if king:
+                token = token[1:]
+            first, _, last = token.partition("-")
+            last = last or first
+            if not (first.isdigit() and last.isdigit()
+                    and 1 <= int(first) <= int(last) <= variant.squares):
+                raise ValueError("bad square %r in FEN %r" % (token, fen))
+            for square in range(int(first) - 1, int(last)):
+                if position.piece_at(square) is None:
+                    position.put(square, color, king)
+    return position
+
+
+def position_to_fen(position):
+    # returns the FEN string of a position
+    side_letter = position.variant.side_letter
+    fields = [side_letter[position.turn]]
+    for color in sorted(side_letter, key=side_letter.get, reverse=True):
+        squares = [
+            ("K" if position.kings & (1 << square) else "") + str(square + 1)
+            for square in iter_squares(position.pieces[color])
+        ]
+        fields.append(side_letter[color] + ",".join(squares))
+    return ":".join(fields)
+
+
+def move_to_text(move):
+    # returns the PDN text of a move, "9-13" for a quiet move and "9x18" for a capture
+    separator = "x" if move >> 12 else "-"
+    return "%d%s%d" % ((move & 63) + 1, separator, (move >> 6 & 63) + 1)
+
+
+def move_from_text(position, text, moves=None):
+    # returns the legal move of the side to move written as text; raises ValueError if
+    # there is none.  Intermediate squares of a capture ("9x18x27") narrow down chains that
+    # end on the same square.  moves are the legal moves, if the caller has them already.
+    squares = text.strip().replace("x", "-").split("-")
+    if len(squares) < 2 or not all(square.isdigit() for square in squares):
+        raise ValueError("not a move: %r" % text)
+    squares = [int(square) - 1 for square in squares]
+
+    candidates = [
+        move
+        for move in (iter_moves(position, position.turn) if moves is None else moves)
+        if move & 63 == squares[0] and move >> 6 & 63 == squares[-1]
+    ]
+    if len(candidates) > 1 and len(squares) > 2:
+        # keep the chains that capture a piece between every two squares given
+        for origin, destination in zip(squares, squares[1:]):
+            between = position.variant.between(origin, destination)
+            candidates = [move for move in candidates if move >> 12 & between]
+    if not candidates:
+        raise ValueError("illegal move: %r" % text)
+    return candidates[0]
+
+
+# ....................................... make / unmake ...........................................
+def make_move(position, move):
+    # plays a move on the position in place; unmake_move takes it back.
+    origin = move & 63
+    destination = move >> 6 & 63
+    captures = move >> 12
+    color = position.turn
+    origin_bit = 1 << origin
+    destination_bit = 1 << destination
+    keys = position.variant.zobrist
+    piece = color * 2
+
+    position.history.append(position.hash)
+    quiet_plies = position.quiet_plies
+    position.pieces[color] ^= origin_bit | destination_bit
+    promoted = False
+    king = position.kings & origin_bit
+    if king:
+        position.kings ^= origin_bit | destination_bit
+        position.hash ^= keys[piece + 1][origin] ^ keys[piece + 1][destination]
+        position.quiet_plies = 0 if captures else quiet_plies + 1
+    else:
+        if destination_bit & position.variant.crown_row[color]:
+            position.kings |= destination_bit
+            promoted = True
+        position.hash ^= keys[piece][origin] ^ keys[piece + promoted][destination]
+        position.quiet_plies = 0
+
+    captured_kings = position.kings & captures
+    if captures:
+        position.pieces[1 - color] &= ~captures
+        position.kings &= ~captures
+        opponent = (1 - color) * 2
+        for square in iter_squares(captures):
+            position.hash ^= keys[opponent + bool(captured_kings & (1 << square))][square]
+
+    position.undo_stack.append((move, captured_kings, promoted, quiet_plies))
+    position.turn = 1 - color
+    position.hash ^= position.variant.zobrist_turn
+    if position.accumulator is not None:
+        position.accumulator.make(color, origin, destination, bool(king), promoted, captures,
+                                  captured_kings)
+
+
+def unmake_move(position):
+    # takes back the last move made on the position.
+    move, captured_kings, promoted, position.quiet_plies = position.undo_stack.pop()
+    position.hash = position.history.pop()
+    color = 1 - position.turn
+    position.turn = color
+    origin_bit = 1 << (move & 63)
+    destination_bit = 1 << (move >> 6 & 63)
+    captures = move >> 12
+
+    position.pieces[color] ^= origin_bit | destination_bit
+    if promoted:
+        position.kings &= ~destination_bit
+    elif position.kings & destination_bit:
+        position.kings ^= origin_bit | destination_bit
+
+    if captures:
+        position.pieces[1 - color] |= captures
+        position.kings |= captured_kings
+
+    if position.accumulator is not None:
+        position.accumulator.unmake()
+    return move
+
+
+# ......................................... draw rules ..............................................
+def repetitions(position):
+    # returns how many times the current position occurred before.  Only positions since
+    # the last capture or man move can repeat, and only every other one has the same side
+    # to move.
+    history = position.history
+    start = max(len(history) - position.quiet_plies, 0)
+    return history[start:][-2::-2].count(position.hash)
+
+
+def is_draw(position):
+    # returns True if the game is a tie by threefold repetition or by the number of plies
+    # played without a capture or a man move
+    return (
+        position.quiet_plies >= position.variant.draw_plies
+        or position.quiet_plies >= 4 and repetitions(position) >= 2
+    )
+
+
+# ........................................ evaluation ...............................................
+def features(position):
+    # returns the evaluation features of a position in the order of FEATURES
+    variant = position.variant
+    kings = position.kings
+    ai, human = position.pieces
+    ai_men = ai & ~kings
+    human_men = human & ~kings
+    return (
+        ai_men.bit_count() - human_men.bit_count(),
+        (ai & kings).bit_count() - (human & kings).bit_count(),
+        (ai_men & variant.back_row[AI]).bit_count()
+        - (human_men & variant.back_row[HUMAN]).bit_count(),
+        (ai & variant.centre).bit_count() - (human & variant.centre).bit_count(),
+        (ai_men & variant.advanced[AI]).bit_count()
+        - (human_men & variant.advanced[HUMAN]).bit_count(),
+    )
+
+
+def evaluate(position):  # returns the score of the AI player.
+    variant = position.variant
+    weights = variant.weights
+    kings = position.kings
+    ai, human = position.pieces
+    ai_kings = (ai & kings).bit_count()
+    human_kings = (human & kings).bit_count()
+    score = weights[0] * (
+        ai.bit_count() - ai_kings - human.bit_count() + human_kings
+    ) + weights[1] * (ai_kings - human_kings)
+    if variant.positional:
+        ai_men = ai & ~kings
+        human_men = human & ~kings
+        back_row = variant.back_row
+        advanced = variant.advanced
+        centre = variant.centre
+        score += (
+            weights[2] * ((ai_men & back_row[AI]).bit_count()
+                          - (human_men & back_row[HUMAN]).bit_count())
+            + weights[3] * ((ai & centre).bit_count() - (human & centre).bit_count())
+            + weights[4] * ((ai_men & advanced[AI]).bit_count()
+                            - (human_men & advanced[HUMAN]).bit_count())
+        )
+    return score
+
+
+def winner(position):
+    #  returns the winner of the game if it is over, and None otherwise.
+    if not position.pieces[AI]:
+        return HUMAN
+    elif not position.pieces[HUMAN]:
+        return AI
+    if is_draw(position):
+        return DRAW
+    if position.variant.stuck_loses:
+        if not has_moves(position, position.turn):
+            return 1 - position.turn
+    elif not has_moves(position, HUMAN) or not has_moves(position, AI):
+        return DRAW
+    return None
+
+
+# ..................................................................................................
@@ -0,0 +1,73 @@
+from checkers.engine import (
+    DRAW,
+    CHECKERS,
+    Position,
+    generate_moves,
+    make_move,
+    move_from_text,
+    move_to_text,
+    position_from_fen,
+    position_to_fen,
+    winner,
+)
+
+
+# ............................................... GameState ..........................................
+class GameState:
+    """
+    A game without a window: the position, the moves played so far and the result.
+
+    Args:
+        fen (str): the starting position, the normal start if None
+        max_plies (int): plies after which an unfinished game is called a tie
+        variant (Variant): the board size and rules
+    """
+
+    def __init__(self, fen=None, max_plies=200, variant=CHECKERS):
+        self.start_fen = fen
+        self.variant = variant
+        self.position = position_from_fen(fen, variant) if fen else Position(variant=variant)
+        self.moves = []  # packed moves in the order they were played
+        self.max_plies = max_plies
+
+    @property
+    def turn(self):
+        return self.position.turn
+
+    def legal_moves(self):
+        return generate_moves(self.position, self.position.turn)
+
+    def play(self, move):
+        # plays a packed move or a move written in PDN text; raises ValueError if illegal
+        if isinstance(move, str):
+            move = move_from_text(self.position, move)
+        elif move not in self.legal_moves():
+            raise ValueError("illegal move: %s" % move_to_text(move))
+        make_move(self.position, move)
+        self.moves.append(move)
+        return move
+
+    def result(self):
+        # returns AI, HUMAN or DRAW once the game is over, and None otherwise
+        result = winner(self.position)
+        if result is None and len(self.moves) >= self.max_plies:
+            return DRAW
+        return result
+
+    def is_over(self):
+        return self.result() is not None
+
+    def fen(self):
+        return position_to_fen(self.position)
+
+    def to_dict(self):
+        # returns the state of the game as plain JSON-friendly values
+        result = self.result()
+        letters = {**self.variant.side_letter, DRAW: "draw", None: None}
+        return {
+            "fen": self.fen(),
+            "to_move": letters[self.position.turn],
+            "moves": [move_to_text(move) for move in self.moves],
+            "legal": [move_to_text(move) for move in self.legal_moves()],
+            "result": letters[result],
+        }
@@ -0,0 +1,410 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+from checkers.analyse import analyse
+from checkers.engine import (
+    VARIANTS,
+    generate_moves,
+    iter_squares,
+    move_to_text,
+    position_from_fen,
+    position_to_fen,
+    winner,
+)
+from checkers.search import MAX_PLY, WIN_SCORE
+
+
+# ............................................... HTTP service ...............................................
+# The engine behind a small HTTP/1.1 JSON API, for web front-ends:
+#
+#   python -m checkers.httpapi --port 8080 --workers 4
+#
+#   POST /legal-moves  {"fen": "B:W1,2,3:B21,22"}
+#                      -> {"fen": ..., "board": {...}, "moves": ["21-17", ...], "result": null}
+#   POST /bestmove     {"board": {...}, "movetime": 200}
+#                      -> {"move": "21-17", "score": 0.0, "mate": null, "depth": 7, "nodes": ...,
+#                          "cached": false}
+#   POST /analyse      {"fen": ..., "depth": 8, "multipv": 3}
+#                      -> {"best": ..., "score": ..., "pv": [...], "lines": [...], ...}
+#   GET  /stats        -> counters of the service
+#
+# The same fields can be sent as the query string of a GET (/bestmove?fen=...&movetime=200).
+# A position is either "fen", a PDN FEN, or "board":
+#
+#   {"variant": "checkers", "to_move": "B", "white": [1, 2, 3], "black": [21, 22], "kings": [3]}
+#
+# with the engine's square numbers (see checkers.protocol), and every reply describes it
+# both ways.  "variant" defaults to checkers, "movetime" is in milliseconds, "depth" is the
+# deepest iteration.  "score" is in men for the side to move; once the search sees the game
+# end it is null and "mate" is the plies to the end instead, negative when the side to move
+# loses.
+#
+# A request is a single position without the moves that led to it, so its searches cannot
+# see repetition draws or the plies without progress of the game it comes from; use the
+# game server (checkers.server) to play whole games.
+#
+# Connections are kept alive between requests (HTTP/1.1, or HTTP/1.0 with Connection:
+# keep-alive) until the client closes them or stays idle for IDLE_SECONDS.  Searches run in
+# a bounded pool of worker processes; at most --queue searches per worker may be waiting,
+# beyond that requests are turned away at once with 503 instead of queueing without end.
+# Every search stops itself after its movetime, capped at --max-movetime, and a request
+# that is not answered within --timeout gets 504.  Results are kept in an LRU cache keyed by
+# the position's hash and the search limits, and a request for a search that is already
+# running waits for that search instead of starting another one.
+IDLE_SECONDS = 15.0  # a keep-alive connection with no request for this long is closed
+MAX_BODY = 64 * 1024
+DEFAULT_MOVETIME = 0.2
+MAX_DEPTH = 64
+MAX_MULTIPV = 32
+
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+# ................................................ encoding ................................................
+def board_from_json(board):
+    # returns the Position of the JSON board encoding
+    try:
+        variant = VARIANTS[board.get("variant", "checkers")]
+        kings = set(board.get("kings", []))
+        fields = [str(board["to_move"]).upper()]
+        for letter, name in (("W", "white"), ("B", "black")):
+            fields.append(letter + ",".join(
+                ("K" if square in kings else "") + str(int(square))
+                for square in board.get(name, [])
+            ))
+    except (KeyError, TypeError, ValueError) as error:
+        raise HttpError(400, "bad board: %s" % error)
+    return read_fen(":".join(fields), variant)
+
+
+def board_to_json(position):
+    # returns the JSON board encoding of a position
+    variant = position.variant
+    board = {"variant": variant.name, "to_move": variant.side_letter[position.turn]}
+    for color, letter in variant.side_letter.items():
+        board["white" if letter == "W" else "black"] = [
+            square + 1 for square in iter_squares(position.pieces[color])
+        ]
+    board["kings"] = [square + 1 for square in iter_squares(position.kings)]
+    return board
+
+
+def read_fen(fen, variant):
+    try:
+        return position_from_fen(fen, variant)
+    except ValueError as error:
+        raise HttpError(400, str(error))
+
+
+def read_position(params):
+    # returns the Position of the "board" or "fen" of a request
+    if "board" in params:
+        board = params["board"]
+        if isinstance(board, str):  # from a query string
+            try:
+                board = json.loads(board)
+            except ValueError as error:
+                raise HttpError(400, "bad board: %s" % error)
+        if not isinstance(board, dict):
+            raise HttpError(400, "board must be an object")
+        return board_from_json(board)
+    if "fen" in params:
+        variant = params.get("variant", "checkers")
+        variant = VARIANTS.get(variant) if isinstance(variant, str) else None
+        if variant is None:
+            raise HttpError(400, "variant must be one of %s" % ", ".join(VARIANTS))
+        return read_fen(str(params["fen"]), variant)
+    raise HttpError(400, "the request needs a fen or a board")
+
+
+def score_fields(score):
+    # returns the "score" and "mate" fields of a score for the side to move
+    if abs(score) >= WIN_SCORE - MAX_PLY:
+        plies = round(WIN_SCORE - abs(score))
+        return {"score": None, "mate": plies if score > 0 else -plies}
+    return {"score": score, "mate": None}
+
+
+def read_int(params, name, default, low, high):
+    # returns an integer field of a request, checked to be within [low, high]
+    try:
+        value = int(params.get(name, default))
+    except (TypeError, ValueError):
+        raise HttpError(400, "%s must be an integer" % name)
+    if not low <= value <= high:
+        raise HttpError(400, "%s must be between %d and %d" % (name, low, high))
+    return value
+
+
+# ................................................. service ................................................
+class EngineService:
+    """
+    Answers the HTTP requests of any number of keep-alive connections.
+
+    Args:
+        workers (int): number of search processes
+        queue (int): searches that may be waiting per worker before requests get 503
+        max_movetime (float): most seconds any search may take
+        timeout (float): seconds a request may take, waiting included, before it gets 504
+        cache_entries (int): search results kept in the cache
+        hash_mb (int): megabytes of transposition table per worker process
+    """
+
+    def __init__(self, workers, queue=4, max_movetime=5.0, timeout=10.0, cache_entries=10000,
+                 hash_mb=16):
+        self.workers = workers
+        self.limit = workers * (queue + 1)  # searches running and waiting
+        self.max_movetime = max_movetime
+        self.timeout = timeout
+        self.cache_entries = cache_entries
+        self.hash_mb = hash_mb
+        self.pool = None
+        self.cache = OrderedDict()  # key -> search record, least recently used first
+        self.running = {}  # key -> future of a search in flight
+        self.counts = {"requests": 0, "connections": 0, "searches": 0, "cache_hits": 0,
+                       "shared": 0, "busy": 0, "timeouts": 0, "errors": 0}
+        self.started = time.perf_counter()
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        server = await asyncio.start_server(self.client, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+
+    async def client(self, reader, writer):
+        # answers the requests of one connection, in order, until it closes
+        self.counts["connections"] += 1
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), IDLE_SECONDS)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                    break
+                except HttpError as error:
+                    # the stream cannot be trusted any more: answer and close
+                    writer.write(response(error.status, {"error": str(error)}, False))
+                    await writer.drain()
+                    break
+                method, target, keep_alive, body = request
+                self.counts["requests"] += 1
+                try:
+                    status, reply = 200, await self.respond(method, target, body)
+                except HttpError as error:
+                    status, reply = error.status, {"error": str(error)}
+                    self.counts["errors"] += 1
+                except Exception as error:
+                    # a bug must not leave the client without an answer
+                    status, reply = 500, {"error": "%s: %s" % (type(error).__name__, error)}
+                    self.counts["errors"] += 1
+                writer.write(response(status, reply, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, target, body):
+        # returns the JSON reply of a request
+        url = urlsplit(target)
+        if method == "GET":
+            params = dict(parse_qsl(url.query))
+        elif method == "POST":
+            try:
+                params = json.loads(body or b"{}")
+            except ValueError as error:
+                raise HttpError(400, "bad JSON: %s" % error)
+            if not isinstance(params, dict):
+                raise HttpError(400, "the body must be a JSON object")
+        else:
+            raise HttpError(405, "use GET or POST")
+
+        path = url.path.rstrip("/")
+        if path == "/stats":
+            return self.stats()
+        if path not in ("/legal-moves", "/bestmove", "/analyse"):
+            raise HttpError(404, "no endpoint %s" % url.path)
+        position = read_position(params)
+        reply = {"fen": position_to_fen(position), "board": board_to_json(position)}
+        if path == "/legal-moves":
+            result = winner(position)
+            letters = {**position.variant.side_letter, None: None}
+            reply["moves"] = [move_to_text(move)
+                              for move in generate_moves(position, position.turn)]
+            reply["result"] = letters.get(result, "draw")
+            return reply
+
+        movetime = read_int(params, "movetime", DEFAULT_MOVETIME * 1000, 1,
+                            int(self.max_movetime * 1000)) / 1000
+        depth = read_int(params, "depth", MAX_DEPTH, 1, MAX_DEPTH)
+        multipv = read_int(params, "multipv", 1, 1, MAX_MULTIPV) if path == "/analyse" else 1
+        record, cached = await self.search(position, depth, movetime, multipv)
+        if path == "/bestmove":
+            reply.update({key: record[key] for key in ("depth", "nodes", "time")})
+            reply["move"] = record["best"]
+        else:
+            reply.update({key: value for key, value in record.items()
+                          if key not in ("id", "fen")})
+            if "lines" in record:
+                reply["lines"] = [{**line, **score_fields(line["score"])}
+                                  for line in record["lines"]]
+        reply.update(score_fields(record["score"]))
+        reply["cached"] = cached
+        return reply
+
+    async def search(self, position, depth, movetime, multipv):
+        """
+        This function returns the result of a search, from the cache, from the same search
+        already running, or from a new search in the pool.
+
+        Returns:
+            (dict, bool): the record of checkers.analyse.analyse and whether it was cached
+        """
+        key = (position.variant.name, position.hash, depth, movetime, multipv)
+        record = self.cache.get(key)
+        if record is not None:
+            self.cache.move_to_end(key)
+            self.counts["cache_hits"] += 1
+            return record, True
+
+        future = self.running.get(key)
+        if future is not None:
+            self.counts["shared"] += 1
+        else:
+            if len(self.running) >= self.limit:
+                self.counts["busy"] += 1
+                raise HttpError(503, "all %d workers are busy, try again" % self.workers)
+            self.counts["searches"] += 1
+            item = (None, position_to_fen(position), position.variant.name)
+            future = asyncio.get_running_loop().run_in_executor(
+                self.pool, analyse, item, depth, movetime, self.hash_mb, multipv
+            )
+            self.running[key] = future
+            future.add_done_callback(lambda done: self.finish(key, done))
+        try:
+            # shielded: a request that gives up leaves the search to fill the cache
+            record = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.counts["timeouts"] += 1
+            raise HttpError(504, "no answer within %g s" % self.timeout)
+        return record, False
+
+    def finish(self, key, future):
+        # moves the result of a finished search into the cache
+        self.running.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        self.cache[key] = future.result()
+        while len(self.cache) > self.cache_entries:
+            self.cache.popitem(last=False)
+
+    def stats(self):
+        stats = dict(self.counts)
+        stats.update({
+            "workers": self.workers,
+            "running": len(self.running),
+            "cached": len(self.cache),
+            "uptime": time.perf_counter() - self.started,
+        })
+        return stats
+
+
+# ................................................... HTTP ..................................................
+async def read_request(reader):
+    """
+    This function reads one HTTP request off a connection.
+
+    Returns:
+        (str, str, bool, bytes): the method, the target, whether the connection stays open
+        after the reply and the body
+    """
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.LimitOverrunError:
+        raise HttpError(413, "headers too long")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        raise HttpError(400, "bad request line")
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HttpError(400, "bad Content-Length")
+    if length > MAX_BODY:
+        raise HttpError(413, "bodies are limited to %d bytes" % MAX_BODY)
+    body = await reader.readexactly(length) if length else b""
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.1":
+        keep_alive = connection != "close"
+    else:
+        keep_alive = connection == "keep-alive"
+    return method, target, keep_alive, body
+
+
+def response(status, reply, keep_alive):
+    # returns the bytes of a JSON response
+    body = json.dumps(reply).encode()
+    head = [
+        "HTTP/1.1 %d %s" % (status, REASONS[status]),
+        "Content-Type: application/json",
+        "Content-Length: %d" % len(body),
+        "Connection: %s" % ("keep-alive" if keep_alive else "close"),
+    ]
+    if status == 503:
+        head.append("Retry-After: 1")
+    return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body
+
+
+# .................................................. main ..................................................
+def main():
+    parser = argparse.ArgumentParser(description="Serve the engine over HTTP with JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="search processes (default: one per core)")
+    parser.add_argument("--queue", type=int, default=4,
+                        help="searches waiting per worker before requests get 503 (default 4)")
+    parser.add_argument("--max-movetime", type=float, default=5.0,
+                        help="most seconds a search may take (default 5)")
+    parser.add_argument("--timeout", type=float, default=10.0,
+                        help="seconds before a request gets 504 (default 10)")
+    parser.add_argument("--cache-entries", type=int, default=10000,
+                        help="search results kept (default 10000)")
+    parser.add_argument("--hash-mb", type=int, default=16,
+                        help="megabytes of transposition table per worker (default 16)")
+    args = parser.parse_args()
+
+    service = EngineService(args.workers, args.queue, args.max_movetime, args.timeout,
+                            args.cache_entries, args.hash_mb)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from checkers.game import GameState
+
+
+# .............................................. HTTP load test .............................................
+# Measures the latency of a running checkers.httpapi at several concurrency levels:
+#
+#   python -m checkers.httpload --concurrency 1 4 16 64 --requests 400 --movetime 50
+#
+# At every level that many clients each keep one connection alive and send requests one
+# after the other until the level has sent --requests; the time from sending a request to
+# reading its whole reply is its latency.  The positions come from random games, so most
+# requests miss the cache of the service; --repeat is the share of requests that ask for a
+# position asked for before, which the cache answers.  Replies other than 200, such as the
+# 503 of a full queue, are counted and left out of the latencies.
+ENDPOINTS = ("bestmove", "analyse", "legal-moves")
+
+
+class HttpClient:
+    def __init__(self, reader, writer, host):
+        self.reader = reader
+        self.writer = writer
+        self.host = host
+
+    async def post(self, path, payload):
+        # sends a request on the kept-alive connection; returns the status and the reply
+        body = json.dumps(payload).encode()
+        self.writer.write((
+            "POST %s HTTP/1.1\r\nHost: %s\r\nContent-Type: application/json\r\n"
+            "Content-Length: %d\r\n\r\n" % (path, self.host, len(body))
+        ).encode("latin-1") + body)
+        await self.writer.drain()
+        head = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status = int(head[0].split(" ")[1])
+        length = 0
+        for line in head[1:]:
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    def close(self):
+        self.writer.close()
+
+
+def positions(count, seed):
+    # returns the FENs of count positions a random number of random plies into a game
+    rng = random.Random(seed)
+    fens = []
+    while len(fens) < count:
+        game = GameState()
+        for _ in range(rng.randint(0, 40)):
+            if game.is_over():
+                break
+            game.play(rng.choice(game.legal_moves()))
+        if not game.is_over():
+            fens.append(game.fen())
+    return fens
+
+
+def percentile(values, share):
+    # the nearest-rank percentile of sorted values
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+async def run_level(args, concurrency, fens, rng):
+    """
+    This function loads the service with a number of concurrent clients.
+
+    Returns:
+        (list, Counter, float): the latencies of the answered requests in seconds, the
+        count of every status and the seconds the level took
+    """
+    latencies = []
+    statuses = Counter()
+    asked = []  # positions asked for at this level, for the repeats
+    sent = 0
+
+    async def client():
+        nonlocal sent
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+        http = HttpClient(reader, writer, "%s:%d" % (args.host, args.port))
+        try:
+            while sent < args.requests:
+                sent += 1
+                if asked and rng.random() < args.repeat:
+                    fen = rng.choice(asked)
+                else:
+                    fen = fens[len(asked) % len(fens)]
+                    asked.append(fen)
+                payload = {"fen": fen, "movetime": args.movetime}
+                if args.depth:
+                    payload["depth"] = args.depth
+                start = time.perf_counter()
+                status, reply = await http.post("/" + args.endpoint, payload)
+                statuses[status] += 1
+                if status == 200:
+                    latencies.append(time.perf_counter() - start)
+        finally:
+            http.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return sorted(latencies), statuses, time.perf_counter() - start
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    fens = positions(args.requests * len(args.concurrency), args.seed)
+    print("%s, %d requests per level, movetime %d ms, %.0f%% repeats" % (
+        "/" + args.endpoint, args.requests, args.movetime, 100 * args.repeat))
+    for number, concurrency in enumerate(args.concurrency):
+        # every level asks for positions of its own, so it cannot hit the cache of the last
+        own = fens[number * args.requests:(number + 1) * args.requests]
+        latencies, statuses, elapsed = await run_level(args, concurrency, own, rng)
+        others = ", ".join("%d x %d" % (count, status)
+                           for status, count in sorted(statuses.items()) if status != 200)
+        if latencies:
+            print("concurrency %3d  %7.1f req/s  p50 %8.1f ms  p99 %8.1f ms%s" % (
+                concurrency, len(latencies) / elapsed, percentile(latencies, 0.5) * 1000,
+                percentile(latencies, 0.99) * 1000, "  (%s)" % others if others else ""))
+        else:
+            print("concurrency %3d  no request answered (%s)" % (concurrency, others))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the latency of checkers.httpapi.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="bestmove")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64],
+                        help="concurrent clients of every level (default 1 4 16 64)")
+    parser.add_argument("--requests", type=int, default=200,
+                        help="requests per level (default 200)")
+    parser.add_argument("--movetime", type=int, default=50,
+                        help="milliseconds per search (default 50)")
+    parser.add_argument("--depth", type=int, help="deepest iteration of every search")
+    parser.add_argument("--repeat", type=float, default=0.0,
+                        help="share of requests repeating a position (default 0)")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+
+# ............................................... load generator ..........................................
+# Plays many games against a running checkers.server at once, the client side picking
+# random legal moves, and reports the throughput of the server in games per hour per core.
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, **request):
+        self.writer.write(json.dumps(request).encode() + b"\n")
+        await self.writer.drain()
+        reply = json.loads(await self.reader.readline())
+        if not reply["ok"]:
+            raise RuntimeError(reply["error"])
+        return reply
+
+
+async def connect(args):
+    if args.unix:
+        reader, writer = await asyncio.open_unix_connection(args.unix)
+    else:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+    return Client(reader, writer)
+
+
+async def play_games(args, deadline, results, rng):
+    # plays one game after the other on its own connection until the deadline
+    client = await connect(args)
+    while time.perf_counter() < deadline:
+        new = {"op": "new", "ai": "W", "budget": args.budget}
+        if args.level:
+            new["level"] = args.level
+        reply = await client.request(**new)
+        game = reply["game"]
+        state = reply["state"]
+        while state["result"] is None:
+            reply = await client.request(op="move", game=game, move=rng.choice(state["legal"]))
+            state = reply["state"]
+        await client.request(op="close", game=game)
+        results.append((state["result"], len(state["moves"])))
+    client.writer.close()
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    results = []
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(
+        *(play_games(args, deadline, results, random.Random(rng.random()))
+          for _ in range(args.clients))
+    )
+    elapsed = time.perf_counter() - start
+
+    client = await connect(args)
+    stats = (await client.request(op="stats"))["stats"]
+    client.writer.close()
+
+    games = len(results)
+    plies = sum(length for _, length in results)
+    print("clients %d, workers %d, %.1f s" % (args.clients, stats["workers"], elapsed))
+    print("games %d (%s), %.1f plies per game" % (
+        games,
+        ", ".join("%s %d" % (result, sum(1 for r, _ in results if r == result))
+                  for result in ("W", "B", "draw")),
+        plies / games if games else 0.0,
+    ))
+    print("searches %d, %d nodes, workers busy %.0f%%" % (
+        stats["searches"], stats["nodes"],
+        100 * stats["busy_time"] / (elapsed * stats["workers"])))
+    print("throughput: %.0f games/hour/core" % (games * 3600 / elapsed / stats["workers"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the throughput of checkers.server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="connect to this unix socket instead of a TCP port")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent games")
+    parser.add_argument("--duration", type=float, default=30.0,
+                        help="seconds to keep starting games")
+    parser.add_argument("--budget", type=float, default=2.0,
+                        help="AI thinking seconds per game")
+    parser.add_argument("--level", help="difficulty of the AI (Easy, Medium, Impossible) "
+                        "instead of a time budget")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
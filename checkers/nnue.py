@@ -0,0 +1,387 @@
+import argparse
+import json
+import sys
+import time
+from array import array
+from checkers.bench import BENCH_POSITIONS
+from checkers.dataset import Dataset
+from checkers.engine import AI, DRAW, HUMAN, VARIANTS, iter_squares, position_from_fen
+from checkers.game import GameState
+from checkers.search import Search, SearchLimits
+from checkers.selfplay import openings
+
+try:
+    import numpy
+except ImportError:  # only training needs NumPy, evaluating a network does not
+    numpy = None
+
+
+# ............................................. neural evaluation ..............................................
+# A small network that evaluates positions in place of the material count, NNUE style:
+#
+#   python -m checkers.nnue train data/ --out nnue.json
+#   python -m checkers.nnue bench nnue.json --depth 6 --games 20
+#
+# The inputs are one per piece kind (AI man, AI king, human man, human king) and square, so
+# a position has at most a few dozen of them set.  The first layer sums the weights of the
+# set inputs into an accumulator of `hidden` lanes, the lanes are clipped to [0, 1] and the
+# output layer weighs them into a score in men for the AI, like checkers.engine.evaluate.
+#
+# A move only sets and clears a few inputs, so the accumulator is not recomputed: make_move
+# adds and subtracts the weights of the inputs the move changes and unmake_move restores the
+# value from before.  The lanes are integers (the weights times QUANT) packed into one
+# Python int, LANE_BITS apart and each stored plus OFFSET so none goes negative, so adding
+# the weights of an input to every lane is one integer addition, and restoring the previous
+# value is popping it off a stack.  Only evaluate() unpacks the lanes.
+#
+# The network file is JSON: the variant, the first-layer weights `w1` (one list of `hidden`
+# weights per input), the biases `b1`, the output weights `w2` and the output bias `b2`.
+LANE_BITS = 32
+OFFSET = 1 << (LANE_BITS - 1)
+QUANT = 1024  # first-layer weights and biases are stored times this, rounded
+KINDS = 4  # inputs per square: AI man, AI king, human man, human king
+BIG_ENDIAN = sys.byteorder == "big"
+
+# scores in men are turned into expected results by sigmoid(score / SCORE_SCALE) in training
+SCORE_SCALE = 4.0
+RESULT_WEIGHT = 0.5  # share of the game result in the training target, the rest is the score
+
+
+class Network:
+    """
+    The weights of a network, with the first layer quantised and packed into lanes.
+
+    Args:
+        variant (Variant): the board the network evaluates
+        w1 (list): the first-layer weights of every input, KINDS * squares lists of
+            hidden floats, in the order of the piece kinds
+        b1 (list): the first-layer biases, hidden floats
+        w2 (list): the output weights, hidden floats
+        b2 (float): the output bias
+    """
+
+    def __init__(self, variant, w1, b1, w2, b2):
+        if len(w1) != KINDS * variant.squares:
+            raise ValueError("%d inputs, %s needs %d" % (
+                len(w1), variant.name, KINDS * variant.squares))
+        self.variant = variant
+        self.hidden = len(b1)
+        self.size = self.hidden * LANE_BITS // 8  # bytes of the packed lanes
+        self.weights = (w1, b1, w2, b2)  # the float weights, for saving
+        # rows[kind][square]: the quantised first-layer weights of an input, packed
+        self.rows = [
+            [pack(w1[kind * variant.squares + square]) for square in range(variant.squares)]
+            for kind in range(KINDS)
+        ]
+        self.base = pack(b1) + sum(OFFSET << (LANE_BITS * lane) for lane in range(self.hidden))
+        self.w2 = [weight / QUANT for weight in w2]  # takes the lanes back to [0, 1]
+        self.b2 = b2
+
+    @classmethod
+    def load(cls, path):
+        # reads a network file
+        with open(path) as file:
+            data = json.load(file)
+        return cls(VARIANTS[data["variant"]], data["w1"], data["b1"], data["w2"], data["b2"])
+
+    def save(self, path, extra=None):
+        # writes the network file, with extra entries such as the training error
+        w1, b1, w2, b2 = self.weights
+        data = {"variant": self.variant.name, "hidden": self.hidden}
+        data.update(extra or {})
+        data.update({
+            "w1": [[round(float(weight), 5) for weight in row] for row in w1],
+            "b1": [round(float(weight), 5) for weight in b1],
+            "w2": [round(float(weight), 5) for weight in w2],
+            "b2": round(float(b2), 5),
+        })
+        with open(path, "w") as file:
+            json.dump(data, file)
+            file.write("\n")
+
+    def refresh(self, position):
+        # returns the packed accumulator of a position, summed from scratch
+        value = self.base
+        ai, human = position.pieces
+        kings = position.kings
+        for kind, board in enumerate((ai & ~kings, ai & kings, human & ~kings, human & kings)):
+            row = self.rows[kind]
+            for square in iter_squares(board):
+                value += row[square]
+        return value
+
+    def attach(self, position):
+        # makes the accumulator of the network follow the moves made on the position
+        position.accumulator = Accumulator(self, position)
+
+    def evaluate(self, position):
+        """
+        This function scores a position for the AI, like checkers.engine.evaluate.  It
+        reads the accumulator the position carries, or sums one if it has none.
+
+        Args:
+            position (Position): the board state
+
+        Returns:
+            float: the score of the AI player, in men
+        """
+        accumulator = position.accumulator
+        value = accumulator.value if accumulator is not None else self.refresh(position)
+        lanes = array("I", value.to_bytes(self.size, "little"))
+        if BIG_ENDIAN:
+            lanes.byteswap()
+        score = self.b2
+        top = OFFSET + QUANT
+        for lane, weight in zip(lanes, self.w2):
+            # the clipped ReLU: lanes at or below zero add nothing, lanes above one add one
+            if lane > OFFSET:
+                score += weight * ((lane if lane < top else top) - OFFSET)
+        return score
+
+
+class Accumulator:
+    """
+    The first layer of a network for the position it is attached to, kept up to date by
+    make_move and unmake_move.
+
+    Args:
+        network (Network): the weights
+        position (Position): the position whose moves it follows
+    """
+
+    def __init__(self, network, position):
+        self.rows = network.rows
+        self.value = network.refresh(position)
+        self.stack = []  # the values before every move made since
+
+    def make(self, color, origin, destination, king, promoted, captures, captured_kings):
+        # moves the piece of kind color * 2 + king and removes the captured pieces
+        rows = self.rows
+        self.stack.append(self.value)
+        kind = color * 2 + king
+        value = self.value - rows[kind][origin] + rows[kind + promoted][destination]
+        if captures:
+            opponent = 2 - color * 2
+            for square in iter_squares(captures):
+                value -= rows[opponent + (captured_kings >> square & 1)][square]
+        self.value = value
+
+    def unmake(self):
+        self.value = self.stack.pop()
+
+
+def pack(weights):
+    # returns quantised weights packed into the lanes of one int, first weight lowest
+    return sum(int(round(weight * QUANT)) << (LANE_BITS * lane)
+               for lane, weight in enumerate(weights))
+
+
+# ................................................. training ................................................
+def load_data(paths, variant):
+    """
+    This function reads the training positions of the shards of checkers.dataset.
+
+    Args:
+        paths (list): shard files and directories of shards, other variants are skipped
+        variant (Variant): the variant to train
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): the inputs of every position, one row of
+        KINDS * squares zeros and ones each, and its target for the AI in [0, 1]
+    """
+    dataset = Dataset(paths)
+    arrays = [shard.as_array() for shard in dataset.shards if shard.variant is variant]
+    if not arrays:
+        dataset.close()
+        inputs = KINDS * variant.squares
+        return numpy.zeros((0, inputs), numpy.float32), numpy.zeros(0, numpy.float32)
+    records = numpy.concatenate(arrays)  # a copy, so the shards can be closed
+    del arrays
+    squares = numpy.arange(variant.squares, dtype=numpy.uint64)
+    kings = records["kings"]
+    planes = [
+        (board[:, None] >> squares) & numpy.uint64(1)
+        for board in (records["ai"] & ~kings, records["ai"] & kings,
+                      records["human"] & ~kings, records["human"] & kings)
+    ]
+    x = numpy.concatenate(planes, axis=1).astype(numpy.float32)
+    # the score and result are stored for the side to move
+    sign = numpy.where(records["turn"] == AI, 1.0, -1.0)
+    score = records["score"] / 1000.0 * sign
+    result = (records["result"] * sign + 1) / 2
+    y = (RESULT_WEIGHT * result
+         + (1 - RESULT_WEIGHT) / (1 + numpy.exp(-score / SCORE_SCALE))).astype(numpy.float32)
+    dataset.close()
+    return x, y
+
+
+def train(x, y, variant, hidden=16, epochs=20, batch=1024, rate=0.003, seed=1, log=print):
+    """
+    This function trains a network by minibatch gradient descent with Adam steps, so that
+    sigmoid(output / SCORE_SCALE) predicts the targets with the least squared error.
+
+    Args:
+        x (numpy.ndarray): the inputs of every position
+        y (numpy.ndarray): the targets
+        variant (Variant): the board of the positions
+        hidden (int): lanes of the accumulator
+        epochs (int): passes over the positions
+        batch (int): positions per step
+        rate (float): the step size
+        seed (int): seed of the initial weights and the order of the positions
+        log (function): called with a line of progress after every epoch
+
+    Returns:
+        (Network, float): the network and its error on the positions
+    """
+    rng = numpy.random.default_rng(seed)
+    inputs = x.shape[1]
+    # start with every lane counting a random mix of pieces, on top of half its range
+    params = [
+        rng.normal(0, 0.1, (inputs, hidden)).astype(numpy.float32),
+        numpy.full(hidden, 0.5, dtype=numpy.float32),
+        rng.normal(0, 0.5, hidden).astype(numpy.float32),
+        numpy.zeros(1, dtype=numpy.float32),
+    ]
+    first = [numpy.zeros_like(param) for param in params]
+    second = [numpy.zeros_like(param) for param in params]
+    beta1, beta2 = 0.9, 0.999
+    step = 0
+
+    def forward(rows):
+        before = rows @ params[0] + params[1]
+        after = numpy.clip(before, 0, 1)
+        return before, after, 1 / (1 + numpy.exp(-(after @ params[2] + params[3]) / SCORE_SCALE))
+
+    for epoch in range(epochs):
+        order = rng.permutation(len(y))
+        for start in range(0, len(y), batch):
+            index = order[start:start + batch]
+            rows, target = x[index], y[index]
+            before, after, predicted = forward(rows)
+            # the gradient of the squared error through the sigmoid and both layers
+            delta = 2 * (predicted - target) * predicted * (1 - predicted) / (
+                SCORE_SCALE * len(index))
+            lanes = numpy.outer(delta, params[2]) * ((before > 0) & (before < 1))
+            gradients = [rows.T @ lanes, lanes.sum(0), after.T @ delta, delta.sum(keepdims=True)]
+            step += 1
+            for param, gradient, m, v in zip(params, gradients, first, second):
+                m *= beta1
+                m += (1 - beta1) * gradient
+                v *= beta2
+                v += (1 - beta2) * gradient * gradient
+                param -= rate * (m / (1 - beta1 ** step)) / (
+                    numpy.sqrt(v / (1 - beta2 ** step)) + 1e-9)
+        error = float(numpy.mean((forward(x)[2] - y) ** 2))
+        log("epoch %d: error %.5f" % (epoch + 1, error))
+    w1, b1, w2, b2 = params
+    return Network(variant, w1.tolist(), b1.tolist(), w2.tolist(), float(b2[0])), error
+
+
+# ................................................ benchmark ................................................
+def speed(network, depth, fens):
+    # returns the nodes a second of a fixed-depth search of every position
+    nodes = 0
+    start = time.perf_counter()
+    for fen in fens:
+        search = Search(position_from_fen(fen), SearchLimits(depth=depth), network=network)
+        search.run()
+        nodes += search.nodes
+    return nodes / (time.perf_counter() - start)
+
+
+def match(network, games, limits, variant, max_plies=200, seed=1):
+    """
+    This function plays a match of the network against the material evaluation.
+
+    Args:
+        network (Network): the evaluation being measured
+        games (int): games to play, rounded up to an even number
+        limits (SearchLimits): the limits of every move's search
+        variant (Variant): the board size and rules
+        max_plies (int): plies after which a game is called a tie
+        seed (int): seed of the random openings
+
+    Returns:
+        (int, int, int): wins, draws and losses of the network
+    """
+    wins = draws = losses = 0
+    for opening in openings((games + 1) // 2, 4, variant, seed):
+        for side in (AI, HUMAN):
+            game = GameState(max_plies=max_plies, variant=variant)
+            for move in opening:
+                game.play(move)
+            while not game.is_over():
+                search = Search(game.position, limits,
+                                network=network if game.turn == side else None)
+                game.play(search.run()[1])
+            result = game.result()
+            if result == DRAW:
+                draws += 1
+            elif result == side:
+                wins += 1
+            else:
+                losses += 1
+    return wins, draws, losses
+
+
+# .................................................. main ..................................................
+def main():
+    parser = argparse.ArgumentParser(description="Train and measure neural evaluations.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    trainer = commands.add_parser("train", help="train a network on the shards of checkers.dataset")
+    trainer.add_argument("data", nargs="+", help="shard files or directories of shards")
+    trainer.add_argument("--out", default="nnue.json", help="network file (default nnue.json)")
+    trainer.add_argument("--variant", choices=sorted(VARIANTS), default="checkers")
+    trainer.add_argument("--hidden", type=int, default=16, help="accumulator lanes (default 16)")
+    trainer.add_argument("--epochs", type=int, default=20, help="passes (default 20)")
+    trainer.add_argument("--rate", type=float, default=0.003, help="step size (default 0.003)")
+    trainer.add_argument("--seed", type=int, default=1)
+    bench = commands.add_parser("bench", help="speed and strength against the material evaluation")
+    bench.add_argument("network", help="network file")
+    bench.add_argument("--depth", type=int, default=6, help="depth of the speed test (default 6)")
+    bench.add_argument("--games", type=int, default=20, help="games of the match (default 20)")
+    bench.add_argument("--nodes", type=int, default=2000,
+                       help="nodes per move in the match (default 2000)")
+    bench.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        if numpy is None:
+            parser.error("training needs NumPy, install it with: pip install numpy")
+        variant = VARIANTS[args.variant]
+        start = time.perf_counter()
+        x, y = load_data(args.data, variant)
+        if not len(y):
+            parser.error("no %s positions in %s" % (variant.name, ", ".join(args.data)))
+        print("%d positions in %.1f s" % (len(y), time.perf_counter() - start))
+        start = time.perf_counter()
+        network, error = train(x, y, variant, args.hidden, args.epochs, rate=args.rate,
+                               seed=args.seed)
+        print("trained in %.0f s" % (time.perf_counter() - start))
+        network.save(args.out, {"positions": len(y), "error": round(error, 6)})
+        print("wrote %s" % args.out)
+        return
+
+    network = Network.load(args.network)
+    variant = network.variant
+    if variant.name == "checkers":
+        fens = BENCH_POSITIONS
+    else:
+        fens = [GameState(variant=variant).fen()]
+    material = speed(None, args.depth, fens)
+    neural = speed(network, args.depth, fens)
+    print("nodes a second at depth %d: material %.0f, network %.0f (%.0f%%)" % (
+        args.depth, material, neural, 100 * neural / material))
+    if args.games > 0:
+        start = time.perf_counter()
+        wins, draws, losses = match(network, args.games, SearchLimits(nodes=args.nodes),
+                                    variant, seed=args.seed)
+        total = wins + draws + losses
+        print("against material at %d nodes a move: +%d =%d -%d  score %.1f%%  (%.0f s)" % (
+            args.nodes, wins, draws, losses, 100 * (wins + draws / 2) / total,
+            time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import re
+import time
+from checkers.engine import (
+    AI,
+    HUMAN,
+    DRAW,
+    CHECKERS,
+    VARIANTS,
+    Position,
+    make_move,
+    move_from_text,
+    move_to_text,
+    position_from_fen,
+    position_to_fen,
+)
+
+
+# ........................................ Portable Draughts Notation ..........................................
+# Games are written as PDN: a block of [Tag "value"] headers followed by the numbered moves
+# and the result.  The AI plays White and the human Black; Black moves first.  Games that
+# do not start from the normal position carry a [FEN "..."] header, and international games
+# a [GameType "20"] header; there the human is White and moves first.
+#
+# PDN numbers the squares from the back rank of the side that does not move first: Black
+# starts on 1-12 of the 8x8 board, as in every English draughts database.  The engine
+# numbers them from the AI's back rank, so 8x8 moves and FENs are rotated half a turn
+# (square n is square 33 - n) on the way in and out; international numbering is the same.
+RESULTS = {"W": "2-0", "B": "0-2", DRAW: "1-1", None: "*"}  # White's score first
+
+# Results other programs write as well
+RESULT_TOKENS = {"2-0", "0-2", "1-1", "1-0", "0-1", "1/2-1/2", "0-0", "*"}
+
+HEADER = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN = re.compile(r'\[[^\]]*\]|[{}();]|[^\s{}();\[]+')
+MOVE = re.compile(r"^\d+(?:[-x]\d+)+$")
+SQUARES = re.compile(r"(\d+)(?:-(\d+))?")
+
+
+def rotate_move(text, variant=CHECKERS):
+    # turns the text of a move between PDN and engine square numbers, both ways
+    if not variant.pdn_rotated:
+        return text
+    top = variant.squares + 1
+    return re.sub(r"\d+", lambda match: str(top - int(match.group())), text)
+
+
+def rotate_fen(fen, variant=CHECKERS):
+    # turns a FEN between PDN and engine square numbers, both ways; a range of squares
+    # such as "21-32" stays in ascending order
+    if not variant.pdn_rotated:
+        return fen
+    top = variant.squares + 1
+
+    def rotate(match):
+        first, last = match.group(1), match.group(2)
+        if last is None:
+            return str(top - int(first))
+        return "%d-%d" % (top - int(last), top - int(first))
+
+    return SQUARES.sub(rotate, fen)
+
+
+def result_token(result, variant=CHECKERS):
+    # returns the PDN result of AI, HUMAN, DRAW or None for an unfinished game
+    return RESULTS[variant.side_letter.get(result, result)]
+
+
+def game_variant(headers):
+    # returns the Variant named by the GameType header, the 8x8 game if there is none
+    game_type = headers.get("GameType", "").split(",")[0].strip()
+    for variant in VARIANTS.values():
+        if variant.game_type is not None and str(variant.game_type) == game_type:
+            return variant
+    return CHECKERS
+
+
+def format_game(moves, result=None, headers=None, start_fen=None, variant=CHECKERS):
+    """
+    This function writes a game as PDN text.
+
+    Args:
+        moves (list): the packed moves of the game in order
+        result (int): AI, HUMAN, DRAW or None for an unfinished game
+        headers (dict): extra tags such as Event, White or Black
+        start_fen (str): the starting position if it is not the normal one
+        variant (Variant): the board size and rules the game was played with
+
+    Returns:
+        str: the PDN of the game, ending with a blank line
+    """
+    players = {variant.side_letter[AI]: "AI", variant.side_letter[HUMAN]: "Human"}
+    tags = {
+        "Event": "Ultimate Checkers",
+        "Date": time.strftime("%Y.%m.%d"),
+        "White": players["W"],
+        "Black": players["B"],
+    }
+    if variant.game_type is not None:
+        tags["GameType"] = variant.game_type
+    tags.update(headers or {})
+    tags["Result"] = result_token(result, variant)
+    if start_fen:
+        tags["FEN"] = rotate_fen(start_fen, variant)
+    lines = ['[%s "%s"]' % (tag, str(value).replace('"', '\\"')) for tag, value in tags.items()]
+    lines.append("")
+
+    position = position_from_fen(start_fen, variant) if start_fen else Position(variant=variant)
+    words = []
+    number = 1
+    for index, move in enumerate(moves):
+        # every move of the side that moved first opens a new move number
+        if index == 0 and position.turn == AI:
+            words.append("%d..." % number)
+        elif position.turn == HUMAN:
+            words.append("%d." % number)
+        words.append(rotate_move(move_to_text(move), variant))
+        if position.turn == AI:
+            number += 1
+        make_move(position, move)
+    words.append(result_token(result, variant))
+
+    # wrap the movetext at 80 columns like other PDN writers
+    line = ""
+    for word in words:
+        if line and len(line) + 1 + len(word) > 80:
+            lines.append(line)
+            line = word
+        else:
+            line = word if not line else line + " " + word
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
+
+
+def append_game(path, moves, result=None, headers=None, start_fen=None, variant=CHECKERS):
+    # appends a game to a PDN file, creating it if needed
+    with open(path, "a") as pdn:
+        pdn.write(format_game(moves, result, headers, start_fen, variant))
+
+
+# ............................................. streaming reader ..........................................
+class PdnGame:
+    def __init__(self, headers, moves, result):
+        self.headers = headers  # {tag: value}, the FEN in PDN square numbers
+        self.variant = game_variant(headers)
+        # move texts in order and in engine square numbers, e.g. "22-18" for PDN "11-15"
+        self.moves = [rotate_move(text, self.variant) for text in moves]
+        self.result = result  # "2-0", "0-2", "1-1", "*", ...
+
+    def start_position(self):
+        fen = self.headers.get("FEN")
+        if not fen:
+            return Position(variant=self.variant)
+        return position_from_fen(rotate_fen(fen, self.variant), self.variant)
+
+    def positions(self):
+        """
+        This generator replays the game move by move.
+
+        The same Position object is played on and yielded every time, so copy it to keep it.
+
+        Yields:
+            (Position, int): the position before each move and that packed move
+        """
+        position = self.start_position()
+        for text in self.moves:
+            move = move_from_text(position, text)
+            yield position, move
+            make_move(position, move)
+            # replaying does not need the history of the moves
+            position.undo_stack.clear()
+
+    def final_position(self):
+        position = self.start_position()
+        for text in self.moves:
+            make_move(position, move_from_text(position, text))
+        return position
+
+    def fen(self):
+        # the FEN of the final position, in engine square numbers
+        return position_to_fen(self.final_position())
+
+
+def read_games(stream):
+    """
+    This generator reads PDN games one at a time from a text stream.
+
+    Only the game being read is held in memory, so arbitrarily large databases can be
+    processed.  Comments, variations and move numbers are skipped.
+
+    Args:
+        stream (file): an open PDN file or any iterable of lines
+
+    Yields:
+        PdnGame: every game of the stream in order
+    """
+    headers = {}
+    moves = []
+    comment = False  # inside {...}
+    variation = 0  # depth of (...)
+
+    for line in stream:
+        if not comment and not variation and line.lstrip().startswith("["):
+            if moves:
+                # a header block right after movetext starts the next game
+                yield PdnGame(headers, moves, "*")
+                headers, moves = {}, []
+            for match in HEADER.finditer(line):
+                headers[match.group(1)] = match.group(2).replace('\\"', '"')
+            continue
+
+        for token in TOKEN.findall(line):
+            if comment:
+                if token == "}":
+                    comment = False
+                continue
+            if token == "{":
+                comment = True
+            elif token == "(":
+                variation += 1
+            elif token == ")":
+                variation = max(0, variation - 1)
+            elif variation:
+                continue
+            elif token == ";":
+                break  # the rest of the line is a comment
+            elif token in RESULT_TOKENS:
+                yield PdnGame(headers, moves, token)
+                headers, moves = {}, []
+            else:
+                # strip move numbers glued to the move ("1.22-18") and move strength marks
+                token = token.split(".")[-1].rstrip("!?*")
+                if MOVE.match(token):
+                    moves.append(token)
+
+    if moves or headers:
+        yield PdnGame(headers, moves, "*")
+
+
+def read_positions(stream):
+    # yields (game, position, move) for every move of every game in a PDN stream
+    for game in read_games(stream):
+        for position, move in game.positions():
+            yield game, position, move
@@ -0,0 +1,95 @@
+import argparse
+import time
+from checkers.engine import (
+    VARIANTS,
+    Position,
+    generate_moves,
+    make_move,
+    unmake_move,
+    move_to_text,
+    position_from_fen,
+    position_to_fen,
+)
+
+
+# ................................................... perft ..................................................
+# Counts the leaves of the full move tree to check the move generator and time it:
+#
+#   python -m checkers.perft --variant international --depth 7
+#   python -m checkers.perft --fen "W:WK46:B9,10,19,20" --variant international --divide 3
+#
+# Published counts of the international start position, to check the 10x10 rules against
+INTERNATIONAL_PERFT = [1, 9, 81, 658, 4265, 27117, 167140, 1049442, 6483961, 41022423]
+
+
+def perft(position, depth):
+    """
+    This function counts the move sequences of a given length from a position.
+
+    Args:
+        position (Position): the board state, played on in place and restored
+        depth (int): plies to play
+
+    Returns:
+        int: the number of leaves of the move tree
+    """
+    moves = generate_moves(position, position.turn)
+    if depth <= 1:
+        # the moves of the last ply only need counting, not playing
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        make_move(position, move)
+        nodes += perft(position, depth - 1)
+        unmake_move(position)
+    return nodes
+
+
+def divide(position, depth):
+    # returns [(move text, leaves)] below every move of the position
+    counts = []
+    for move in generate_moves(position, position.turn):
+        make_move(position, move)
+        counts.append((move_to_text(move), perft(position, depth - 1)))
+        unmake_move(position)
+    return counts
+
+
+# .................................................. main ..................................................
+def main():
+    parser = argparse.ArgumentParser(description="Count the leaves of the move tree.")
+    parser.add_argument("--variant", choices=sorted(VARIANTS), default="checkers")
+    parser.add_argument("--fen", help="start from this position instead of the normal one")
+    parser.add_argument("--depth", type=int, default=6, help="deepest ply (default 6)")
+    parser.add_argument("--divide", type=int, metavar="DEPTH",
+                        help="print the leaves below every move at this depth instead")
+    args = parser.parse_args()
+
+    variant = VARIANTS[args.variant]
+    position = position_from_fen(args.fen, variant) if args.fen else Position(variant=variant)
+    print(position_to_fen(position))
+
+    if args.divide:
+        total = 0
+        for text, nodes in divide(position, args.divide):
+            print("%-8s %d" % (text, nodes))
+            total += nodes
+        print("total    %d" % total)
+        return
+
+    # the published counts only hold for the normal international start
+    expected = INTERNATIONAL_PERFT if variant.international and not args.fen else []
+    print("%-6s %12s %10s %12s" % ("depth", "leaves", "seconds", "leaves/s"))
+    for depth in range(1, args.depth + 1):
+        start = time.perf_counter()
+        nodes = perft(position, depth)
+        elapsed = time.perf_counter() - start
+        check = ""
+        if depth < len(expected):
+            check = "ok" if nodes == expected[depth] else "expected %d" % expected[depth]
+        print("%-6d %12d %10.2f %12d %s" % (
+            depth, nodes, elapsed, nodes / elapsed if elapsed > 0 else 0, check))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+import argparse
+import sys
+import threading
+from checkers.engine import (
+    CHECKERS,
+    VARIANTS,
+    Position,
+    make_move,
+    move_from_text,
+    move_to_text,
+    position_from_fen,
+    position_to_fen,
+)
+from checkers.nnue import Network
+from checkers.search import MAX_PLY, WIN_SCORE, JsonStatsLog, Search, SearchLimits, SearchOptions
+from checkers.tt import TranspositionTable
+
+
+# ............................................ engine protocol ..........................................
+# A line based text protocol in the style of UCI, so the AI can run as a long lived
+# subprocess of another program.  Commands read from stdin:
+#
+#   uci                                      -> id name ..., option ..., uciok
+#   isready                                  -> readyok
+#   setoption name Variant value international
+#                                            plays 10x10 international draughts from now on
+#   setoption name LMR value false           turns late move reductions off (or on)
+#   setoption name Futility value false      turns futility pruning off (or on)
+#   setoption name Hash value 64             resizes the transposition table to 64 MB
+#   setoption name MultiPV value 3           reports the 3 best moves, one info line each
+#   setoption name EvalFile value nnue.json  evaluates with a checkers.nnue network,
+#                                            <empty> for the material evaluation again
+#   ucinewgame                               back to the starting position
+#   position startpos [moves 22-18 9x18 ...]
+#   position fen <fen> [moves ...]
+#   go [depth N] [movetime MS] [nodes N] [infinite]
+#                                            -> info ... lines, then bestmove <move>
+#   stop                                     ends the running search, bestmove follows
+#   fen                                      -> fen <fen> of the current position
+#   quit
+#
+# Started with --stats-log FILE, the SearchStats of every search are appended to FILE as
+# JSON lines.  --hash-mb sets the size of the transposition table, which keeps the same
+# memory for the whole life of the process.
+#
+# Squares and moves use the engine's numbering, from the AI's back rank, see
+# checkers.engine.move_to_text; 8x8 PDN files number them the other way round.
+ENGINE_NAME = "Ultimate Checkers"
+MAX_MULTIPV = 32
+
+
+def format_score(score):
+    # returns the UCI score field for a score seen from the side to move
+    if abs(score) >= WIN_SCORE - MAX_PLY:
+        plies = WIN_SCORE - abs(score)
+        moves = (plies + 1) // 2
+        return "mate %d" % (moves if score > 0 else -moves)
+    return "cp %d" % round(score * 100)
+
+
+def format_info(info):
+    # returns the info line of a completed search iteration
+    line = "info depth %d" % info["depth"]
+    if "multipv" in info:
+        line += " multipv %d" % info["multipv"]
+    line += " score %s nodes %d nps %d time %d" % (
+        format_score(info["score"]),
+        info["nodes"],
+        info["nps"],
+        info["time"] * 1000,
+    )
+    if "hashfull" in info:
+        line += " hashfull %d" % info["hashfull"]
+    return line + " pv " + " ".join(move_to_text(move) for move in info["pv"])
+
+
+class EngineProtocol:
+    def __init__(self, output=sys.stdout, on_stats=None, hash_mb=16):
+        self.output = output
+        self.on_stats = on_stats  # receives the SearchStats of every search
+        self.output_lock = threading.Lock()
+        self.variant = CHECKERS
+        self.options = SearchOptions()
+        self.multipv = 1
+        self.network = None  # the checkers.nnue network evaluating the leaves, if any
+        self.tt = TranspositionTable(hash_mb)
+        self.position = Position()
+        self.search = None  # the running Search, if any
+        self.thread = None
+
+    def send(self, line):
+        # writes a line to the controller; searches report from their own thread
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def loop(self, lines=sys.stdin):
+        # handles commands until "quit" or the end of the input
+        for line in lines:
+            if not self.handle(line):
+                break
+        self.stop()
+
+    def handle(self, line):
+        # runs a single command; returns False when the engine should quit
+        words = line.split()
+        if not words:
+            return True
+        command, args = words[0], words[1:]
+
+        if command == "quit":
+            return False
+        elif command == "uci":
+            self.send("id name %s" % ENGINE_NAME)
+            self.send("option name Variant type combo default %s %s" % (
+                CHECKERS.name, " ".join("var %s" % name for name in VARIANTS)))
+            self.send("option name LMR type check default true")
+            self.send("option name Futility type check default true")
+            self.send("option name Hash type spin default %d min 1 max 4096" % self.tt.mb)
+            self.send("option name MultiPV type spin default 1 min 1 max %d" % MAX_MULTIPV)
+            self.send("option name EvalFile type string default <empty>")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.stop()
+            self.set_option(args)
+        elif command == "ucinewgame":
+            self.stop()
+            self.position = Position(variant=self.variant)
+            self.tt.clear()
+        elif command == "position":
+            self.stop()
+            self.set_position(args)
+        elif command == "go":
+            self.stop()
+            self.go(args)
+        elif command == "stop":
+            self.stop()
+        elif command == "fen":
+            self.send("fen %s" % position_to_fen(self.position))
+        else:
+            self.send("info string unknown command %s" % command)
+        return True
+
+    def set_option(self, args):
+        # setoption name <name> value <value>
+        text = " ".join(args)
+        name, _, value = text.partition(" value ")
+        name = name.replace("name", "", 1).strip().lower()
+        if name == "variant" and value.strip().lower() in VARIANTS:
+            self.variant = VARIANTS[value.strip().lower()]
+            self.position = Position(variant=self.variant)
+            if self.network is not None and self.network.variant is not self.variant:
+                self.send("info string the network is for %s, back to material" % (
+                    self.network.variant.name))
+                self.network = None
+        elif name in ("lmr", "futility") and value.strip().lower() in ("true", "false"):
+            setattr(self.options, name, value.strip().lower() == "true")
+        elif name == "hash" and value.strip().isdigit() and 1 <= int(value) <= 4096:
+            self.tt = None  # release the old table before allocating the new one
+            self.tt = TranspositionTable(int(value))
+        elif name == "multipv" and value.strip().isdigit() and 1 <= int(value) <= MAX_MULTIPV:
+            self.multipv = int(value)
+        elif name == "evalfile":
+            self.set_network(value.strip())
+        else:
+            self.send("info string unknown option %s" % text)
+
+    def set_network(self, path):
+        # loads the network of EvalFile, or goes back to the material evaluation
+        if path in ("", "<empty>"):
+            self.network = None
+        else:
+            try:
+                network = Network.load(path)
+            except (OSError, ValueError, KeyError) as error:
+                self.send("info string cannot load %s: %s" % (path, error))
+                return
+            if network.variant is not self.variant:
+                self.send("info string %s is a %s network" % (path, network.variant.name))
+                return
+            self.network = network
+        # the stored scores are those of the other evaluation
+        self.tt.clear()
+
+    def set_position(self, args):
+        # position startpos|fen <fen> [moves ...]
+        try:
+            if "moves" in args:
+                split = args.index("moves")
+                args, moves = args[:split], args[split + 1:]
+            else:
+                moves = []
+
+            if args[:1] == ["startpos"]:
+                position = Position(variant=self.variant)
+            elif args[:1] == ["fen"]:
+                position = position_from_fen(" ".join(args[1:]), self.variant)
+            else:
+                raise ValueError("expected startpos or fen")
+
+            for text in moves:
+                make_move(position, move_from_text(position, text))
+        except (ValueError, IndexError) as error:
+            self.send("info string bad position: %s" % error)
+            return
+        # the history of the moves is not needed by the search
+        position.undo_stack = []
+        self.position = position
+
+    def go(self, args):
+        # go [depth N] [movetime MS] [nodes N] [infinite]; infinite takes no value and
+        # changes nothing, the search runs until stop unless another limit is given
+        limits = SearchLimits()
+        tokens = iter(args)
+        try:
+            for name in tokens:
+                if name not in ("depth", "movetime", "nodes"):
+                    continue
+                value = next(tokens, None)
+                if value is None:
+                    raise ValueError("%s needs a value" % name)
+                if name == "depth":
+                    limits.depth = int(value)
+                elif name == "movetime":
+                    limits.movetime = int(value) / 1000
+                else:
+                    limits.nodes = int(value)
+        except ValueError as error:
+            self.send("info string bad go: %s" % error)
+            return
+
+        self.search = Search(
+            self.position.copy(), limits, info=self.report, on_stats=self.on_stats,
+            options=self.options, tt=self.tt, multipv=self.multipv, network=self.network,
+        )
+        self.thread = threading.Thread(target=self.think, args=(self.search,), daemon=True)
+        self.thread.start()
+
+    def think(self, search):
+        # runs in the search thread until the search completes or is stopped
+        score, move, pv = search.run()
+        self.send("bestmove %s" % (move_to_text(move) if move is not None else "none"))
+
+    def report(self, info):
+        self.send(format_info(info))
+
+    def stop(self):
+        # stops the running search and waits for its bestmove
+        if self.thread is not None:
+            self.search.stop()
+            self.thread.join()
+            self.thread = None
+            self.search = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the checkers engine over stdin/stdout.")
+    parser.add_argument("--stats-log", help="append the statistics of every search to this file")
+    parser.add_argument("--hash-mb", type=int, default=16,
+                        help="megabytes of transposition table (default 16)")
+    args = parser.parse_args()
+
+    on_stats = JsonStatsLog(args.stats_log) if args.stats_log else None
+    EngineProtocol(on_stats=on_stats, hash_mb=args.hash_mb).loop()
+
+
+if __name__ == "__main__":
+    main()
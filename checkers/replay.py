@@ -0,0 +1,336 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from checkers.engine import (
+    VARIANTS,
+    Position,
+    generate_moves,
+    make_move,
+    move_from_text,
+    unmake_move,
+)
+from checkers.pdn import read_games
+
+
+# .............................................. replay index ..............................................
+# Opens any game of a PDN archive at any ply without reading the games before it:
+#
+#   python -m checkers.replay games.pdn
+#
+# The index is built once, by reading the whole archive, and saved next to it as
+# <archive>.idx; it is built again when the archive changes size or modification time.
+# An index file is a header, then one block per game, then a table of the games:
+#   header    b"CKIX", format version, plies between keyframes, size and modification
+#             time (ns) of the archive it indexes, number of games, offset of the table
+#   block     the keyframes of the game, the position at every KEYFRAME_PLIES-th ply as
+#             the bitboards of the AI's pieces, the human's pieces and the kings and the
+#             side to move, then one code per move: the index of the move in the
+#             generate_moves() list of the position it is played in
+#   table     per game the byte offset of its text in the archive, the offset of its
+#             block, its number of plies and its variant
+# A position is read off the nearest keyframe before it and the few moves after that, so
+# reaching any ply of any game costs at most KEYFRAME_PLIES - 1 moves, however large the
+# archive and however long the game.  Stepping through a game is make_move and
+# unmake_move with the stored codes.
+MAGIC = b"CKIX"
+VERSION = 2  # 2: 8x8 PDN read in standard square numbers
+HEADER = struct.Struct("<4sHHQqQQ")
+GAME = struct.Struct("<QQIB3x")
+KEYFRAME = struct.Struct("<QQQB7x")
+CODE = struct.Struct("<H")
+KEYFRAME_PLIES = 16
+VARIANT_NAMES = sorted(VARIANTS)  # the variant of a game is stored as its index here
+BIG_ENDIAN = sys.byteorder == "big"
+
+
+def index_path(archive):
+    return archive + ".idx"
+
+
+class OffsetLines:
+    # iterates the lines of a binary file as text, keeping the byte offset of the current
+    # line and of the first line of the game being read
+    def __init__(self, file):
+        self.file = file
+        self.offset = 0  # of the current line
+        self.end = 0  # of the line after it
+        self.line = ""
+        self.start = None  # of the first line of the game being read, None before it
+
+    def __iter__(self):
+        for raw in self.file:
+            self.offset = self.end
+            self.end += len(raw)
+            self.line = raw.decode("utf-8", "replace")
+            if self.start is None and self.line.strip():
+                self.start = self.offset
+            yield self.line
+
+    def next_game(self):
+        # returns where the game just read started; a game ended by the header of the next
+        # one has already read the first line of that one
+        start = self.start
+        self.start = self.offset if self.line.lstrip().startswith("[") else None
+        return start
+
+
+def build_index(archive, path=None, progress=None, cancel=None):
+    """
+    This function reads every game of a PDN archive and writes its index.
+
+    A game with a move that is not legal is indexed up to that move.
+
+    Args:
+        archive (str): the PDN file
+        path (str): the index file, next to the archive if None
+        progress (function): called with the bytes of the archive read so far, after
+            every game
+        cancel (threading.Event): stops the build, leaving no index, when set
+
+    Returns:
+        int: the number of games indexed, None if the build was cancelled
+    """
+    path = path or index_path(archive)
+    stat = os.stat(archive)
+    table = bytearray()
+    games = 0
+    with open(archive, "rb") as source, open(path + ".part", "wb") as index:
+        index.write(bytes(HEADER.size))  # written once the table is in place
+        lines = OffsetLines(source)
+        for game in read_games(lines):
+            start = lines.next_game()
+            if cancel is not None and cancel.is_set():
+                break
+            block = index.tell()
+            keyframes = bytearray()
+            codes = array("H")
+            try:
+                position = game.start_position()
+                for ply, text in enumerate(game.moves):
+                    if ply % KEYFRAME_PLIES == 0:
+                        keyframes += keyframe(position)
+                    moves = generate_moves(position, position.turn)
+                    move = move_from_text(position, text, moves)
+                    codes.append(moves.index(move))
+                    make_move(position, move)
+            except ValueError:
+                # an illegal move or a broken FEN: keep the moves before it
+                if not keyframes:
+                    position = Position(variant=game.variant)
+            # the keyframe of the last ply, when it falls on one
+            if len(keyframes) < (len(codes) // KEYFRAME_PLIES + 1) * KEYFRAME.size:
+                keyframes += keyframe(position)
+            if BIG_ENDIAN:
+                codes.byteswap()
+            index.write(keyframes)
+            index.write(codes.tobytes())
+            table += GAME.pack(start or 0, block, len(codes),
+                               VARIANT_NAMES.index(game.variant.name))
+            games += 1
+            if progress is not None:
+                progress(lines.end)
+        else:
+            cancel = None
+        if cancel is not None:
+            index.close()
+            os.remove(path + ".part")
+            return None
+        offset = index.tell()
+        index.write(table)
+        index.seek(0)
+        index.write(HEADER.pack(MAGIC, VERSION, KEYFRAME_PLIES, stat.st_size, stat.st_mtime_ns,
+                                games, offset))
+    os.replace(path + ".part", path)
+    return games
+
+
+def keyframe(position):
+    return KEYFRAME.pack(position.pieces[0], position.pieces[1], position.kings, position.turn)
+
+
+class GameIndex:
+    """
+    The index of an archive mapped into memory.
+
+    Args:
+        path (str): the index file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size:
+            raise ValueError("%s: not a game index" % path)
+        (magic, version, self.keyframe_plies, self.archive_size, self.archive_mtime,
+         self.games, self.table) = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s: not a game index of format %d" % (path, VERSION))
+
+    def __len__(self):
+        return self.games
+
+    def indexes(self, archive):
+        # True when the index was built from the archive as it is now
+        stat = os.stat(archive)
+        return stat.st_size == self.archive_size and stat.st_mtime_ns == self.archive_mtime
+
+    def game(self, number):
+        """
+        Returns:
+            (int, int, int, Variant): the offset of the game's text in the archive, the
+            offset of its block in the index, its plies and its variant
+        """
+        if not 0 <= number < self.games:
+            raise IndexError("game %d of %d" % (number, self.games))
+        text, block, plies, variant = GAME.unpack_from(self.map, self.table + number * GAME.size)
+        return text, block, plies, VARIANTS[VARIANT_NAMES[variant]]
+
+    def code(self, block, plies, ply):
+        # returns the code of the move played at a ply of the game with this block
+        keyframes = plies // self.keyframe_plies + 1
+        return CODE.unpack_from(self.map, block + keyframes * KEYFRAME.size + ply * CODE.size)[0]
+
+    def position(self, number, ply):
+        """
+        This function sets up the position at a ply of a game, from the keyframe before it.
+
+        Args:
+            number (int): the game, counted from 0
+            ply (int): plies played, 0 for the start position
+
+        Returns:
+            Position: the board at that ply, with the moves since the keyframe on its undo
+            stack
+        """
+        text, block, plies, variant = self.game(number)
+        ply = max(0, min(ply, plies))
+        first = ply - ply % self.keyframe_plies
+        ai, human, kings, turn = KEYFRAME.unpack_from(
+            self.map, block + first // self.keyframe_plies * KEYFRAME.size
+        )
+        position = Position(setup=False, variant=variant)
+        position.pieces = [ai, human]
+        position.kings = kings
+        position.turn = turn
+        position.rehash()
+        for before in range(first, ply):
+            moves = generate_moves(position, position.turn)
+            make_move(position, moves[self.code(block, plies, before)])
+        return position
+
+    def close(self):
+        self.map.close()
+
+
+def open_index(archive, progress=None, cancel=None):
+    """
+    This function opens the index of an archive, building it first if there is none or the
+    archive has changed since.
+
+    Args:
+        archive (str): the PDN file
+        progress (function): see build_index
+        cancel (threading.Event): see build_index
+
+    Returns:
+        GameIndex: the index, None if building it was cancelled
+    """
+    path = index_path(archive)
+    if os.path.exists(path):
+        try:
+            index = GameIndex(path)
+            if index.indexes(archive):
+                return index
+            index.close()
+        except ValueError:
+            pass
+    if build_index(archive, path, progress, cancel) is None:
+        return None
+    return GameIndex(path)
+
+
+# ................................................. replay .................................................
+class Replay:
+    """
+    A game of an indexed archive being played through.
+
+    Args:
+        index (GameIndex): the index of the archive
+        archive (str): the PDN file, to read the headers of the games from
+    """
+
+    def __init__(self, index, archive):
+        self.index = index
+        self.archive = archive
+        self.number = 0  # the game shown, counted from 0
+        self.ply = 0  # plies of it played
+        self.plies = 0
+        self.variant = None
+        self.block = 0
+        self.position = None
+        if len(index):
+            self.goto(0)
+
+    def __len__(self):
+        return len(self.index)
+
+    def goto(self, number, ply=0):
+        # shows a game at a ply, both clamped to what there is
+        number = max(0, min(number, len(self.index) - 1))
+        text, self.block, self.plies, self.variant = self.index.game(number)
+        self.number = number
+        self.ply = max(0, min(ply, self.plies))
+        self.position = self.index.position(number, self.ply)
+
+    def forward(self):
+        # plays the next move of the game
+        if self.ply < self.plies:
+            position = self.position
+            moves = generate_moves(position, position.turn)
+            make_move(position, moves[self.index.code(self.block, self.plies, self.ply)])
+            self.ply += 1
+
+    def back(self):
+        # takes back the last move, from the keyframe before it once the moves played
+        # since the position was set up have all been taken back
+        if self.ply == 0:
+            return
+        if self.position.undo_stack:
+            unmake_move(self.position)
+            self.ply -= 1
+        else:
+            self.goto(self.number, self.ply - 1)
+
+    def headers(self):
+        # returns the headers and the result of the game shown, read from the archive
+        text = self.index.game(self.number)[0]
+        with open(self.archive, "rb") as file:
+            file.seek(text)
+            game = next(read_games(line.decode("utf-8", "replace") for line in file), None)
+        if game is None:
+            return {}, "*"
+        return game.headers, game.result
+
+
+# .................................................. main ..................................................
+def main():
+    parser = argparse.ArgumentParser(description="Build the replay index of a PDN archive.")
+    parser.add_argument("archive", help="PDN file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    games = build_index(args.archive)
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(args.archive)
+    print("indexed %d games of %.1f MB in %.1f s (%.1f MB/s) into %s (%.1f MB)" % (
+        games, size / 1e6, elapsed, size / 1e6 / max(elapsed, 1e-9),
+        index_path(args.archive), os.path.getsize(index_path(args.archive)) / 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,605 @@
+import json
+import math
+import time
+from checkers.engine import (
+    AI,
+    HUMAN,
+    iter_moves,
+    generate_moves,
+    has_moves,
+    make_move,
+    unmake_move,
+    evaluate,
+    repetitions,
+    winner,
+    move_to_text,
+    position_to_fen,
+)
+from checkers.tt import EXACT, LOWER, UPPER
+
+# Score of a won game; wins found sooner score higher so the search goes for the quickest one
+WIN_SCORE = 1000
+MAX_PLY = 128
+
+
+# .................................................. algorithm ............................................................
+def minimax(position, depth, max_player, alpha, beta, expand=iter_moves):
+    """
+    This function implements the minimax algorithm with alpha-beta pruning to find the best move
+    for a given player at a given depth.
+
+    The moves are played on the position with make_move and taken back with unmake_move, so
+    no board is ever copied while searching.  They are expanded lazily one at a time, so a
+    cutoff stops the remaining siblings from being generated at all.
+
+    Args:
+        position (Position): the current board state, played on in place
+        depth (int): the current depth of the search
+        max_player (bool): True if the current player is the maximizing player, False if the current player is the minimizing player
+        alpha (int): the current alpha value for alpha-beta pruning
+        beta (int): the current beta value for alpha-beta pruning
+        expand (function): the move generator, iter_moves or the eager generate_moves
+
+    Returns:
+        (int, int): a tuple containing the score of the best move and the packed move itself
+    """
+    if depth == 0 or winner(position) != None:
+        # Base case: if we've reached the maximum depth or there's a winner, return the evaluation of the board state
+        return evaluate(position), None
+
+    if max_player:
+        # If it's the maximizing player's turn
+        maxEval = -math.inf
+        best_move = None
+        for move in expand(position, AI):
+            # For each possible move, calculate the minimax score recursively
+            make_move(position, move)
+            evaluation = minimax(position, depth - 1, False, alpha, beta, expand)[0]
+            unmake_move(position)
+
+            # If the evaluation is better than the current best evaluation, update the best evaluation and best move
+            if evaluation > maxEval:
+                maxEval = evaluation
+                best_move = move
+
+            # Update alpha value for alpha-beta pruning
+            alpha = max(alpha, maxEval)
+            if alpha >= beta:
+                # If alpha is greater than or equal to beta, pruning occurs and we break out of the loop
+                break
+
+        return maxEval, best_move
+    else:
+        # If it's the minimizing player's turn
+        minEval = math.inf
+        best_move = None
+        for move in expand(position, HUMAN):
+            # For each possible move, calculate the minimax score recursively
+            make_move(position, move)
+            evaluation = minimax(position, depth - 1, True, alpha, beta, expand)[0]
+            unmake_move(position)
+
+            # If the evaluation is better than the current best evaluation, update the best evaluation and best move
+            if evaluation < minEval:
+                minEval = evaluation
+                best_move = move
+
+            # Update beta value for alpha-beta pruning
+            beta = min(beta, minEval)
+            if alpha >= beta:
+                # If alpha is greater than or equal to beta, pruning occurs and we break out of the loop
+                break
+
+        return minEval, best_move
+
+
+# ............................................ iterative deepening ..........................................
+class SearchLimits:
+    def __init__(self, depth=None, movetime=None, nodes=None):
+        self.depth = depth  # deepest iteration to search, None for no limit
+        self.movetime = movetime  # seconds to think, None for no limit
+        self.nodes = nodes  # nodes to visit, None for no limit
+
+
+class SearchOptions:
+    """
+    Switches for the selective parts of the search, so each can be measured on its own.
+
+    Args:
+        lmr (bool): late move reductions, quiet moves late in the order are searched one
+            ply shallower and searched again at full depth only if they beat alpha
+        futility (bool): futility pruning, quiet moves one or two plies above the leaves
+            are skipped when the static evaluation is too far below alpha to catch up
+    """
+
+    LMR_MIN_DEPTH = 3  # remaining depth from which late moves are reduced
+    LMR_FULL_MOVES = 3  # moves searched at full depth before reducing
+    FUTILITY_MARGIN = {1: 1.0, 2: 2.0}  # kings' worth of margin by remaining depth
+
+    def __init__(self, lmr=True, futility=True):
+        self.lmr = lmr
+        self.futility = futility
+
+
+class SearchStopped(Exception):
+    # raised inside the tree when a limit is hit or the search is cancelled
+    pass
+
+
+class CancelToken:
+    """
+    Tells running searches to stop, from any thread: the window, the protocol front-end or
+    a time manager.  A search looks at its token every Search.CHECK_EVERY nodes, a few
+    milliseconds apart, and then returns the best move it has fully searched.
+
+    Args:
+        deadline (float): time.perf_counter() at which the token cancels itself, None for never
+    """
+
+    def __init__(self, deadline=None):
+        self.cancelled = False
+        self.deadline = deadline
+
+    def cancel(self):
+        # stops every search watching the token
+        self.cancelled = True
+
+    def cancel_after(self, seconds):
+        # cancels the token once seconds have passed, unless it is due sooner already
+        deadline = time.perf_counter() + seconds
+        if self.deadline is None or deadline < self.deadline:
+            self.deadline = deadline
+
+    def is_cancelled(self):
+        if not self.cancelled and self.deadline is not None:
+            self.cancelled = time.perf_counter() >= self.deadline
+        return self.cancelled
+
+
+class SearchStats:
+    """
+    Counters a Search fills in while it runs, to find regressions and tune difficulty levels.
+
+    Attributes:
+        nodes (int): positions visited by the main search
+        qnodes (int): positions visited by the quiescence search
+        cutoffs (list): beta cutoffs counted by the index of the move that caused them
+        tt_probes (int): transposition table lookups
+        tt_hits (int): lookups that found the position
+        expanded (int): nodes whose moves were searched
+        children (int): moves searched below those nodes
+        reductions (int): late moves searched at reduced depth
+        researches (int): reduced moves searched again at full depth
+        pruned (int): moves skipped by futility pruning
+        iterations (list): {"depth", "nodes", "time", "score"} of every completed iteration
+    """
+
+    def __init__(self):
+        self.nodes = 0
+        self.qnodes = 0
+        self.cutoffs = []
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.expanded = 0
+        self.children = 0
+        self.reductions = 0
+        self.researches = 0
+        self.pruned = 0
+        self.iterations = []
+        self.fen = None  # the searched position
+        self.best_move = None
+        self.score = None
+        self.time = 0.0
+
+    def add_cutoff(self, index):
+        # counts a beta cutoff by the move at the given index
+        while len(self.cutoffs) <= index:
+            self.cutoffs.append(0)
+        self.cutoffs[index] += 1
+
+    def branching_factor(self):
+        # returns the average number of moves searched below an expanded node
+        return self.children / self.expanded if self.expanded else 0.0
+
+    def effective_branching_factor(self):
+        # returns the growth in nodes between the two deepest completed iterations
+        if len(self.iterations) < 2 or not self.iterations[-2]["nodes"]:
+            return 0.0
+        return self.iterations[-1]["nodes"] / self.iterations[-2]["nodes"]
+
+    def first_move_cutoff_rate(self):
+        # returns the share of cutoffs caused by the first move, a measure of move ordering
+        total = sum(self.cutoffs)
+        return self.cutoffs[0] / total if total else 0.0
+
+    def to_dict(self):
+        return {
+            "fen": self.fen,
+            "best_move": self.best_move,
+            "score": self.score,
+            "time": self.time,
+            "nodes": self.nodes,
+            "qnodes": self.qnodes,
+            "nps": int((self.nodes + self.qnodes) / self.time) if self.time > 0 else 0,
+            "cutoffs": self.cutoffs,
+            "first_move_cutoff_rate": self.first_move_cutoff_rate(),
+            "tt_probes": self.tt_probes,
+            "tt_hits": self.tt_hits,
+            "reductions": self.reductions,
+            "researches": self.researches,
+            "pruned": self.pruned,
+            "branching_factor": self.branching_factor(),
+            "effective_branching_factor": self.effective_branching_factor(),
+            "iterations": self.iterations,
+        }
+
+
+class JsonStatsLog:
+    # a stats callback that appends every finished search to a file as one line of JSON
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, stats):
+        with open(self.path, "a") as log:
+            log.write(json.dumps(stats.to_dict()) + "\n")
+
+
+class Search:
+    """
+    Iterative deepening negamax with alpha-beta pruning for the side to move.
+
+    Every iteration searches one ply deeper than the last, starting with the previous best
+    move, so the search can be stopped at any time.  When a limit runs out or the token is
+    cancelled from another thread the search returns the best move it has fully searched:
+    the result of the deepest completed iteration, or a root move of the unfinished one
+    that has already been searched to the end and scored better.
+
+    With multipv above 1 every iteration finds that many best root moves, each with its
+    exact score and principal variation, in self.lines.
+
+    Args:
+        position (Position): the board state to search, restored before run() returns
+        limits (SearchLimits): when to stop, no limit at all if None
+        info (function): called with a dict after every completed iteration
+        on_stats (function): called with the SearchStats once the search is over
+        options (SearchOptions): which selective techniques to use, all of them if None
+        tt (TranspositionTable): the table to share results through, None for no table
+        token (CancelToken): stops the search when cancelled, a token of its own if None
+        multipv (int): number of best root moves to find, 1 for the best one only
+        network (checkers.nnue.Network): evaluates the leaves in place of the material
+            evaluation when given; its accumulator follows the moves of the search
+    """
+
+    # nodes between two looks at the clock and the token, about 3 ms at 80k nodes a second
+    CHECK_EVERY = 256
+
+    def __init__(self, position, limits=None, info=None, on_stats=None, options=None,
+                 tt=None, token=None, multipv=1, network=None):
+        self.position = position
+        self.limits = limits or SearchLimits()
+        self.options = options or SearchOptions()
+        self.tt = tt
+        self.info = info
+        self.on_stats = on_stats
+        self.stats = SearchStats()
+        self.token = token or CancelToken()
+        self.deadline = None
+        self.next_check = 0  # node count at which to look at the limits again
+        self.root_best = None  # (score, pv) of the best root move of the current iteration
+        self.pv_table = [[] for _ in range(MAX_PLY + 1)]
+        self.multipv = multipv
+        self.lines = []  # (score, pv) of the best root moves of the deepest completed iteration
+        self.partial_lines = []  # the lines the unfinished iteration has completed
+        self.network = network
+        self.static = evaluate if network is None else network.evaluate
+
+    @property
+    def nodes(self):
+        return self.stats.nodes
+
+    @property
+    def stopped(self):
+        return self.token.cancelled
+
+    def stop(self):
+        # asks a running search to return as soon as possible
+        self.token.cancel()
+
+    def run(self):
+        """
+        Returns:
+            (float, int, list): the score for the side to move, the best move and the
+            principal variation of the deepest completed iteration, or of a root move of
+            the unfinished one that beat its best move
+        """
+        position = self.position
+        stats = self.stats
+        stats.fen = position_to_fen(position)
+        start = time.perf_counter()
+        if self.limits.movetime is not None:
+            self.deadline = start + self.limits.movetime
+        self.schedule_check()
+        root_depth = len(position.undo_stack)
+        if self.tt is not None:
+            self.tt.new_search()
+        if self.network is not None:
+            self.network.attach(position)
+
+        max_depth = min(self.limits.depth or MAX_PLY, MAX_PLY)
+        root_moves = generate_moves(position, position.turn)
+        if root_moves:
+            best = (self.evaluate(), root_moves[0], [root_moves[0]])
+        else:
+            best = (self.evaluate(), None, [])
+            max_depth = 0
+
+        for depth in range(1, max_depth + 1):
+            try:
+                if self.multipv > 1:
+                    lines = self.root_lines(root_moves, depth)
+                else:
+                    score = self.root(root_moves, depth)
+                    lines = [(score, list(self.pv_table[0]))]
+            except SearchStopped:
+                while len(position.undo_stack) > root_depth:
+                    unmake_move(position)
+                # the best of the lines the unfinished iteration completed is the best of
+                # all moves at this depth
+                if self.partial_lines:
+                    score, pv = self.partial_lines[0]
+                    best = (score, pv[0], pv)
+                elif self.root_best is not None:
+                    # a root move searched to the end replaces the shallower result when it
+                    # beat the previous best move at this depth, or is that move scoring
+                    # better; a previous best failing low may still be the best of all
+                    # moves, the others were not searched yet
+                    score, pv = self.root_best
+                    if not stats.iterations or pv[0] != best[1] or score > best[0]:
+                        best = (score, pv[0], pv)
+                break
+
+            self.lines = lines
+            score, pv = lines[0]
+            best = (score, pv[0], pv)
+            # search the best moves first in the next iteration, in the order found
+            for _, line in reversed(lines):
+                root_moves.remove(line[0])
+                root_moves.insert(0, line[0])
+
+            elapsed = time.perf_counter() - start
+            previous = stats.iterations[-1] if stats.iterations else {"nodes": 0, "time": 0.0}
+            stats.iterations.append(
+                {
+                    "depth": depth,
+                    "nodes": stats.nodes - previous["nodes"],
+                    "time": elapsed - previous["time"],
+                    "score": score,
+                }
+            )
+            if self.info is not None:
+                for number, (line_score, line) in enumerate(lines, 1):
+                    info = {
+                        "depth": depth,
+                        "score": line_score,
+                        "nodes": stats.nodes,
+                        "time": elapsed,
+                        "nps": int(stats.nodes / elapsed) if elapsed > 0 else 0,
+                        "pv": line,
+                    }
+                    if self.multipv > 1:
+                        info["multipv"] = number
+                    if self.tt is not None:
+                        info["hashfull"] = self.tt.hashfull()
+                    self.info(info)
+            if len(root_moves) == 1 or self.multipv == 1 and abs(score) >= WIN_SCORE - MAX_PLY:
+                # the result cannot change any more
+                break
+
+        if self.network is not None:
+            position.accumulator = None
+        stats.time = time.perf_counter() - start
+        stats.score = best[0]
+        stats.best_move = move_to_text(best[1]) if best[1] is not None else None
+        if self.on_stats is not None:
+            self.on_stats(stats)
+        return best
+
+    def root(self, moves, depth):
+        # searches every root move to the given depth and returns the best score
+        position = self.position
+        alpha = -math.inf
+        self.pv_table[0] = []
+        self.root_best = None
+        self.stats.expanded += 1
+        self.stats.children += len(moves)
+        for move in moves:
+            make_move(position, move)
+            score = -self.negamax(depth - 1, 1, -math.inf, -alpha)
+            unmake_move(position)
+            if score > alpha:
+                alpha = score
+                self.pv_table[0] = [move] + self.pv_table[1]
+                self.root_best = (alpha, self.pv_table[0])
+        return alpha
+
+    def root_lines(self, moves, depth):
+        # multi-PV: searches the root once per line with a full window, each time without
+        # the moves of the lines found before, so every line is the best of the moves left
+        # with its exact score.  The later passes mostly hit the transposition table.
+        lines = self.partial_lines = []
+        remaining = list(moves)
+        while remaining and len(lines) < self.multipv:
+            score = self.root(remaining, depth)
+            pv = self.pv_table[0]
+            lines.append((score, pv))
+            remaining.remove(pv[0])
+        self.partial_lines = []
+        return lines
+
+    def negamax(self, depth, ply, alpha, beta):
+        # returns the score of the position for the side to move
+        stats = self.stats
+        stats.nodes += 1
+        if stats.nodes >= self.next_check:
+            self.check_limits()
+        self.pv_table[ply] = []
+
+        position = self.position
+        color = position.turn
+        if not position.pieces[color]:
+            return -(WIN_SCORE - ply)
+        quiet_plies = position.quiet_plies
+        if quiet_plies >= 4 and (
+            quiet_plies >= position.variant.draw_plies or repetitions(position)
+        ):
+            return 0  # a position seen before, or too long without progress: a tie
+        stuck_loses = position.variant.stuck_loses
+        if not stuck_loses and not has_moves(position, 1 - color):
+            return 0  # the game is a tie once either side is stuck
+        if depth <= 0 or ply >= MAX_PLY:
+            return self.evaluate()
+
+        # a result stored by an earlier search of this position may settle it at once; its
+        # best move is searched first either way
+        tt = self.tt
+        tt_move = None
+        if tt is not None:
+            stats.tt_probes += 1
+            entry = tt.probe(position.hash)
+            if entry is not None:
+                stats.tt_hits += 1
+                tt_depth, bound, score, tt_move = entry
+                if tt_depth >= depth:
+                    # mate scores are stored as distances from the stored position
+                    if score >= WIN_SCORE - MAX_PLY:
+                        score -= ply
+                    elif score <= -(WIN_SCORE - MAX_PLY):
+                        score += ply
+                    if (
+                        bound == EXACT
+                        or bound == LOWER and score >= beta
+                        or bound == UPPER and score <= alpha
+                    ):
+                        if bound == EXACT and alpha < score < beta:
+                            # a hit inside the window is part of the principal variation,
+                            # whose line must not end here; a mate line goes on to the mate
+                            length = depth
+                            if abs(score) >= WIN_SCORE - MAX_PLY:
+                                length = max(depth, round(WIN_SCORE - abs(score)) - ply)
+                            self.pv_table[ply] = self.tt_line(tt_move, length)
+                        return score
+        alpha_start = alpha
+
+        options = self.options
+        variant = position.variant
+        # quiet moves near the leaves cannot lift a hopeless static score up to alpha
+        futile = (
+            options.futility
+            and depth in options.FUTILITY_MARGIN
+            and abs(alpha) < WIN_SCORE - MAX_PLY
+            and self.evaluate() + options.FUTILITY_MARGIN[depth] * variant.king_value <= alpha
+        )
+        reduce = options.lmr and depth >= options.LMR_MIN_DEPTH
+        crown_row = variant.crown_row[color]
+
+        moves = iter_moves(position, color)
+        if tt_move is not None:
+            moves = generate_moves(position, color)
+            for index, move in enumerate(moves):
+                if move & 0xFFF == tt_move:
+                    moves.insert(0, moves.pop(index))
+                    break
+
+        best = -math.inf
+        best_move = None
+        index = -1
+        for index, move in enumerate(moves):
+            # captures and promotions are always searched in full
+            quiet = not move >> 12 and (
+                position.kings & (1 << (move & 63)) or not crown_row & (1 << (move >> 6 & 63))
+            )
+            if futile and quiet and index > 0:
+                stats.pruned += 1
+                continue
+            make_move(position, move)
+            if reduce and quiet and index >= options.LMR_FULL_MOVES:
+                stats.reductions += 1
+                score = -self.negamax(depth - 2, ply + 1, -beta, -alpha)
+                if score > alpha:
+                    stats.researches += 1
+                    score = -self.negamax(depth - 1, ply + 1, -beta, -alpha)
+            else:
+                score = -self.negamax(depth - 1, ply + 1, -beta, -alpha)
+            unmake_move(position)
+            if score > best:
+                best = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    self.pv_table[ply] = [move] + self.pv_table[ply + 1]
+                    if alpha >= beta:
+                        stats.add_cutoff(index)
+                        break
+
+        if index < 0:
+            # the side to move is stuck: it has lost or the game is a tie
+            return -(WIN_SCORE - ply) if stuck_loses else 0
+        stats.expanded += 1
+        stats.children += index + 1
+        if tt is not None and best_move is not None:
+            if best >= beta:
+                bound = LOWER
+            elif best > alpha_start:
+                bound = EXACT
+            else:
+                bound = UPPER
+            stored = best
+            if best >= WIN_SCORE - MAX_PLY:
+                stored += ply
+            elif best <= -(WIN_SCORE - MAX_PLY):
+                stored -= ply
+            tt.store(position.hash, depth, bound, stored, best_move)
+        return best
+
+    def tt_line(self, move, length):
+        # returns the line of best moves the table holds from the position, starting with
+        # move (origin | destination << 6), at most length moves long
+        position = self.position
+        tt = self.tt
+        line = []
+        while move is not None and len(line) < length:
+            move = next(
+                (legal for legal in generate_moves(position, position.turn)
+                 if legal & 0xFFF == move),
+                None,
+            )
+            if move is None:
+                break
+            line.append(move)
+            make_move(position, move)
+            entry = tt.probe(position.hash)
+            move = entry[3] if entry is not None else None
+        for _ in line:
+            unmake_move(position)
+        return line
+
+    def evaluate(self):
+        # returns the static evaluation for the side to move
+        score = self.static(self.position)
+        return score if self.position.turn == AI else -score
+
+    def check_limits(self):
+        if self.token.is_cancelled():
+            raise SearchStopped
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchStopped
+        if self.limits.nodes is not None and self.stats.nodes >= self.limits.nodes:
+            raise SearchStopped
+        self.schedule_check()
+
+    def schedule_check(self):
+        # looks at the limits again after CHECK_EVERY nodes, or exactly when the node
+        # budget runs out if that comes first
+        self.next_check = self.stats.nodes + self.CHECK_EVERY
+        if self.limits.nodes is not None:
+            self.next_check = min(self.next_check, self.limits.nodes)
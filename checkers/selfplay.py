@@ -0,0 +1,161 @@
+import argparse
+import random
+import time
+from checkers.bench import BENCH_POSITIONS
+from checkers.engine import AI, CHECKERS, DRAW, HUMAN, VARIANTS, position_from_fen
+from checkers.game import GameState
+from checkers.search import Search, SearchLimits, SearchOptions
+
+
+# ................................................ self-play ................................................
+# Measures what each selective-search switch buys:
+#
+#   python -m checkers.selfplay --depth 7 --games 20 --movetime 100
+#
+# For every configuration it prints the time and nodes the search needs to reach each depth
+# on the benchmark positions, then plays a match against the plain full-width search from
+# the same random openings, each opening once with either color.
+CONFIGS = {
+    "none": SearchOptions(lmr=False, futility=False),
+    "lmr": SearchOptions(lmr=True, futility=False),
+    "futility": SearchOptions(lmr=False, futility=True),
+    "all": SearchOptions(lmr=True, futility=True),
+}
+
+
+def time_to_depth(options, depth, fens, variant):
+    """
+    This function searches every position to a fixed depth.
+
+    Args:
+        options (SearchOptions): the switches to search with
+        depth (int): the depth to reach
+        fens (list): the positions to search
+        variant (Variant): the board size and rules of the positions
+
+    Returns:
+        list: [seconds, nodes] summed over the positions for every depth from 1
+    """
+    totals = [[0.0, 0] for _ in range(depth)]
+    for fen in fens:
+        search = Search(position_from_fen(fen, variant), SearchLimits(depth=depth),
+                        options=options)
+        search.run()
+        for iteration in search.stats.iterations:
+            totals[iteration["depth"] - 1][0] += iteration["time"]
+            totals[iteration["depth"] - 1][1] += iteration["nodes"]
+    # the searches report every iteration on its own, the cost of a depth includes the
+    # iterations before it
+    for index in range(1, depth):
+        totals[index][0] += totals[index - 1][0]
+        totals[index][1] += totals[index - 1][1]
+    return totals
+
+
+def openings(count, plies, variant, seed):
+    # returns count lists of random opening moves, the same ones for every configuration
+    rng = random.Random(seed)
+    result = []
+    while len(result) < count:
+        game = GameState(variant=variant)
+        for _ in range(plies):
+            if game.is_over():
+                break
+            game.play(rng.choice(game.legal_moves()))
+        if not game.is_over():
+            result.append(list(game.moves))
+    return result
+
+
+def play_game(opening, players, limits, variant, max_plies):
+    # plays one game after an opening; players maps AI and HUMAN to their SearchOptions
+    game = GameState(max_plies=max_plies, variant=variant)
+    for move in opening:
+        game.play(move)
+    while not game.is_over():
+        search = Search(game.position, limits, options=players[game.turn])
+        game.play(search.run()[1])
+    return game.result()
+
+
+def match(options, baseline, games, limits, variant, max_plies=200, seed=1):
+    """
+    This function plays a match of a configuration against a baseline.
+
+    Args:
+        options (SearchOptions): the configuration being measured
+        baseline (SearchOptions): its opponent
+        games (int): games to play, rounded up to an even number
+        limits (SearchLimits): the limits of every move's search
+        variant (Variant): the board size and rules
+        max_plies (int): plies after which a game is called a tie
+        seed (int): seed of the random openings
+
+    Returns:
+        (int, int, int): wins, draws and losses of the configuration
+    """
+    wins = draws = losses = 0
+    for opening in openings((games + 1) // 2, 4, variant, seed):
+        for side in (AI, HUMAN):
+            players = {side: options, 1 - side: baseline}
+            result = play_game(opening, players, limits, variant, max_plies)
+            if result == DRAW:
+                draws += 1
+            elif result == side:
+                wins += 1
+            else:
+                losses += 1
+    return wins, draws, losses
+
+
+# .................................................. main ..................................................
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure time to depth and strength of every selective-search switch."
+    )
+    parser.add_argument("--variant", choices=sorted(VARIANTS), default="checkers")
+    parser.add_argument("--depth", type=int, default=7, help="time-to-depth target (default 7)")
+    parser.add_argument("--games", type=int, default=10, help="games per match (default 10)")
+    parser.add_argument("--movetime", type=int, default=50,
+                        help="milliseconds per move in the matches (default 50)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    variant = VARIANTS[args.variant]
+    if variant is CHECKERS:
+        fens = BENCH_POSITIONS
+    else:
+        # the start position and two positions a few random plies into the game
+        fens = []
+        for moves in [[]] + openings(2, 8, variant, args.seed):
+            game = GameState(variant=variant)
+            for move in moves:
+                game.play(move)
+            fens.append(game.fen())
+
+    print("time to depth over %d positions (seconds / nodes)" % len(fens))
+    print("%-9s" % "depth" + "".join("%16d" % depth for depth in range(1, args.depth + 1)))
+    for name, options in CONFIGS.items():
+        totals = time_to_depth(options, args.depth, fens, variant)
+        print("%-9s" % name + "".join(
+            "%16s" % ("%.2f/%d" % (seconds, nodes)) for seconds, nodes in totals))
+
+    if args.games <= 0:
+        return
+    limits = SearchLimits(movetime=args.movetime / 1000)
+    print()
+    print("matches against 'none' at %d ms per move" % args.movetime)
+    for name, options in CONFIGS.items():
+        if name == "none":
+            continue
+        start = time.perf_counter()
+        wins, draws, losses = match(options, CONFIGS["none"], args.games, limits, variant,
+                                    seed=args.seed)
+        total = wins + draws + losses
+        print("%-9s +%d =%d -%d  score %.1f%%  (%.0f s)" % (
+            name, wins, draws, losses, 100 * (wins + draws / 2) / total,
+            time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
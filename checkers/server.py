@@ -0,0 +1,383 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from checkers.difficulty import PROFILES, DifficultySearch
+from checkers.engine import (
+    AI,
+    HUMAN,
+    move_to_text,
+    position_from_fen,
+    position_to_fen,
+    unmake_move,
+)
+from checkers.game import GameState
+from checkers.pdn import append_game
+from checkers.search import Search, SearchLimits
+from checkers.tt import shared_table
+
+
+# ............................................... game server ..........................................
+# Hosts many games at once for clients connected to a local socket.  Every request and every
+# reply is one line of JSON:
+#
+#   {"op": "new", "ai": "W", "budget": 60}   -> {"ok": true, "game": 1, "state": {...}}
+#   {"op": "new", "ai": "W", "level": "Easy"}
+#   {"op": "move", "game": 1, "move": "22-18"}
+#                                            -> {"ok": true, "ai_move": "9-13", "state": {...}}
+#   {"op": "state", "game": 1}               -> {"ok": true, "state": {...}}
+#   {"op": "close", "game": 1}               -> {"ok": true}
+#   {"op": "stats"}                          -> {"ok": true, "stats": {...}}
+#
+# "ai" is the side the AI plays ("W", "B" or "none") and "budget" the seconds of thinking
+# time it may spend on the whole game.  With "level" the AI plays at that difficulty of
+# checkers.difficulty instead, on a node budget per move and without a time budget.
+# Whenever it is the AI's turn the reply waits until the AI has moved.  Errors come back
+# as {"ok": false, "error": "..."}; when the AI cannot answer a move, because a worker
+# failed, the move is taken back so the game is as before the request.  A request line
+# longer than the stream limit gets an error and closes the connection.
+#
+# Searches run in a bounded pool of worker processes.  A game never has more than one
+# search waiting, and waiting searches are served first come first served, so a busy game
+# cannot starve the others.  Levels of at most INLINE_NODES nodes a move cost less than
+# sending the search to a worker would, they are searched in the server process itself.
+# A search is sent as a job: the FEN of the position, plus the hashes of the positions since
+# the last capture or man move and their count, so the worker sees repetition draws and
+# the plies without progress of the game as well.
+# Started with --pdn FILE, every finished game is appended to
+# FILE in Portable Draughts Notation.
+SIDES = {"W": AI, "B": HUMAN}
+INLINE_NODES = 100
+
+
+def make_job(position):
+    # returns the job of a position: its FEN, the part of its history a search looks at
+    # and its plies without progress
+    history = position.history
+    start = max(len(history) - position.quiet_plies, 0)
+    return position_to_fen(position), history[start:].tobytes(), position.quiet_plies
+
+
+def job_position(job):
+    # returns the Position of a job, with the history it was sent with
+    fen, history, quiet_plies = job
+    position = position_from_fen(fen)
+    position.history = array("Q", history)
+    position.quiet_plies = quiet_plies
+    return position
+
+
+def search_move(job, movetime, depth, hash_mb=16):
+    """
+    This function runs in a worker process and searches a single position.
+
+    Args:
+        job (tuple): the position to search, see make_job
+        movetime (float): seconds the search may take
+        depth (int): deepest iteration, None for no limit
+        hash_mb (int): size of the transposition table of the worker process
+
+    Returns:
+        (int, float, int, float): the best move, its score, the nodes searched and the
+        seconds spent
+    """
+    start = time.perf_counter()
+    search = Search(
+        job_position(job),
+        SearchLimits(depth=depth, movetime=movetime),
+        tt=shared_table(hash_mb),
+    )
+    score, move, pv = search.run()
+    return move, score, search.nodes, time.perf_counter() - start
+
+
+def level_move(job, level):
+    """
+    This function picks the move of the AI at a difficulty level, in a worker process or,
+    for the cheapest levels, in the server process.
+
+    Args:
+        job (tuple): the position to search, see make_job
+        level (str): the name of the difficulty profile
+
+    Returns:
+        (int, float, int, float): the move, its score, the nodes searched and the seconds
+        spent
+    """
+    start = time.perf_counter()
+    search = DifficultySearch(job_position(job), PROFILES[level], random.getrandbits(64))
+    score, move = search.choose()
+    return move, score, search.nodes, time.perf_counter() - start
+
+
+class ServerGame:
+    def __init__(self, game_id, ai, budget, level=None):
+        self.id = game_id
+        self.state = GameState()
+        self.ai = ai  # side played by the AI, None if both sides are clients
+        self.budget = budget  # seconds of AI thinking time left for the game
+        self.level = level  # difficulty profile of the AI, None for the full-strength search
+        self.lock = asyncio.Lock()  # one request at a time per game
+
+    def ai_to_move(self):
+        return self.ai is not None and self.state.turn == self.ai and not self.state.is_over()
+
+    def movetime(self):
+        # shares the budget left over the moves the game is still expected to last
+        moves_left = max(10, (self.state.max_plies - len(self.state.moves)) // 2)
+        return max(0.01, self.budget / moves_left)
+
+
+class SearchScheduler:
+    """
+    Dispatches AI searches to a bounded pool of worker processes in arrival order.
+
+    Args:
+        workers (int): number of worker processes
+        depth (int): deepest iteration of every search, None for time limited only
+        hash_mb (int): megabytes of transposition table per worker process
+    """
+
+    def __init__(self, workers, depth=None, hash_mb=16):
+        self.workers = workers
+        self.depth = depth
+        self.hash_mb = hash_mb  # transposition table of every worker process
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.waiting = deque()  # (job, movetime, level, future) in arrival order
+        self.ready = asyncio.Semaphore(0)  # counts the searches waiting
+        self.tasks = []
+        self.searches = 0
+        self.nodes = 0
+        self.busy_time = 0.0
+
+    def start(self):
+        self.tasks = [asyncio.create_task(self.dispatch()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        self.pool.shutdown(cancel_futures=True)
+
+    async def search(self, job, movetime, level=None):
+        # queues a search of a make_job() job and waits for its (move, score, nodes, seconds)
+        if level is not None and PROFILES[level].nodes <= INLINE_NODES:
+            return self.record(level_move(job, level))
+        future = asyncio.get_running_loop().create_future()
+        self.waiting.append((job, movetime, level, future))
+        self.ready.release()
+        return await future
+
+    def record(self, result):
+        # counts a finished search in the statistics and passes its result on
+        self.searches += 1
+        self.nodes += result[2]
+        self.busy_time += result[3]
+        return result
+
+    async def dispatch(self):
+        # one dispatcher per worker process keeps exactly that many searches in flight
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.ready.acquire()
+            job, movetime, level, future = self.waiting.popleft()
+            try:
+                if level is None:
+                    result = await loop.run_in_executor(
+                        self.pool, search_move, job, movetime, self.depth, self.hash_mb
+                    )
+                else:
+                    result = await loop.run_in_executor(self.pool, level_move, job, level)
+            except Exception as error:
+                if not future.done():
+                    future.set_exception(error)
+                continue
+            self.record(result)
+            if not future.done():
+                future.set_result(result)
+
+
+class GameServer:
+    def __init__(self, workers, default_budget=60.0, depth=None, pdn=None, hash_mb=16):
+        self.scheduler = SearchScheduler(workers, depth, hash_mb)
+        self.default_budget = default_budget
+        self.pdn = pdn  # file finished games are appended to
+        self.games = {}
+        self.ids = itertools.count(1)
+        self.finished = 0
+        self.started = time.perf_counter()
+
+    async def serve(self, host="127.0.0.1", port=8765, path=None):
+        # listens on a TCP port of the loopback interface, or on a unix socket if path is set
+        self.scheduler.start()
+        if path:
+            server = await asyncio.start_unix_server(self.client, path=path)
+        else:
+            server = await asyncio.start_server(self.client, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.scheduler.close()
+
+    async def client(self, reader, writer):
+        # answers the requests of one connection until it closes
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # longer than the limit of the stream: where the next request starts
+                    # is lost, answer and close
+                    writer.write(b'{"ok": false, "error": "request line too long"}\n')
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                try:
+                    reply = await self.handle(json.loads(line))
+                except (ValueError, KeyError, TypeError) as error:
+                    reply = {"ok": False, "error": str(error)}
+                except Exception as error:
+                    # a failed worker or a bug must not leave the client without an answer
+                    reply = {"ok": False, "error": "%s: %s" % (type(error).__name__, error)}
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle(self, request):
+        op = request["op"]
+        if op == "new":
+            ai = request.get("ai", "W")
+            if ai != "none" and ai not in SIDES:
+                raise ValueError("ai must be W, B or none")
+            level = request.get("level")
+            if level is not None and level not in PROFILES:
+                raise ValueError("level must be one of %s" % ", ".join(PROFILES))
+            game = ServerGame(
+                next(self.ids),
+                SIDES.get(ai),
+                float(request.get("budget", self.default_budget)),
+                level,
+            )
+            self.games[game.id] = game
+            async with game.lock:
+                reply = {"ok": True, "game": game.id}
+                try:
+                    reply.update(await self.ai_reply(game))
+                except Exception:
+                    # the AI could not make its first move: there is no game
+                    del self.games[game.id]
+                    raise
+            return reply
+        elif op == "move":
+            game = self.game(request)
+            async with game.lock:
+                if game.ai_to_move():
+                    raise ValueError("it is the AI's turn")
+                if game.state.is_over():
+                    raise ValueError("the game is over")
+                game.state.play(request["move"])
+                reply = {"ok": True}
+                try:
+                    reply.update(await self.ai_reply(game))
+                except Exception:
+                    # the AI could not answer: take the move back so it can be sent again
+                    if game.ai_to_move():
+                        unmake_move(game.state.position)
+                        game.state.moves.pop()
+                    raise
+            return reply
+        elif op == "state":
+            game = self.game(request)
+            return {"ok": True, "state": game.state.to_dict()}
+        elif op == "close":
+            self.games.pop(request["game"], None)
+            return {"ok": True}
+        elif op == "stats":
+            return {"ok": True, "stats": self.stats()}
+        raise ValueError("unknown op %r" % op)
+
+    def game(self, request):
+        game = self.games.get(request["game"])
+        if game is None:
+            raise ValueError("no game %r" % request["game"])
+        return game
+
+    async def ai_reply(self, game):
+        # lets the AI move if it is its turn and returns the reply fields
+        reply = {}
+        if game.ai_to_move():
+            move, score, nodes, seconds = await self.scheduler.search(
+                make_job(game.state.position), game.movetime(), game.level
+            )
+            game.budget = max(0.0, game.budget - seconds)
+            game.state.play(move)
+            reply["ai_move"] = move_to_text(move)
+        if game.state.is_over():
+            self.finished += 1
+            if self.pdn:
+                self.save(game)
+        reply["state"] = game.state.to_dict()
+        return reply
+
+    def save(self, game):
+        # appends a finished game to the PDN file
+        players = {"White": "Client", "Black": "Client"}
+        if game.ai is not None:
+            players["White" if game.ai == AI else "Black"] = "AI"
+        players["Round"] = game.id
+        try:
+            append_game(self.pdn, game.state.moves, game.state.result(), players)
+        except OSError as error:
+            print("could not save game %d: %s" % (game.id, error), file=sys.stderr)
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started
+        scheduler = self.scheduler
+        return {
+            "games": len(self.games),
+            "finished": self.finished,
+            "waiting": len(scheduler.waiting),
+            "workers": scheduler.workers,
+            "searches": scheduler.searches,
+            "nodes": scheduler.nodes,
+            "busy_time": scheduler.busy_time,
+            "uptime": elapsed,
+            "games_per_hour_per_core": self.finished * 3600 / elapsed / scheduler.workers,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host many checkers games against the AI.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this unix socket instead of a TCP port")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="search processes (default: one per core)")
+    parser.add_argument("--budget", type=float, default=60.0,
+                        help="default AI thinking seconds per game")
+    parser.add_argument("--depth", type=int, help="cap the depth of every AI search")
+    parser.add_argument("--pdn", help="append every finished game to this PDN file")
+    parser.add_argument("--hash-mb", type=int, default=16,
+                        help="megabytes of transposition table per worker (default 16)")
+    args = parser.parse_args()
+
+    server = GameServer(args.workers, args.budget, args.depth, args.pdn, args.hash_mb)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import json
+import os
+
+
+# ................................................. themes .................................................
+# The colors of the game window come from themes.json, one entry per theme in menu order:
+#
+#   "Mint": {"square": [50, 205, 50], "background": [144, 238, 144], ...}
+#
+# A theme only decides how the board is drawn; which side a piece belongs to never depends
+# on it, so the theme can be changed in the middle of a game.
+THEMES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "themes.json")
+COLORS = ("square", "background", "ai_piece", "human_piece", "outline", "valid_dot")
+
+
+class Theme:
+    """
+    The colors the game window is drawn with.
+
+    Args:
+        name (str): the name shown in the menu
+        square (tuple): RGB of the squares the pieces stand on
+        background (tuple): RGB of the other squares
+        ai_piece (tuple): RGB of the AI's pieces
+        human_piece (tuple): RGB of the human's pieces
+        outline (tuple): RGB of the ring around every piece
+        valid_dot (tuple): RGB of the dots marking where the selected piece can move
+    """
+
+    def __init__(self, name, square, background, ai_piece, human_piece, outline, valid_dot):
+        self.name = name
+        self.square = square
+        self.background = background
+        self.ai_piece = ai_piece
+        self.human_piece = human_piece
+        self.outline = outline
+        self.valid_dot = valid_dot
+
+    def __repr__(self):
+        return "Theme(%r)" % self.name
+
+
+def load_themes(path=THEMES_FILE):
+    """
+    This function reads the themes of a theme file.
+
+    Args:
+        path (str): the JSON file to read
+
+    Returns:
+        dict: name -> Theme, in the order of the file
+    """
+    with open(path) as file:
+        data = json.load(file)
+    themes = {}
+    for name, colors in data.items():
+        missing = [color for color in COLORS if color not in colors]
+        if missing:
+            raise ValueError("theme %r has no %s" % (name, ", ".join(missing)))
+        themes[name] = Theme(name, **{color: tuple(colors[color]) for color in COLORS})
+    return themes
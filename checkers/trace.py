@@ -0,0 +1,273 @@
+import argparse
+import math
+import sys
+from checkers.engine import (
+    VARIANTS,
+    has_moves,
+    move_to_text,
+    position_from_fen,
+    position_to_fen,
+    repetitions,
+)
+from checkers.search import MAX_PLY, Search, SearchLimits
+from checkers.tt import TranspositionTable
+
+
+# ............................................... search trace ...............................................
+# Records the tree a search walks, to see why it preferred a move:
+#
+#   python -m checkers.trace record "W:W1,2,3:B21,22" --depth 6 --max-ply 3 > tree.tsv
+#   python -m checkers.trace outline tree.tsv --max-ply 2 > tree.md
+#
+# TracingSearch is a Search that writes one line per node to a stream as soon as the node
+# is finished, so memory does not grow with the tree; only nodes up to max_ply plies from
+# the root are written, and no more than max_nodes of them.  Plain Search objects never
+# trace and run exactly as before.
+#
+# A trace is text: lines starting with "#" are comments, every other line is a node with
+# tab-separated fields
+#   ply     plies from the root, 0 for the root of an iteration
+#   move    the move that leads to the node; for the root the best move found, "-" if none
+#   depth   depth left for the node, shorter than its parent's minus one when reduced
+#   alpha   the window the node was searched with, for the side to move there
+#   beta
+#   score   the score found, for the side to move
+#   reason  why the node ended: leaf (static evaluation), tt (transposition table), draw,
+#           lost, beta (a move reached beta, the rest were cut off), all (no move reached
+#           alpha), pv (exact score inside the window) or root
+#   pruned  moves of the node skipped by futility pruning
+#   nodes   nodes of the subtree, the node included
+# Nodes come after their children, so a parent is the next line with a smaller ply.
+REASONS = ("leaf", "tt", "draw", "lost", "beta", "all", "pv", "root")
+FIELDS = ("ply", "move", "depth", "alpha", "beta", "score", "reason", "pruned", "nodes")
+
+
+class TracingSearch(Search):
+    """
+    A Search that writes the nodes of its tree to a stream.
+
+    Args:
+        position (Position): the board state to search, restored before run() returns
+        limits (SearchLimits): when to stop, no limit at all if None
+        stream (file): where the trace lines are written
+        max_ply (int): nodes further from the root are searched but not written
+        max_nodes (int): nodes written at most, over all iterations
+        **options: the other arguments of Search
+    """
+
+    def __init__(self, position, limits=None, stream=sys.stdout, max_ply=4, max_nodes=100000,
+                 **options):
+        Search.__init__(self, position, limits, **options)
+        self.stream = stream
+        self.max_ply = max_ply
+        self.max_nodes = max_nodes
+        self.written = 0  # nodes written or about to be
+        self.truncated = False  # whether max_nodes left nodes out
+        # futility prunes in the subtrees of the children of the node at every ply, to
+        # tell the node's own prunes from theirs
+        self.below = [0] * (MAX_PLY + 2)
+
+    def run(self):
+        self.stream.write("# trace of %s\n" % position_to_fen(self.position))
+        self.stream.write("# " + "\t".join(FIELDS) + "\n")
+        result = Search.run(self)
+        if self.truncated:
+            self.stream.write("# truncated after %d nodes\n" % self.written)
+        self.stream.flush()
+        return result
+
+    def root(self, moves, depth):
+        if self.written >= self.max_nodes:
+            self.truncated = True
+            return Search.root(self, moves, depth)
+        self.written += 1
+        stats = self.stats
+        nodes = stats.nodes
+        self.below[1] = 0
+        score = Search.root(self, moves, depth)
+        best = self.pv_table[0]
+        self.write(0, move_to_text(best[0]) if best else "-", depth, -math.inf, math.inf,
+                   score, "root", 0, stats.nodes - nodes)
+        return score
+
+    def negamax(self, depth, ply, alpha, beta):
+        stats = self.stats
+        pruned = stats.pruned
+        if ply > self.max_ply or self.written >= self.max_nodes:
+            if ply <= self.max_ply:
+                self.truncated = True
+            score = Search.negamax(self, depth, ply, alpha, beta)
+            self.below[ply] += stats.pruned - pruned
+            return score
+
+        self.written += 1
+        position = self.position
+        move = move_to_text(position.undo_stack[-1][0])
+        reason = terminal(position)
+        nodes = stats.nodes
+        self.below[ply + 1] = 0
+        score = Search.negamax(self, depth, ply, alpha, beta)
+        total = stats.pruned - pruned
+        self.below[ply] += total
+
+        if reason is None:
+            if depth <= 0 or ply >= MAX_PLY:
+                reason = "leaf"
+            elif stats.nodes - nodes == 1:
+                # settled by the table before any move was searched, or there were none
+                if has_moves(position, position.turn):
+                    reason = "tt"
+                else:
+                    reason = "lost" if position.variant.stuck_loses else "draw"
+            elif score >= beta:
+                reason = "beta"
+            elif score <= alpha:
+                reason = "all"
+            else:
+                reason = "pv"
+        self.write(ply, move, depth, alpha, beta, score, reason, total - self.below[ply + 1],
+                   stats.nodes - nodes)
+        return score
+
+    def write(self, ply, move, depth, alpha, beta, score, reason, pruned, nodes):
+        self.stream.write("%d\t%s\t%d\t%s\t%s\t%s\t%s\t%d\t%d\n" % (
+            ply, move, depth, number(alpha), number(beta), number(score), reason, pruned, nodes))
+
+
+def terminal(position):
+    # the reason Search.negamax ends at a position before its depth is even looked at,
+    # None if it does not
+    color = position.turn
+    if not position.pieces[color]:
+        return "lost"
+    quiet_plies = position.quiet_plies
+    if quiet_plies >= 4 and (
+        quiet_plies >= position.variant.draw_plies or repetitions(position)
+    ):
+        return "draw"
+    if not position.variant.stuck_loses and not has_moves(position, 1 - color):
+        return "draw"
+    return None
+
+
+def number(value):
+    # a score or window bound as short text
+    if math.isinf(value):
+        return "inf" if value > 0 else "-inf"
+    return "%.3f" % (value + 0.0)  # no "-0.000"
+
+
+# ................................................. outline .................................................
+def read_trace(stream):
+    """
+    This generator reads the nodes of a trace.
+
+    Yields:
+        dict: the fields of every node, in the order of the trace
+    """
+    for line in stream:
+        if line.startswith("#") or not line.strip():
+            continue
+        values = line.rstrip("\n").split("\t")
+        if len(values) != len(FIELDS):
+            raise ValueError("not a trace line: %r" % line)
+        node = dict(zip(FIELDS, values))
+        for field in ("ply", "depth", "pruned", "nodes"):
+            node[field] = int(node[field])
+        yield node
+
+
+def outline(stream, output, max_ply=None):
+    """
+    This function writes a trace as a nested Markdown list, every node under its parent and
+    children in the order they were searched.
+
+    Args:
+        stream (file): the trace
+        output (file): where the outline goes
+        max_ply (int): leave out nodes further from the root, None for all of them
+    """
+    pending = {}  # ply -> finished nodes still waiting for their parent, with children
+    for node in read_trace(stream):
+        ply = node["ply"]
+        node["children"] = pending.pop(ply + 1, [])
+        if ply == 0:
+            write_node(output, node, 0, max_ply, None)
+        else:
+            pending.setdefault(ply, []).append(node)
+    # the nodes of an iteration the search stopped in have no finished parent
+    if pending:
+        output.write("- (search stopped)\n")
+        for ply in sorted(pending):
+            for node in pending[ply]:
+                write_node(output, node, 1, max_ply, None)
+
+
+def write_node(output, node, level, max_ply, parent):
+    if max_ply is not None and node["ply"] > max_ply:
+        return
+    notes = [node["reason"]]
+    if parent is not None and node["depth"] < parent["depth"] - 1:
+        notes.append("reduced")
+    if node["pruned"]:
+        notes.append("%d pruned" % node["pruned"])
+    if node["ply"] == 0:
+        text = "depth %d, best %s" % (node["depth"], node["move"])
+    else:
+        text = "%s d%d" % (node["move"], node["depth"])
+    output.write("%s- %s [%s, %s] %s %s, %d nodes\n" % (
+        "  " * level, text, node["alpha"], node["beta"], node["score"], ", ".join(notes),
+        node["nodes"]))
+    for child in node["children"]:
+        write_node(output, child, level + 1, max_ply, node)
+
+
+# .................................................. main ..................................................
+def main():
+    parser = argparse.ArgumentParser(description="Record and read search trees.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="search a position and write its trace")
+    record.add_argument("fen", help="the position, as a PDN FEN")
+    record.add_argument("--variant", choices=sorted(VARIANTS), default="checkers")
+    record.add_argument("--depth", type=int, default=6, help="deepest iteration (default 6)")
+    record.add_argument("--max-ply", type=int, default=4,
+                        help="write nodes up to this many plies from the root (default 4)")
+    record.add_argument("--max-nodes", type=int, default=100000,
+                        help="write at most this many nodes (default 100000)")
+    record.add_argument("--hash-mb", type=int, default=16,
+                        help="transposition table size, 0 for none (default 16)")
+    record.add_argument("--out", help="trace file (default: stdout)")
+    reader = commands.add_parser("outline", help="turn a trace into a nested Markdown list")
+    reader.add_argument("trace", nargs="?", help="trace file (default: stdin)")
+    reader.add_argument("--max-ply", type=int, help="leave out deeper nodes")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        try:
+            position = position_from_fen(args.fen, VARIANTS[args.variant])
+        except ValueError as error:
+            parser.error(str(error))
+        stream = open(args.out, "w") if args.out else sys.stdout
+        try:
+            search = TracingSearch(position, SearchLimits(depth=args.depth), stream,
+                                   args.max_ply, args.max_nodes,
+                                   tt=TranspositionTable(args.hash_mb) if args.hash_mb else None)
+            score, move, pv = search.run()
+        finally:
+            if args.out:
+                stream.close()
+        print("best %s, score %.3f, %d nodes searched, %d written%s" % (
+            move_to_text(move) if move is not None else "none", score, search.nodes,
+            search.written, " (truncated)" if search.truncated else ""), file=sys.stderr)
+        return
+
+    stream = open(args.trace) if args.trace else sys.stdin
+    try:
+        outline(stream, sys.stdout, args.max_ply)
+    finally:
+        if args.trace:
+            stream.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+from array import array
+
+
+# ........................................... transposition table ..........................................
+# Remembers what the search found out about positions it has already met, keyed by their
+# Zobrist hash.  The table is one preallocated array of 64-bit words, so its memory use is
+# fixed when it is created and never grows however long the engine runs.
+#
+# The table is split into buckets of two entries of two words each:
+#   word 0   the full hash of the position
+#   word 1   bits 0-11   best move as origin | destination << 6, NO_MOVE if none
+#            bits 12-19  depth searched
+#            bits 20-21  EXACT, LOWER or UPPER bound
+#            bits 22-29  age of the search that stored it
+#            bits 30-61  score * 1000, offset to stay positive
+# The first entry of a bucket keeps the deepest result of the current search, the second
+# one is always replaced.
+EXACT, LOWER, UPPER = 1, 2, 3
+NO_MOVE = 0xFFF
+
+BUCKET_WORDS = 4
+BUCKET_BYTES = BUCKET_WORDS * 8
+SCORE_SCALE = 1000
+SCORE_OFFSET = 1 << 31
+
+
+class TranspositionTable:
+    """
+    A fixed-size hash table of search results with a depth-preferred and an always-replace
+    entry in every bucket.
+
+    Args:
+        mb (int): megabytes of memory to use, rounded down to a power of two of buckets
+    """
+
+    def __init__(self, mb=16):
+        self.mb = mb
+        buckets = 1
+        while buckets * 2 * BUCKET_BYTES <= mb * 1024 * 1024:
+            buckets *= 2
+        self.mask = buckets - 1
+        self.table = array("Q", bytes(buckets * BUCKET_BYTES))
+        self.age = 0
+
+    @property
+    def buckets(self):
+        return self.mask + 1
+
+    def clear(self):
+        # forgets every entry, for a new game
+        self.table = array("Q", bytes(len(self.table) * 8))
+        self.age = 0
+
+    def new_search(self):
+        # starts a new search: entries of earlier searches become the first to be replaced
+        self.age = (self.age + 1) & 0xFF
+
+    def probe(self, key):
+        """
+        This function looks a position up.
+
+        Args:
+            key (int): Zobrist hash of the position
+
+        Returns:
+            (int, int, float, int): depth, bound, score and best move (origin | destination
+            << 6, or None), or None if the position is not in the table
+        """
+        table = self.table
+        index = (key & self.mask) * BUCKET_WORDS
+        if table[index] == key:
+            data = table[index + 1]
+        elif table[index + 2] == key:
+            data = table[index + 3]
+        else:
+            return None
+        move = data & 0xFFF
+        return (
+            data >> 12 & 0xFF,
+            data >> 20 & 3,
+            ((data >> 30) - SCORE_OFFSET) / SCORE_SCALE,
+            None if move == NO_MOVE else move,
+        )
+
+    def store(self, key, depth, bound, score, move=None):
+        """
+        This function stores the result of searching a position.
+
+        Args:
+            key (int): Zobrist hash of the position
+            depth (int): depth the position was searched to
+            bound (int): EXACT, LOWER or UPPER
+            score (float): the score found
+            move (int): the best packed move, None if there is none
+        """
+        table = self.table
+        index = (key & self.mask) * BUCKET_WORDS
+        # the deep entry is replaced by its own position, a deeper search or any search
+        # once it is stale; everything else goes to the always-replace entry
+        deep = table[index + 1]
+        if not (
+            table[index] == key
+            or depth >= deep >> 12 & 0xFF
+            or deep >> 22 & 0xFF != self.age
+        ):
+            index += 2
+        move = NO_MOVE if move is None else move & 0xFFF
+        table[index] = key
+        table[index + 1] = (
+            move
+            | min(max(depth, 0), 0xFF) << 12
+            | bound << 20
+            | self.age << 22
+            | int(round(score * SCORE_SCALE)) + SCORE_OFFSET << 30
+        )
+
+    def hashfull(self):
+        # returns the permille of the first thousand entries used by the current search
+        table = self.table
+        entries = min(1000, self.buckets * 2)
+        used = 0
+        for entry in range(entries):
+            data = table[entry * 2 + 1]
+            if data and data >> 22 & 0xFF == self.age:
+                used += 1
+        return used * 1000 // entries
+
+
+_shared = None
+
+
+def shared_table(mb):
+    # returns the table of the current process, created on first use, so the searches a
+    # worker process runs one after another all share it
+    global _shared
+    if _shared is None or _shared.mb != mb:
+        _shared = None  # release the old table before allocating the new one
+        _shared = TranspositionTable(mb)
+    return _shared
@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import random
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from checkers.dataset import Dataset
+from checkers.difficulty import SELFPLAY, SELFPLAY_OPENING_PLIES, DifficultySearch
+from checkers.engine import AI, FEATURES, VARIANTS, WEIGHTS_FILE, features, generate_moves
+from checkers.game import GameState
+from checkers.pdn import append_game, read_games
+
+try:
+    import numpy
+except ImportError:  # only fitting needs NumPy, the engine and the game generator do not
+    numpy = None
+
+
+# ................................................. tuning .................................................
+# Fits the weights of the evaluation features (checkers.engine.FEATURES) to the results of
+# games, Texel style:
+#
+#   python -m checkers.tune selfplay.pdn --generate 2000 --workers 8
+#   python -m checkers.tune games.pdn selfplay.pdn --out checkers/weights.json
+#   python -m checkers.tune data/
+#
+# With --generate the engine first plays that many games against itself into the first
+# file.  Every quiet position of every finished game, after the opening, becomes a row of
+# feature counts and the result of its game; directories and .bin files are read as the
+# shards of checkers.dataset, where every quiet position counts.  The weights are fitted
+# by full-batch gradient descent so that sigmoid(scale * evaluation) predicts the results
+# with the least squared error, then scaled so a man is still worth 1 and written to the
+# weights file the engine loads when it is imported.  All rows are NumPy arrays and every
+# step is a handful of matrix products, so a million positions tune in well under a
+# minute.
+#
+# The weights file holds one entry per variant; tuning one variant keeps the others.
+
+SKIP_PLIES = 8  # plies of every game whose positions are left out of the data
+
+# White's score for every result of a finished game
+WHITE_SCORES = {"2-0": 1.0, "1-0": 1.0, "0-2": 0.0, "0-1": 0.0, "1-1": 0.5, "1/2-1/2": 0.5}
+
+
+# ............................................... self-play ................................................
+def play_selfplay_game(variant_name, seed):
+    # plays one game of the engine against itself, in a worker process; returns the moves
+    # and the result
+    rng = random.Random(seed)
+    game = GameState(variant=VARIANTS[variant_name])
+    for _ in range(SELFPLAY_OPENING_PLIES):
+        if game.is_over():
+            break
+        game.play(rng.choice(game.legal_moves()))
+    while not game.is_over():
+        search = DifficultySearch(game.position, SELFPLAY, rng.getrandbits(64))
+        game.play(search.choose(rng)[1])
+    return game.moves, game.result()
+
+
+def generate(path, games, variant, workers, seed=1):
+    # appends games of the engine against itself to a PDN file
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(64) for _ in range(games)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for moves, result in pool.map(play_selfplay_game, [variant.name] * games, seeds,
+                                      chunksize=4):
+            append_game(path, moves, result, {"Event": "Self-play"}, variant=variant)
+
+
+# ................................................ features ................................................
+def ai_score(result, variant):
+    # returns the AI's score for the PDN result of a game, None if it is not finished
+    white = WHITE_SCORES.get(result)
+    if white is None:
+        return None
+    return white if variant.letter_side["W"] == AI else 1.0 - white
+
+
+def is_quiet(position):
+    # True when the side to move has no capture, so the evaluation can be trusted
+    return not any(move >> 12 for move in generate_moves(position, position.turn))
+
+
+def extract(paths, variant):
+    """
+    This function turns the positions of games into rows of features.
+
+    Args:
+        paths (list): PDN files and shards or directories of shards to read, positions
+            of other variants are skipped
+        variant (Variant): the variant to tune
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): the feature counts of every position, one row
+        each, and the AI's score in the game it comes from
+    """
+    rows = array("b")
+    scores = array("f")
+    for path in paths:
+        if os.path.isdir(path) or path.endswith(".bin"):
+            dataset = Dataset([path])
+            for shard in dataset.shards:
+                if shard.variant is not variant:
+                    continue
+                for index in range(len(shard)):
+                    position = shard.position(index)
+                    if is_quiet(position):
+                        # the result is stored for the side to move
+                        score = (shard[index][5] + 1) / 2
+                        rows.extend(features(position))
+                        scores.append(score if position.turn == AI else 1.0 - score)
+            dataset.close()
+            continue
+        with open(path) as stream:
+            for game in read_games(stream):
+                score = ai_score(game.result, variant)
+                if game.variant is not variant or score is None:
+                    continue
+                count = len(scores)
+                try:
+                    for ply, (position, move) in enumerate(game.positions()):
+                        if ply >= SKIP_PLIES and is_quiet(position):
+                            rows.extend(features(position))
+                            scores.append(score)
+                except ValueError:
+                    # an illegal move: drop the rows of the game
+                    del scores[count:]
+                    del rows[count * len(FEATURES):]
+    x = numpy.frombuffer(rows, dtype=numpy.int8).reshape(-1, len(FEATURES))
+    return x.astype(numpy.float32), numpy.frombuffer(scores, dtype=numpy.float32)
+
+
+# ................................................. fitting ................................................
+def sigmoid(x):
+    return 1.0 / (1.0 + numpy.exp(-x))
+
+
+def error(x, y, weights, scale):
+    # returns the mean squared error of the predicted results
+    return float(numpy.mean((sigmoid(scale * (x @ weights)) - y) ** 2))
+
+
+def fit_scale(x, y, weights, low=0.01, high=10.0, steps=40):
+    # returns the scale of the evaluation that predicts the results best, by golden
+    # section search over its logarithm
+    ratio = (5 ** 0.5 - 1) / 2
+    low, high = numpy.log(low), numpy.log(high)
+    for _ in range(steps):
+        left = high - ratio * (high - low)
+        right = low + ratio * (high - low)
+        if error(x, y, weights, numpy.exp(left)) < error(x, y, weights, numpy.exp(right)):
+            high = right
+        else:
+            low = left
+    return float(numpy.exp((low + high) / 2))
+
+
+def fit(x, y, weights, scale, steps=500, rate=0.01):
+    """
+    This function fits the weights by full-batch gradient descent with Adam steps.
+
+    Args:
+        x (numpy.ndarray): the feature rows
+        y (numpy.ndarray): the AI's score of every row
+        weights (numpy.ndarray): the weights to start from
+        scale (float): the scale of the evaluation in the sigmoid, kept fixed
+        steps (int): gradient steps
+        rate (float): the step size
+
+    Returns:
+        numpy.ndarray: the fitted weights
+    """
+    weights = numpy.array(weights, dtype=numpy.float32)
+    first = numpy.zeros_like(weights)
+    second = numpy.zeros_like(weights)
+    beta1, beta2 = 0.9, 0.999
+    factor = 2 * scale / len(y)
+    for step in range(1, steps + 1):
+        predicted = sigmoid(scale * (x @ weights))
+        gradient = x.T @ ((predicted - y) * predicted * (1 - predicted)) * factor
+        first = beta1 * first + (1 - beta1) * gradient
+        second = beta2 * second + (1 - beta2) * gradient * gradient
+        weights -= (
+            rate * (first / (1 - beta1 ** step))
+            / (numpy.sqrt(second / (1 - beta2 ** step)) + 1e-9)
+        )
+    return weights
+
+
+def write_weights(path, variant, weights, extra):
+    # stores the weights of a variant in the weights file, keeping those of the others
+    data = {}
+    if os.path.exists(path):
+        with open(path) as file:
+            data = json.load(file)
+    entry = {"weights": {feature: round(float(weight), 4)
+                         for feature, weight in zip(FEATURES, weights)}}
+    entry.update(extra)
+    data[variant.name] = entry
+    with open(path, "w") as file:
+        json.dump(data, file, indent=4)
+        file.write("\n")
+
+
+# .................................................. main ..................................................
+def main():
+    parser = argparse.ArgumentParser(
+        description="Tune the evaluation weights on the results of PDN games."
+    )
+    parser.add_argument("games", nargs="+",
+                        help="PDN files of finished games, or directories of shards")
+    parser.add_argument("--variant", choices=sorted(VARIANTS), default="checkers")
+    parser.add_argument("--generate", type=int, default=0,
+                        help="first append this many self-play games to the first file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="self-play processes (default: one per core)")
+    parser.add_argument("--steps", type=int, default=500, help="gradient steps (default 500)")
+    parser.add_argument("--rate", type=float, default=0.01, help="step size (default 0.01)")
+    parser.add_argument("--out", default=WEIGHTS_FILE,
+                        help="weights file to write (default: the one the engine loads)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    variant = VARIANTS[args.variant]
+
+    if args.generate > 0:
+        start = time.perf_counter()
+        generate(args.games[0], args.generate, variant, args.workers, args.seed)
+        print("played %d self-play games in %.0f s" % (
+            args.generate, time.perf_counter() - start))
+    if numpy is None:
+        parser.error("tuning needs NumPy, install it with: pip install numpy")
+
+    start = time.perf_counter()
+    x, y = extract(args.games, variant)
+    if not len(y):
+        parser.error("no finished %s games in %s" % (variant.name, ", ".join(args.games)))
+    print("%d positions in %.1f s" % (len(y), time.perf_counter() - start))
+
+    start = time.perf_counter()
+    weights = numpy.array(variant.weights, dtype=numpy.float32)
+    scale = fit_scale(x, y, weights)
+    before = error(x, y, weights, scale)
+    weights = fit(x, y, weights, scale, args.steps, args.rate)
+    after = error(x, y, weights, scale)
+    if weights[0] <= 0:
+        parser.error("the fit gave men no value, the games are too few or too one-sided")
+    # a man stays worth 1, the scale of the sigmoid takes up the difference
+    scale *= float(weights[0])
+    weights /= weights[0]
+    print("fitted in %.1f s, error %.5f -> %.5f" % (time.perf_counter() - start, before, after))
+    for feature, weight in zip(FEATURES, weights):
+        print("  %-9s %8.4f" % (feature, weight))
+
+    write_weights(args.out, variant, weights, {
+        "scale": round(scale, 4), "positions": len(y), "error": round(after, 6)})
+    print("wrote %s" % args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,34 @@
-import pygame
-from copy import deepcopy
-import math
 import time
-import customtkinter
-import tkinter
-from PIL import Image
-import pyglet
+
+STARTUP = time.perf_counter()  # --startup-report times every start-up step from here
+
 import os
 import sys
+import threading
+import tkinter
+import customtkinter
+from checkers.engine import (
+    AI,
+    HUMAN,
+    DRAW,
+    CHECKERS,
+    Position,
+    generate_moves,
+    has_moves,
+    is_draw,
+    move_from,
+    move_to,
+    move_captures,
+    iter_squares,
+    make_move,
+    unmake_move,
+)
+from checkers.cache import AnalysisCache
+from checkers.difficulty import PROFILES, choose_move
+from checkers.search import CancelToken
+from checkers.pdn import append_game
+from checkers.replay import Replay, open_index
+from checkers.theme import load_themes
 
 
 def resource_path(relative_path):
@@ -25,23 +46,96 @@ def resource_path(relative_path):
 # Set the width and height of the game window
 WIDTH, HEIGHT = 950, 950
 
+# Set the board size and rules the engine plays (INTERNATIONAL for 10x10 draughts)
+VARIANT = CHECKERS
+row_col_to_square = VARIANT.row_col_to_square
+square_to_row_col = VARIANT.square_to_row_col
+
 # Set the number of rows and columns for the checkers board
-ROWS, COLS = 8, 8
+ROWS, COLS = VARIANT.rows, VARIANT.cols
 
 # Calculate the size of each square on the board based on the window width and number of columns
 SQUARE_SIZE = WIDTH // COLS
 
-# Load the image for the crown that appears on a piece when it reaches the opposite end of the board
-CROWN = pygame.transform.scale(
-    pygame.image.load(resource_path("assets\\crown.png")), (50, 50)
-)
+# The image for the crown that appears on a piece when it reaches the opposite end of the
+# board, loaded with pygame by load_game_assets once the game starts
+CROWN = None
 
 # Set the target frame rate for the game
 FPS = 60
 
-# Loading custom fonts
-pyglet.font.add_file(resource_path("fonts\\NatureBeautyPersonalUse-9Y2DK.ttf"))
-pyglet.font.add_file(resource_path("fonts\\bahnschrift.ttf"))
+# Every finished game is appended to this file in Portable Draughts Notation
+GAMES_FILE = "games.pdn"
+
+# The AI's searches are saved to this file and reused in later games
+CACHE_FILE = "analysis.sqlite"
+
+# Which side a piece belongs to, and GREY for a tie.  They never change with the theme,
+# the colors the pieces are drawn in come from the theme.
+AI_KEY = (255, 255, 255)
+HUMAN_KEY = (0, 0, 0)
+GREY = (128, 128, 128)
+
+# The themes of the menu and the T key, read from checkers/themes.json
+THEMES = load_themes()
+
+# Custom fonts of the start menu
+FONT_FILES = ("fonts\\NatureBeautyPersonalUse-9Y2DK.ttf", "fonts\\bahnschrift.ttf")
+
+# ............................................................................................................
+
+
+# ............................................ start-up ......................................................
+class StartupTimer:
+    # records how long every start-up step takes; run with --startup-report to print it
+    def __init__(self, start):
+        self.start = self.last = start
+        self.steps = []  # (step, seconds)
+
+    def mark(self, step):
+        now = time.perf_counter()
+        self.steps.append((step, now - self.last))
+        self.last = now
+
+    def report(self):
+        if "--startup-report" not in sys.argv:
+            return
+        print("start-up times:")
+        for step, seconds in self.steps:
+            print("  %-28s %8.1f ms" % (step, seconds * 1000))
+        print("  %-28s %8.1f ms" % ("total", (self.last - self.start) * 1000))
+
+
+def register_fonts():
+    # makes the custom fonts available to the start menu.  On Windows they are added to the
+    # process straight through GDI, which is much cheaper than importing pyglet for it.
+    for font in FONT_FILES:
+        path = resource_path(font)
+        if sys.platform == "win32":
+            import ctypes
+
+            FR_PRIVATE = 0x10  # the font is only visible to this process
+            ctypes.windll.gdi32.AddFontResourceExW(path, FR_PRIVATE, 0)
+        else:
+            import pyglet
+
+            pyglet.font.add_file(path)
+
+
+def load_game_assets():
+    # imports pygame and loads the images of the game, only once Play has been pressed
+    global pygame, CROWN
+    import pygame
+
+    timer.mark("import pygame")
+    CROWN = pygame.transform.scale(
+        pygame.image.load(resource_path("assets\\crown.png")), (50, 50)
+    )
+    timer.mark("load crown")
+
+
+timer = StartupTimer(STARTUP)
+timer.mark("import modules")
 
 # ............................................................................................................
 
@@ -73,18 +167,12 @@ class Piece:
         # Promote the piece to a king
         self.king = True
 
-    def draw(self, win):
-        # Draw the piece on the game board
-        radius = SQUARE_SIZE // 2 - self.PADDING
-        pygame.draw.circle(win, GREY, (self.x, self.y), radius + self.OUTLINE)
-        pygame.draw.circle(win, self.color, (self.x, self.y), radius)
-
-        # If the piece is a king, draw a crown on top of it
-        if self.king:
-            win.blit(
-                CROWN,
-                (self.x - CROWN.get_width() // 2, self.y - CROWN.get_height() // 2),
-            )
+    def draw(self, win, cache):
+        # Draw the piece on the game board from the sprite of its kind in the render cache
+        win.blit(
+            cache.sprites[self.color, self.king],
+            (self.x - SQUARE_SIZE // 2, self.y - SQUARE_SIZE // 2),
+        )
 
     def move(self, row, col):
         # Update the piece's position on the game board
@@ -100,87 +188,178 @@ class Piece:
 # ............................................................................................................
 
 
+# ............................................ Render cache ................................................
+class RenderCache:
+    # The surfaces of one theme, drawn once instead of every frame: the empty board and a
+    # sprite of every kind of piece.  A cache is never changed after it has been built, so
+    # it can be built in a background thread while the game draws with another one.
+    def __init__(self, theme):
+        self.theme = theme
+        self.background = pygame.Surface((WIDTH, HEIGHT))
+        self.background.fill(theme.background)
+        for row in range(ROWS):
+            for col in range(row % 2, COLS, 2):
+                pygame.draw.rect(
+                    self.background,
+                    theme.square,
+                    (row * SQUARE_SIZE, col * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE),
+                )
+
+        # (side, king) -> sprite of the piece on a transparent square
+        self.sprites = {}
+        centre = (SQUARE_SIZE // 2, SQUARE_SIZE // 2)
+        radius = SQUARE_SIZE // 2 - Piece.PADDING
+        for color, fill in ((AI_KEY, theme.ai_piece), (HUMAN_KEY, theme.human_piece)):
+            for king in (False, True):
+                sprite = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+                pygame.draw.circle(sprite, theme.outline, centre, radius + Piece.OUTLINE)
+                pygame.draw.circle(sprite, fill, centre, radius)
+                if king:
+                    sprite.blit(
+                        CROWN,
+                        (
+                            centre[0] - CROWN.get_width() // 2,
+                            centre[1] - CROWN.get_height() // 2,
+                        ),
+                    )
+                self.sprites[color, king] = sprite
+
+
+# ............................................................................................................
+
+
 # ................................................ Game ......................................................
 class Game:
-    def __init__(self, win):
+    def __init__(self, win, theme):
         self._init()  # Initialize the game state
         self.win = win  # Set the game window
+        self.caches = {}  # Theme name -> its finished RenderCache
+        self.theme = theme  # The theme last asked for
+        self.cache = self.render_cache(theme)  # The cache every frame is drawn with
 
     def update(self):
-        self.board.draw(self.win)  # Draw the game board on the window
+        cache = self.cache  # One cache for the whole frame, even if a new one is swapped in
+        self.board.draw(self.win, cache)  # Draw the game board on the window
         self.draw_valid_moves(
-            self.valid_moves
+            self.valid_moves, cache
         )  # Draw valid moves as circles on the board
         pygame.display.update()  # Update the display to show the changes
 
+    def render_cache(self, theme):
+        # Return the render cache of a theme, drawing it the first time it is needed
+        if theme.name not in self.caches:
+            self.caches[theme.name] = RenderCache(theme)
+        return self.caches[theme.name]
+
+    def set_theme(self, theme):
+        # Switch the theme during the game.  A theme not drawn before is drawn in a
+        # background thread while the frames go on with the current cache; the new cache
+        # takes over in one assignment, so no frame is dropped or drawn half in each theme.
+        self.theme = theme
+        if theme.name in self.caches:
+            self.cache = self.caches[theme.name]
+            return
+
+        def build():
+            cache = self.render_cache(theme)
+            if self.theme is theme:  # Another theme may have been asked for meanwhile
+                self.cache = cache
+
+        threading.Thread(target=build, daemon=True).start()
+
+    def next_theme(self):
+        # Switch to the theme after the current one in the menu order
+        names = list(THEMES)
+        self.set_theme(THEMES[names[(names.index(self.theme.name) + 1) % len(names)]])
+
     def _init(self):
         self.selected = None  # The currently selected piece
         self.board = Board()  # Create a new game board
+        self.position = Position(variant=VARIANT)  # Engine position, its undo stack is the move history
+        self.redo_stack = []  # Moves taken back with undo, the latest last
         self.turn = HUMAN_KEY  # Set the starting player to human
         self.valid_moves = {}  # Valid moves for the current piece
+        self._legal_moves = None  # Legal moves of the position, built on first use
+        self._winner = None  # Result of the position, once worked out
+        self._winner_checked = False
 
     def ai_board_winner(self, game):
-        # Determine if the AI player has won the game
-        return self.board.ai_board_winner(game)
+        # Determine if the game is over: the winner's color, GREY for a tie or None
+        if not self._winner_checked:
+            self._winner = self._result()
+            self._winner_checked = True
+        return {HUMAN: HUMAN_KEY, AI: AI_KEY, DRAW: GREY}.get(self._winner)
+
+    def _result(self):
+        # The rules of engine.winner, reusing the legal moves of the side to move
+        position = self.position
+        if not position.pieces[AI]:
+            return HUMAN
+        elif not position.pieces[HUMAN]:
+            return AI
+        if is_draw(position):
+            return DRAW  # threefold repetition or too long without a capture
+        if position.variant.stuck_loses:
+            if not self.legal_moves():
+                return 1 - position.turn
+        elif not self.legal_moves() or not has_moves(position, 1 - position.turn):
+            return DRAW
+        return None
+
+    def legal_moves(self):
+        # Legal moves of the side to move keyed by origin square, built once per position
+        if self._legal_moves is None:
+            self._legal_moves = {}
+            for move in generate_moves(self.position, self.position.turn):
+                self._legal_moves.setdefault(move_from(move), []).append(move)
+        return self._legal_moves
 
-    def human_board_winner(self, game):
+    def human_board_winner(self):
         # Determine if the human player has won the game
-        return self.board.human_board_winner(game)
+        return self.board.human_board_winner()
 
     def reset(self):
         self._init()  # Reset the game state
 
     def select(self, row, col):
         if self.selected:
-            result = self._move(row, col)  # Try to move the selected piece
-            if not result:
-                self.selected = None  # Unselect the piece if the move is invalid
-                self.select(
-                    row, col
-                )  # Call select recursively with the new coordinates
-
-        piece = self.board.get_piece(
-            row, col
-        )  # Get the piece at the selected coordinates
-        if (
-            piece != 0 and piece.color == self.turn
-        ):  # Check if the piece is a valid selection
-            self.selected = piece  # Set the selected piece
-            self.valid_moves = self.board.get_valid_moves(
-                piece
-            )  # Get the valid moves for the selected piece
+            if self._move(row, col):  # Try to move the selected piece
+                return True
+            self.selected = None  # Unselect the piece if the move is invalid
+
+        moves = self.legal_moves().get(
+            row_col_to_square(row, col)
+        )  # Get the legal moves of the piece at the selected coordinates
+        if moves:  # Check if the piece is a valid selection
+            self.selected = self.board.get_piece(row, col)  # Set the selected piece
+            self.valid_moves = {}
+            for move in moves:
+                # Several capture paths may end on the same square; keep the longest
+                target = square_to_row_col(move_to(move))
+                other = self.valid_moves.get(target)
+                captured = move_captures(move).bit_count()
+                if other is None or captured > move_captures(other).bit_count():
+                    self.valid_moves[target] = move
             return True
 
         return False
 
     def _move(self, row, col):
-        piece = self.board.get_piece(
-            row, col
-        )  # Get the piece at the target coordinates
-        if (
-            self.selected and piece == 0 and (row, col) in self.valid_moves
-        ):  # Check if the move is valid
-            self.board.move(
-                self.selected, row, col
-            )  # Move the selected piece to the target coordinates
-            skipped = self.valid_moves[
-                (row, col)
-            ]  # Get any skipped piece from the move
-            if skipped:
-                self.board.remove(skipped)  # Remove the skipped piece from the board
-            self.change_turn()  # Change the turn to the next player
-        else:
-            return False
+        if (row, col) in self.valid_moves:  # Check if the move is valid
+            self.play(
+                self.valid_moves[(row, col)]
+            )  # Move the selected piece and remove the pieces it captured
+            return True
 
-        return True
+        return False
 
-    def draw_valid_moves(self, moves):
+    def draw_valid_moves(self, moves, cache):
         # Draw valid moves as circles on the board
         for move in moves:
             row, col = move
             pygame.draw.circle(
                 self.win,
-                VALID_DOT,
+                cache.theme.valid_dot,
                 (
                     col * SQUARE_SIZE + SQUARE_SIZE // 2,
                     row * SQUARE_SIZE + SQUARE_SIZE // 2,
@@ -191,6 +370,8 @@ class Game:
     def change_turn(self):
         # Change the turn to the next player
         self.valid_moves = {}
+        self._legal_moves = None  # The cached moves belong to the previous position
+        self._winner_checked = False
         if self.turn == HUMAN_KEY:
             self.turn = AI_KEY
         else:
@@ -200,10 +381,59 @@ class Game:
         # Return the game board
         return self.board
 
-    def ai_move(self, board):
-        self.board = board  # Set the game board to the given state
+    @property
+    def moves(self):
+        # Packed engine moves played so far, for the game record
+        return [entry[0] for entry in self.position.undo_stack]
+
+    def play(self, move):
+        # Play a packed engine move on the position and on the game board
+        make_move(self.position, move)
+        self.board.make_move(move)
+        self.redo_stack = []  # A new move replaces the moves that were taken back
+        self.selected = None
         self.change_turn()  # Change the turn to the next player
 
+    def undo(self, plies=1):
+        # Take back the last plies with unmake, keeping them for redo
+        for _ in range(plies):
+            if not self.position.undo_stack:
+                break
+            self.redo_stack.append(unmake_move(self.position))
+        self._sync()
+
+    def redo(self, plies=1):
+        # Replay plies that were taken back with undo
+        for _ in range(plies):
+            if not self.redo_stack:
+                break
+            make_move(self.position, self.redo_stack.pop())
+        self._sync()
+
+    def _sync(self):
+        # Bring the board, the turn and the selection in line with the position
+        self.board.load(self.position)
+        self.turn = AI_KEY if self.position.turn == AI else HUMAN_KEY
+        self.selected = None
+        self.valid_moves = {}
+        self._legal_moves = None
+        self._winner_checked = False
+
+    def save(self, winner_color, players=None):
+        # Append the finished game to the PDN file of all games
+        result = {AI_KEY: AI, HUMAN_KEY: HUMAN, GREY: DRAW}.get(winner_color)
+        try:
+            append_game(GAMES_FILE, self.moves, result, players, variant=VARIANT)
+        except OSError as error:
+            print("Could not save the game:", error)
+
+    def ai_move(self, move):
+        # Play the packed engine move chosen by the AI on the game board
+        if move is not None:
+            self.play(move)
+        else:
+            self.change_turn()  # Change the turn to the next player
+
 
 # ..................................................................................................................
 
@@ -212,21 +442,14 @@ class Game:
 class Board:
     def __init__(self):
         self.board = []
-        self.HUMAN_left = self.AI_left = 12
+        self.HUMAN_left = self.AI_left = 0
         self.HUMAN_kings = self.AI_kings = 0
         self.create_board()
         # initializes the attributes of the Board object, including the board
         # matrix and the initial number of pieces for the human and AI players.
 
-    def draw_squares(self, win):  # draws the board squares on the game window.
-        win.fill(BACK_COLOR_2)
-        for row in range(ROWS):
-            for col in range(row % 2, COLS, 2):
-                pygame.draw.rect(
-                    win,
-                    BACK_COLOR_1,
-                    (row * SQUARE_SIZE, col * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE),
-                )
+    def draw_squares(self, win, cache):  # draws the board squares on the game window.
+        win.blit(cache.background, (0, 0))
 
     def evaluate(self):  # returns the score of the AI player.
         return (self.AI_left - self.HUMAN_left) + (
@@ -250,7 +473,9 @@ class Board:
         )
         piece.move(row, col)
 
-        if row == ROWS - 1 or row == 0:
+        # men are crowned on the far row only; international men may capture backwards
+        crown_row = ROWS - 1 if piece.color == AI_KEY else 0
+        if row == crown_row and not piece.king:
             piece.make_king()
             if piece.color == AI_KEY:
                 self.AI_kings += 1
@@ -262,28 +487,17 @@ class Board:
         return self.board[row][col]
 
     def create_board(self):
-        #  creates the game board.
-        for row in range(ROWS):
-            self.board.append([])
-            for col in range(COLS):
-                if col % 2 == ((row + 1) % 2):
-                    if row < 3:
-                        self.board[row].append(Piece(row, col, AI_KEY))
-                    elif row > 4:
-                        self.board[row].append(Piece(row, col, HUMAN_KEY))
-                    else:
-                        self.board[row].append(0)
-                else:
-                    self.board[row].append(0)
+        #  creates the game board from the start position of the engine.
+        self.load(Position(variant=VARIANT))
 
-    def draw(self, win):
-        #  draws the pieces on the game window.
-        self.draw_squares(win)
+    def draw(self, win, cache):
+        #  draws the pieces on the game window with the surfaces of a render cache.
+        self.draw_squares(win, cache)
         for row in range(ROWS):
             for col in range(COLS):
                 piece = self.board[row][col]
                 if piece != 0:
-                    piece.draw(win)
+                    piece.draw(win, cache)
 
     def remove(self, pieces):
         # removes a given piece from the board.
@@ -295,146 +509,102 @@ class Board:
                 else:
                     self.AI_left -= 1
 
-    def ai_board_winner(self, game):
-        #  returns the winner of the game if it is over, and None otherwise.
-        if self.AI_left <= 0:
-            return HUMAN_KEY
-        elif self.HUMAN_left <= 0:
-            return AI_KEY
-        human_valid_moves = get_all_moves(self, HUMAN_KEY, game)
-        ai_left_moves = get_all_moves(self, AI_KEY, game)
-        if len(human_valid_moves) == 0 or len(ai_left_moves) == 0:
-            return GREY
-        return None
+    def load(self, position):
+        # rebuilds the pieces and the counters from an engine position.
+        self.board = [[0] * COLS for _ in range(ROWS)]
+        for square in range(VARIANT.squares):
+            piece = position.piece_at(square)
+            if piece is not None:
+                color, king = piece
+                row, col = square_to_row_col(square)
+                self.board[row][col] = Piece(
+                    row, col, AI_KEY if color == AI else HUMAN_KEY
+                )
+                self.board[row][col].king = king
+        self.AI_left, self.HUMAN_left = position.count(AI), position.count(HUMAN)
+        self.AI_kings = position.king_count(AI)
+        self.HUMAN_kings = position.king_count(HUMAN)
+
+    def make_move(self, move):
+        # plays a packed engine move: moves the piece and removes everything it captured.
+        piece = self.get_piece(*square_to_row_col(move_from(move)))
+        self.move(piece, *square_to_row_col(move_to(move)))
+        skipped = [
+            self.get_piece(*square_to_row_col(square))
+            for square in iter_squares(move_captures(move))
+        ]
+        if skipped:
+            self.remove(skipped)
 
     def human_board_winner(self):
         # returns the winner of the game if it is over, and None otherwise.
         if self.HUMAN_left <= 0:
-            return HUMAN_KEY
-        elif self.AI_left <= 0:
             return AI_KEY
+        elif self.AI_left <= 0:
+            return HUMAN_KEY
 
         return None
 
-    def get_valid_moves(self, piece):
-        #  returns all the valid moves for a given piece.
-        moves = {}
-        left = piece.col - 1
-        right = piece.col + 1
-        row = piece.row
 
-        if piece.color == HUMAN_KEY or piece.king:
-            moves.update(
-                self._traverse_left(row - 1, max(row - 3, -1), -1, piece.color, left)
-            )
-            moves.update(
-                self._traverse_right(row - 1, max(row - 3, -1), -1, piece.color, right)
-            )
-        if piece.color == AI_KEY or piece.king:
-            moves.update(
-                self._traverse_left(row + 1, min(row + 3, ROWS), 1, piece.color, left)
-            )
-            moves.update(
-                self._traverse_right(row + 1, min(row + 3, ROWS), 1, piece.color, right)
-            )
-
-        return moves
+# .........................................................................................................
 
-    def _traverse_left(self, start, stop, step, color, left, skipped=[]):
-        # is a helper method for get_valid_moves() that recursively traverses
-        #  the board to the left and returns all possible moves.
-        moves = {}
-        last = []
-        for r in range(start, stop, step):
-            if left < 0:
-                break
 
-            current = self.board[r][left]
-            if current == 0:
-                if skipped and not last:
-                    break
-                elif skipped:
-                    moves[(r, left)] = last + skipped
-                else:
-                    moves[(r, left)] = last
-
-                if last:
-                    if step == -1:
-                        row = max(r - 3, 0)
-                    else:
-                        row = min(r + 3, ROWS)
-                    moves.update(
-                        self._traverse_left(
-                            r + step, row, step, color, left - 1, skipped=last
-                        )
-                    )
-                    moves.update(
-                        self._traverse_right(
-                            r + step, row, step, color, left + 1, skipped=last
-                        )
-                    )
-                break
-            elif current.color == color:
-                break
-            else:
-                last = [current]
-
-            left -= 1
+# ............................................. AI player ..................................................
+class AIPlayer:
+    # Thinks about the AI's move in a background thread, so the window keeps drawing and
+    # answering while it searches.  The search watches a CancelToken: Space makes the AI
+    # play the best move it has found so far, a takeback or closing the window drops it.
+    def __init__(self, difficulty, cache=None):
+        self.difficulty = difficulty  # The node budget and handicaps of the chosen level
+        self.cache = cache  # Searches of earlier games, answered without searching again
+        self.token = None
+        self.thread = None
+        self.result = None  # (score, move) of the last finished search
+
+    def start(self, position):
+        # Start thinking about a copy of the position
+        self.token = CancelToken()
+        self.result = None
+        self.thread = threading.Thread(
+            target=self._think, args=(position.copy(), self.token), daemon=True
+        )
+        self.thread.start()
 
-        return moves
+    def _think(self, position, token):
+        self.result = choose_move(position, self.difficulty, token=token, cache=self.cache)
 
-    def _traverse_right(self, start, stop, step, color, right, skipped=[]):
-        #  is a helper method for get_valid_moves() that recursively traverses
-        # the board to the right and returns all possible moves.
-        moves = {}
-        last = []
-        for r in range(start, stop, step):
-            if right >= COLS:
-                break
+    def thinking(self):
+        return self.thread is not None and self.thread.is_alive()
 
-            current = self.board[r][right]
-            if current == 0:
-                if skipped and not last:
-                    break
-                elif skipped:
-                    moves[(r, right)] = last + skipped
-                else:
-                    moves[(r, right)] = last
-
-                if last:
-                    if step == -1:
-                        row = max(r - 3, 0)
-                    else:
-                        row = min(r + 3, ROWS)
-                    moves.update(
-                        self._traverse_left(
-                            r + step, row, step, color, right - 1, skipped=last
-                        )
-                    )
-                    moves.update(
-                        self._traverse_right(
-                            r + step, row, step, color, right + 1, skipped=last
-                        )
-                    )
-                break
-            elif current.color == color:
-                break
-            else:
-                last = [current]
+    def move_now(self):
+        # Cut the search short, it still finishes with the best move found so far
+        if self.token is not None:
+            self.token.cancel()
 
-            right += 1
+    def cancel(self):
+        # Stop the search and forget its move, after the position it searched has changed
+        self.move_now()
+        if self.thread is not None:
+            self.thread.join()
+        self.thread = None
+        self.result = None
 
-        return moves
+    def take_move(self):
+        # Return the move of a finished search once, None while there is none
+        if self.thread is None or self.thinking():
+            return None
+        self.thread = None
+        return self.result
 
 
-# .........................................................................................................
+# ............................................................................................................
 
 
 # ................................................. main ..................................................
 def HUMAN_main():
     run = True
     clock = pygame.time.Clock()
-    game = Game(WIN)
+    game = Game(WIN, THEMES[theme])
 
     # The game loop
     while run:
@@ -442,8 +612,10 @@ def HUMAN_main():
 
         # Check if the game has been won by the human player
         if game.human_board_winner() != None:
-            # Print the winner and wait for 2 seconds before quitting the game
-            print(game.human_board_winner())
+            # Save the game and wait for 2 seconds before quitting
+            game.save(
+                game.human_board_winner(), {"White": "Human 2", "Black": "Human 1"}
+            )
             run = False
             time.sleep(2)
             run = False
@@ -459,6 +631,16 @@ def HUMAN_main():
                 row, col = get_row_col_from_mouse(pos)
                 game.select(row, col)
 
+            # Left arrow / U takes back the last move, right arrow / R replays it, T
+            # switches to the next theme
+            if event.type == pygame.KEYDOWN:
+                if event.key in (pygame.K_LEFT, pygame.K_u):
+                    game.undo()
+                elif event.key in (pygame.K_RIGHT, pygame.K_r):
+                    game.redo()
+                elif event.key == pygame.K_t:
+                    game.next_theme()
+
         # Update the game board after each iteration of the game loop
         game.update()
 
@@ -470,18 +652,22 @@ def AI_main():
     # initialize variables and objects
     run = True
     clock = pygame.time.Clock()
-    game = Game(WIN)
+    game = Game(WIN, THEMES[theme])
+    # the cache loads the earlier sessions in the background, the game starts at once
+    cache = AnalysisCache(CACHE_FILE)
+    ai = AIPlayer(PROFILES[difficulty], cache)
 
     while run:
         # set FPS limit
         clock.tick(FPS)
 
-        # if it's the AI's turn, use minimax algorithm to find the best move
-        if game.turn == AI_KEY:
-            value, new_board = minimax(
-                game.get_board(), diff_depth, AI_KEY, game, -math.inf, math.inf
-            )
-            game.ai_move(new_board)
+        # if it's the AI's turn, search for its move in the background and play it once found
+        if game.turn == AI_KEY and game.ai_board_winner(game) is None:
+            result = ai.take_move()
+            if result is not None:
+                game.ai_move(result[1])
+            elif not ai.thinking():
+                ai.start(game.position)
 
         # check if the AI has won, and display appropriate message
         if game.ai_board_winner(game) != None:
@@ -498,6 +684,7 @@ def AI_main():
                 print("**********************************************************")
                 print("\nIt's a TIE!\n")
                 print("**********************************************************")
+            game.save(game.ai_board_winner(game))
             # wait for 2 seconds and exit the loop
             time.sleep(2)
             run = False
@@ -505,139 +692,176 @@ def AI_main():
         # check for user input events
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                ai.cancel()
                 run = False
             # if the user clicks on the board, select the corresponding square
-            if event.type == pygame.MOUSEBUTTONDOWN:
+            if event.type == pygame.MOUSEBUTTONDOWN and game.turn != AI_KEY:
                 pos = pygame.mouse.get_pos()
                 row, col = get_row_col_from_mouse(pos)
                 game.select(row, col)
+            # take back / replay the last move of each side so it stays the user's turn,
+            # Space makes the AI move now, T switches to the next theme
+            if event.type == pygame.KEYDOWN:
+                if event.key in (pygame.K_LEFT, pygame.K_u):
+                    ai.cancel()
+                    game.undo(2)
+                elif event.key in (pygame.K_RIGHT, pygame.K_r):
+                    ai.cancel()
+                    game.redo(2)
+                elif event.key == pygame.K_SPACE:
+                    ai.move_now()
+                elif event.key == pygame.K_t:
+                    game.next_theme()
 
         # update the display
         game.update()
 
-    # exit pygame
+    # save the searches not written yet and exit pygame
+    cache.close()
     pygame.quit()
 
 
-def get_row_col_from_mouse(pos):
-    # convert the mouse position to row and column indices
-    x, y = pos
-    row = y // SQUARE_SIZE
-    col = x // SQUARE_SIZE
-    return row, col
+# ............................................... replay ...................................................
+class ReplayLoader:
+    # Opens the index of a game archive in a background thread, building it first when the
+    # archive is new or has changed, so the window keeps drawing while a large archive is read
+    def __init__(self, archive):
+        self.archive = archive
+        self.size = os.path.getsize(archive) if os.path.exists(archive) else 0
+        self.read = 0  # Bytes of the archive indexed so far
+        self.index = None
+        self.error = None
+        self.cancel = threading.Event()  # Set to drop the build when the window is closed
+        self.thread = threading.Thread(target=self._load, daemon=True)
+        self.thread.start()
+
+    def _load(self):
+        try:
+            self.index = open_index(self.archive, self._progress, self.cancel)
+        except (OSError, ValueError) as error:
+            self.error = error
+
+    def _progress(self, read):
+        self.read = read
+
+    def done(self):
+        return not self.thread.is_alive()
+
+    def percent(self):
+        return 100 * self.read // self.size if self.size else 0
+
+
+def show_replay(game, replay, typed):
+    # Put the position of the replay on the board and describe it in the window caption
+    if replay.variant is VARIANT:
+        game.position = replay.position
+        game._sync()
+        where = "ply %d/%d" % (replay.ply, replay.plies)
+    else:
+        where = "a %s game, not shown on this board" % replay.variant.name
+    headers, result = replay.headers()
+    players = "%s - %s" % (headers.get("White", "?"), headers.get("Black", "?"))
+    caption = "Game %d/%d  %s  %s  %s" % (
+        replay.number + 1, len(replay), where, players, result
+    )
+    if typed:
+        caption += "  go to game %s" % typed
+    pygame.display.set_caption(caption)
 
 
-# ......................................................................................................................
+def replay_main(archive):
+    # Play through the games of an archive: left / right step a move, up / down change the
+    # game, Home / End go to the start / end of the game, a number and Enter go to that game
+    run = True
+    clock = pygame.time.Clock()
+    game = Game(WIN, THEMES[theme])
+    loader = ReplayLoader(archive)
+    replay = None
+    typed = ""  # Digits of a game number being typed
+    percent = None
 
+    while run:
+        clock.tick(FPS)
 
-# .................................................. algorithm ............................................................
-def minimax(position, depth, max_player, game, alpha, beta):
-    """
-    This function implements the minimax algorithm with alpha-beta pruning to find the best move
-    for a given player at a given depth.
-
-    Args:
-        position (Board): the current board state
-        depth (int): the current depth of the search
-        max_player (bool): True if the current player is the maximizing player, False if the current player is the minimizing player
-        game (Game): the current game object
-        alpha (int): the current alpha value for alpha-beta pruning
-        beta (int): the current beta value for alpha-beta pruning
-
-    Returns:
-        (int, Board): a tuple containing the score of the best move and the corresponding board state
-    """
-    if depth == 0 or position.ai_board_winner(game) != None:
-        # Base case: if we've reached the maximum depth or there's a winner, return the evaluation of the board state
-        return position.evaluate(), position
-
-    if max_player:
-        # If it's the maximizing player's turn
-        maxEval = -math.inf
-        best_move = None
-        for move in get_all_moves(position, AI_KEY, game):
-            # For each possible move, calculate the minimax score recursively
-            evaluation = minimax(move, depth - 1, False, game, alpha, beta)[0]
-
-            # If the evaluation is better than the current best evaluation, update the best evaluation and best move
-            if evaluation > maxEval:
-                maxEval = evaluation
-                best_move = move
-
-            # Update alpha value for alpha-beta pruning
-            alpha = max(alpha, maxEval)
-            if alpha >= beta:
-                # If alpha is greater than or equal to beta, pruning occurs and we break out of the loop
-                break
+        # The index is read or built in the background, show how far it is meanwhile
+        if replay is None:
+            if not loader.done():
+                if loader.percent() != percent:
+                    percent = loader.percent()
+                    pygame.display.set_caption("Indexing %s: %d%%" % (archive, percent))
+            elif loader.index is None or not len(loader.index):
+                print("Cannot replay %s: %s" % (archive, loader.error or "no games"))
+                run = False
+            else:
+                replay = Replay(loader.index, archive)
+                show_replay(game, replay, typed)
 
-        return maxEval, best_move
-    else:
-        # If it's the minimizing player's turn
-        minEval = math.inf
-        best_move = None
-        for move in get_all_moves(position, HUMAN_KEY, game):
-            # For each possible move, calculate the minimax score recursively
-            evaluation = minimax(move, depth - 1, True, game, alpha, beta)[0]
-
-            # If the evaluation is better than the current best evaluation, update the best evaluation and best move
-            if evaluation < minEval:
-                minEval = evaluation
-                best_move = move
-
-            # Update beta value for alpha-beta pruning
-            beta = min(beta, minEval)
-            if alpha >= beta:
-                # If alpha is greater than or equal to beta, pruning occurs and we break out of the loop
-                break
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                loader.cancel.set()
+                run = False
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_t:
+                    game.next_theme()
+                if replay is None:
+                    continue
+                if event.key == pygame.K_RIGHT:
+                    replay.forward()
+                elif event.key == pygame.K_LEFT:
+                    replay.back()
+                elif event.key == pygame.K_DOWN:
+                    replay.goto(replay.number + 1)
+                elif event.key == pygame.K_UP:
+                    replay.goto(replay.number - 1)
+                elif event.key == pygame.K_HOME:
+                    replay.goto(replay.number, 0)
+                elif event.key == pygame.K_END:
+                    replay.goto(replay.number, replay.plies)
+                elif event.unicode.isdigit():
+                    typed += event.unicode
+                elif event.key == pygame.K_BACKSPACE:
+                    typed = typed[:-1]
+                elif event.key in (pygame.K_RETURN, pygame.K_KP_ENTER) and typed:
+                    replay.goto(int(typed) - 1)
+                    typed = ""
+                show_replay(game, replay, typed)
 
-        return minEval, best_move
+        game.update()
 
+    pygame.quit()
 
-def simulate_move(piece, move, board, game, skip):
-    """
-    This function simulates a move on a copy of the board, given a piece and a move.
 
-    Args:
-        piece (Piece): the piece to move
-        move (tuple): the coordinates of the move
-        board (Board): the current board state
-        game (Game): the current game object
-        skip (Piece): the piece to remove (if any)
+def replay_argument():
+    # The archive of "python main.py --replay [FILE]", None to play a game instead
+    if "--replay" not in sys.argv:
+        return None
+    rest = sys.argv[sys.argv.index("--replay") + 1:]
+    return rest[0] if rest and not rest[0].startswith("--") else GAMES_FILE
 
-    Returns:
-        Board: the board state after the move has been made
-    """
-    board.move(piece, move[0], move[1])  # move the piece on the copy of the board
-    if skip:
-        board.remove(skip)  # if there's a piece to remove, remove it
 
-    return board
+# ......................................................................................................................
 
 
-def get_all_moves(board, color, game):
-    moves = []
+def get_row_col_from_mouse(pos):
+    # convert the mouse position to row and column indices
+    x, y = pos
+    row = y // SQUARE_SIZE
+    col = x // SQUARE_SIZE
+    return row, col
 
-    # Loop through all pieces of the given color
-    for piece in board.get_all_pieces(color):
-        # Get all valid moves for the current piece
-        valid_moves = board.get_valid_moves(piece)
-        # Loop through all valid moves for the current piece
-        for move, skip in valid_moves.items():
-            # Create a copy of the board and the piece
-            temp_board = deepcopy(board)
-            temp_piece = temp_board.get_piece(piece.row, piece.col)
-            # Simulate the move on the copy of the board and append it to the list of moves
-            new_board = simulate_move(temp_piece, move, temp_board, game, skip)
-            moves.append(new_board)
 
-    return moves
+# ......................................................................................................................
 
 
+# .................................................. algorithm ............................................................
 def draw_moves(game, board, piece):
-    valid_moves = board.get_valid_moves(piece)
-    board.draw(game.win)
+    valid_moves = game.legal_moves().get(row_col_to_square(piece.row, piece.col), [])
+    cache = game.cache
+    board.draw(game.win, cache)
     pygame.draw.circle(game.win, (0, 255, 0), (piece.x, piece.y), 50, 5)
-    game.draw_valid_moves(valid_moves.keys())
+    game.draw_valid_moves(
+        (square_to_row_col(move_to(move)) for move in valid_moves), cache
+    )
     pygame.display.update()
 
 
@@ -768,7 +992,7 @@ class main_window(customtkinter.CTk):
         # Create label for difficulty level
         combobox_1 = customtkinter.CTkComboBox(
             self,
-            values=["Easy", "Medium", "Impossible"],
+            values=list(PROFILES),
             variable=self.combobox_var_1,
             justify="center",
             corner_radius=10,
@@ -797,7 +1021,7 @@ class main_window(customtkinter.CTk):
 
         combobox_2 = customtkinter.CTkComboBox(
             self,
-            values=["Default", "Mint", "Dracula"],
+            values=list(THEMES),
             variable=self.combobox_var_2,
             justify="center",
             corner_radius=10,
@@ -809,52 +1033,22 @@ class main_window(customtkinter.CTk):
             row=12,
             column=0,
         )
-        image_default = customtkinter.CTkImage(
-            dark_image=Image.open(resource_path("assets\\default.png")), size=(125, 125)
-        )
-        button1 = customtkinter.CTkButton(
-            self,
-            text="",
-            image=image_default,
-            corner_radius=5,
-            fg_color="transparent",
-            hover_color="#3CB043",
-            anchor="left",
-            compound="left",
-            command=lambda: self.set_combobox(combobox_2, "Default"),
-        )
-
-        button1.grid(row=13, column=0)
-        image_mint = customtkinter.CTkImage(
-            dark_image=Image.open(resource_path("assets\\mint.png")), size=(125, 125)
-        )
-        button2 = customtkinter.CTkButton(
-            self,
-            text="",
-            image=image_mint,
-            corner_radius=5,
-            fg_color="transparent",
-            hover_color="#3CB043",
-            anchor="left",
-            compound="left",
-            command=lambda: self.set_combobox(combobox_2, "Mint"),
-        )
-        button2.grid(row=14, column=0)
-        image_dracula = customtkinter.CTkImage(
-            dark_image=Image.open(resource_path("assets\\dracula.png")), size=(125, 125)
-        )
-        button3 = customtkinter.CTkButton(
-            self,
-            text="",
-            image=image_dracula,
-            corner_radius=5,
-            fg_color="transparent",
-            anchor="left",
-            hover_color="#3CB043",
-            compound="left",
-            command=lambda: self.set_combobox(combobox_2, "Dracula"),
-        )
-        button3.grid(row=15, column=0)
+        # one button per theme of checkers/themes.json, showing assets\<name>.png once the
+        # menu is on screen (see load_theme_images), or the theme's name if it has none
+        self.theme_buttons = {}
+        for row, name in enumerate(THEMES, 13):
+            button = customtkinter.CTkButton(
+                self,
+                text=name,
+                corner_radius=5,
+                fg_color="transparent",
+                hover_color="#3CB043",
+                anchor="left",
+                compound="left",
+                command=lambda name=name: self.set_combobox(combobox_2, name),
+            )
+            button.grid(row=row, column=0)
+            self.theme_buttons[name] = button
 
         play_button = customtkinter.CTkButton(
             master=self,
@@ -870,6 +1064,26 @@ class main_window(customtkinter.CTk):
         )
         play_button.grid(row=15, column=13, padx=20, pady=10)
 
+    def menu_shown(self):
+        # called once the menu has been drawn and reacts to the user
+        timer.mark("show menu")
+        self.after(1, self.load_theme_images)
+
+    def load_theme_images(self):
+        # puts the theme pictures on their buttons, shrunk to the size they are shown at
+        from PIL import Image
+
+        for name, button in self.theme_buttons.items():
+            path = resource_path("assets\\%s.png" % name.lower())
+            if not os.path.exists(path):
+                continue  # a theme added to themes.json without a picture keeps its name
+            image = Image.open(path)
+            image.thumbnail((250, 250))  # twice the shown size for high-DPI scaling
+            button.configure(
+                text="", image=customtkinter.CTkImage(dark_image=image, size=(125, 125))
+            )
+        timer.mark("load theme images")
+
     def set_combobox(self, combobox_2, value):
         self.combobox_var_2.set(value)
 
@@ -893,60 +1107,39 @@ class main_window(customtkinter.CTk):
 
 # .................................................. driver program.......................................
 
-# Create a main window instance and run the Tkinter main loop
-app = main_window()
-app.mainloop()
-
-# Get user's selections for game settings
-chance = app.radiobutton_event()
-difficulty = app.combobox_var_1.get()
-theme = app.combobox_var_2.get()
-
-# Setting difficulty based on user's selection
-if difficulty == "Easy":
-    diff_depth = 2
-elif difficulty == "Medium":
-    diff_depth = 3
-elif difficulty == "Impossible":
-    diff_depth = 4
-
-# Setting theme based on user's selection
-if theme == "Default":
-    from checkers.constants_default import (
-        AI_KEY,
-        HUMAN_KEY,
-        GREY,
-        VALID_DOT,
-        BACK_COLOR_1,
-        BACK_COLOR_2,
-    )
-elif theme == "Mint":
-    from checkers.constants_mint import (
-        AI_KEY,
-        HUMAN_KEY,
-        GREY,
-        VALID_DOT,
-        BACK_COLOR_1,
-        BACK_COLOR_2,
-    )
-elif theme == "Dracula":
-    from checkers.constants_dracula import (
-        AI_KEY,
-        HUMAN_KEY,
-        GREY,
-        VALID_DOT,
-        BACK_COLOR_1,
-        BACK_COLOR_2,
-    )
-
-# Create a Pygame window and set caption
+# python main.py --replay [FILE] opens the replay of a game archive instead of the menu
+REPLAY_FILE = replay_argument()
+if REPLAY_FILE is None:
+    # Create a main window instance and run the Tkinter main loop
+    register_fonts()
+    timer.mark("register fonts")
+    app = main_window()
+    timer.mark("build menu")
+    app.after_idle(app.menu_shown)
+    app.mainloop()
+    timer.mark("menu open until Play")
+
+    # Get user's selections for game settings
+    chance = app.radiobutton_event()
+    difficulty = app.combobox_var_1.get()
+    theme = app.combobox_var_2.get()
+else:
+    chance = 3
+    theme = next(iter(THEMES))
+
+# Load what only the game needs, then create a Pygame window and set caption
+load_game_assets()
 WIN = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("Ultimate Checkers")
+timer.mark("open game window")
+timer.report()
 
 # Start the game with the appropriate mode based on user's selection
 if chance == 1:
     HUMAN_main()
 elif chance == 2:
     AI_main()
+elif chance == 3:
+    replay_main(REPLAY_FILE)
 
 # .........................................................................................................................
@@ -0,0 +1,31 @@
+import random
+import unittest
+from checkers.difficulty import Difficulty, DifficultySearch
+from checkers.engine import Position, generate_moves, make_move
+
+
+class CandidatesTest(unittest.TestCase):
+    def test_best_move_and_candidates_come_from_one_iteration(self):
+        # node budgets that stop most searches in the middle of an iteration
+        rng = random.Random(3)
+        for game in range(4):
+            position = Position()
+            for _ in range(rng.randrange(20)):
+                moves = generate_moves(position, position.turn)
+                if not moves:
+                    break
+                make_move(position, rng.choice(moves))
+            position.undo_stack = []
+            for nodes in range(100, 3000, 111):
+                difficulty = Difficulty("Test", nodes=nodes, noise=0.35, margin=0.25)
+                search = DifficultySearch(position.copy(), difficulty, seed=game)
+                score, move, pv = search.run()
+                self.assertEqual(score, search.stats.iterations[-1]["score"])
+                self.assertIn((score, move), search.candidates)
+                self.assertEqual(score, max(search.candidates)[0])
+                search = DifficultySearch(position.copy(), difficulty, seed=game)
+                self.assertIn(search.choose(random.Random(nodes)), search.candidates)
+
+
+if __name__ == "__main__":
+    unittest.main()
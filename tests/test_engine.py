@@ -0,0 +1,135 @@
+import random
+import unittest
+from checkers.engine import (
+    DRAW,
+    INTERNATIONAL,
+    Position,
+    generate_moves,
+    is_draw,
+    make_move,
+    move_from_text,
+    position_from_fen,
+    position_to_fen,
+    repetitions,
+    unmake_move,
+    winner,
+)
+from checkers.perft import INTERNATIONAL_PERFT, perft
+from checkers.search import Search, SearchLimits
+
+
+def state(position):
+    return (list(position.pieces), position.kings, position.turn, position.hash,
+            position.quiet_plies, len(position.history))
+
+
+def random_game(position, rng, plies=120):
+    # plays random moves until the game ends or plies run out; returns the moves played
+    moves = []
+    while len(moves) < plies and winner(position) is None:
+        move = rng.choice(generate_moves(position, position.turn))
+        make_move(position, move)
+        moves.append(move)
+    return moves
+
+
+class MakeUnmakeTest(unittest.TestCase):
+    def test_unmake_restores_every_move(self):
+        rng = random.Random(1)
+        for _ in range(20):
+            position = Position()
+            while winner(position) is None and len(position.undo_stack) < 120:
+                before = state(position)
+                for move in generate_moves(position, position.turn):
+                    make_move(position, move)
+                    unmake_move(position)
+                    self.assertEqual(state(position), before)
+                make_move(position, rng.choice(generate_moves(position, position.turn)))
+
+    def test_unmake_whole_game(self):
+        rng = random.Random(2)
+        position = Position()
+        start = state(position)
+        moves = random_game(position, rng)
+        for _ in moves:
+            unmake_move(position)
+        self.assertEqual(state(position), start)
+
+    def test_perft(self):
+        # the rules of the window, where a capture is not compulsory
+        position = Position()
+        self.assertEqual([perft(position, depth) for depth in range(1, 5)],
+                         [7, 49, 379, 2872])
+
+
+class InternationalTest(unittest.TestCase):
+    def test_perft(self):
+        position = Position(variant=INTERNATIONAL)
+        for depth in range(1, 6):
+            self.assertEqual(perft(position, depth), INTERNATIONAL_PERFT[depth])
+
+    def test_unmake_restores_every_move(self):
+        rng = random.Random(3)
+        for _ in range(5):
+            position = Position(variant=INTERNATIONAL)
+            while winner(position) is None and len(position.undo_stack) < 150:
+                before = state(position)
+                for move in generate_moves(position, position.turn):
+                    make_move(position, move)
+                    unmake_move(position)
+                    self.assertEqual(state(position), before)
+                make_move(position, rng.choice(generate_moves(position, position.turn)))
+
+
+def play(position, *texts):
+    for text in texts:
+        make_move(position, move_from_text(position, text))
+
+
+class DrawTest(unittest.TestCase):
+    SHUFFLE = ("32-27", "1-5", "27-32", "5-1")  # two kings going back and forth
+
+    def test_hash_follows_the_moves(self):
+        rng = random.Random(4)
+        for variant in (Position().variant, INTERNATIONAL):
+            position = Position(variant=variant)
+            while winner(position) is None and len(position.undo_stack) < 150:
+                make_move(position, rng.choice(generate_moves(position, position.turn)))
+                incremental = position.hash
+                position.rehash()
+                self.assertEqual(position.hash, incremental)
+
+    def test_threefold_repetition(self):
+        position = position_from_fen("B:WK1:BK32")
+        play(position, *self.SHUFFLE)
+        self.assertEqual(repetitions(position), 1)
+        self.assertIsNone(winner(position))
+        play(position, *self.SHUFFLE)
+        self.assertEqual(repetitions(position), 2)
+        self.assertEqual(winner(position), DRAW)
+        unmake_move(position)
+        self.assertFalse(is_draw(position))
+
+    def test_plies_without_progress(self):
+        for variant, plies in ((Position().variant, 80), (INTERNATIONAL, 50)):
+            self.assertEqual(variant.draw_plies, plies)
+        position = position_from_fen("B:WK1:BK32,22")
+        position.quiet_plies = 79
+        play(position, "32-27")  # a king move
+        self.assertEqual(position.quiet_plies, 80)
+        self.assertEqual(winner(position), DRAW)
+        unmake_move(position)
+        play(position, "22-18")  # a man move starts the count again
+        self.assertEqual(position.quiet_plies, 0)
+        self.assertIsNone(winner(position))
+
+    def test_search_scores_a_repetition_as_a_draw(self):
+        # one king against two loses, unless it can steer into a position seen twice
+        position = position_from_fen("B:WK1:BK32,K28")
+        play(position, *self.SHUFFLE, *self.SHUFFLE[:3])
+        without_history = position_from_fen(position_to_fen(position))
+        self.assertLess(Search(without_history, SearchLimits(depth=6)).run()[0], 0)
+        self.assertEqual(Search(position, SearchLimits(depth=6)).run()[0], 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import random
+import unittest
+from checkers.engine import (
+    INTERNATIONAL,
+    Position,
+    generate_moves,
+    make_move,
+    unmake_move,
+    winner,
+)
+from checkers.nnue import KINDS, Network
+from checkers.search import Search, SearchLimits
+
+
+def random_network(variant, rng, hidden=8):
+    inputs = KINDS * variant.squares
+    return Network(
+        variant,
+        [[rng.uniform(-0.5, 0.5) for _ in range(hidden)] for _ in range(inputs)],
+        [rng.uniform(-0.5, 0.5) for _ in range(hidden)],
+        [rng.uniform(-1, 1) for _ in range(hidden)],
+        0.1,
+    )
+
+
+class AccumulatorTest(unittest.TestCase):
+    def test_follows_make_and_unmake(self):
+        rng = random.Random(5)
+        for variant in (Position().variant, INTERNATIONAL):
+            network = random_network(variant, rng)
+            position = Position(variant=variant)
+            network.attach(position)
+            accumulator = position.accumulator
+            while winner(position) is None and len(position.undo_stack) < 150:
+                for move in generate_moves(position, position.turn):
+                    make_move(position, move)
+                    self.assertEqual(accumulator.value, network.refresh(position))
+                    unmake_move(position)
+                    self.assertEqual(accumulator.value, network.refresh(position))
+                make_move(position, rng.choice(generate_moves(position, position.turn)))
+            while position.undo_stack:
+                unmake_move(position)
+                self.assertEqual(accumulator.value, network.refresh(position))
+            self.assertEqual(accumulator.stack, [])
+
+    def test_search_detaches_the_accumulator(self):
+        position = Position()
+        network = random_network(position.variant, random.Random(6))
+        Search(position, SearchLimits(depth=4), network=network).run()
+        self.assertIsNone(position.accumulator)
+        self.assertEqual(position.undo_stack, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
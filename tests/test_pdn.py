@@ -0,0 +1,46 @@
+import io
+import unittest
+from checkers.engine import AI, CHECKERS, position_from_fen, position_to_fen
+from checkers.pdn import format_game, read_games, rotate_fen
+
+# The Single Corner opening as English databases write it: Black moves first from 1-12
+STANDARD = """[Event "Standard numbering"]
+[Black "Black"]
+[White "White"]
+[Result "2-0"]
+
+1. 11-15 22-18 2. 15x22 25x18 3. 8-11 29-25 4. 4-8 25-22 2-0
+"""
+
+
+class PdnNumberingTest(unittest.TestCase):
+    def test_reads_standard_notation(self):
+        game = next(read_games(io.StringIO(STANDARD)))
+        position = game.final_position()
+        self.assertEqual(len(position.undo_stack), 8)
+        # Black's men start on 1-12 of the PDN board, the engine's 21-32
+        self.assertEqual(game.moves[0], "22-18")
+
+    def test_round_trip(self):
+        game = next(read_games(io.StringIO(STANDARD)))
+        moves = [move for _, move in game.positions()]
+        text = format_game(moves, AI)
+        self.assertIn("1. 11-15 22-18 2. 15x22 25x18 3. 8-11 29-25 4. 4-8 25-22 2-0", text)
+        again = next(read_games(io.StringIO(text)))
+        self.assertEqual(again.moves, game.moves)
+        self.assertEqual(again.result, "2-0")
+
+    def test_round_trip_from_fen(self):
+        # a Black king on PDN square 14 is on engine square 19
+        fen = "B:W18,21-32:B1-12,K14"
+        self.assertEqual(rotate_fen(fen), "B:W15,1-12:B21-32,K19")
+        self.assertEqual(rotate_fen(rotate_fen(fen)), fen)
+        start = rotate_fen(fen)
+        text = format_game([], None, start_fen=start, variant=CHECKERS)
+        self.assertIn('[FEN "%s"]' % fen, text)
+        position = next(read_games(io.StringIO(text))).start_position()
+        self.assertEqual(position_to_fen(position), position_to_fen(position_from_fen(start)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+from checkers.engine import move_to_text, position_from_fen, position_to_fen
+from checkers.search import Search, SearchLimits
+from checkers.tt import TranspositionTable
+
+# Depth 12 scores 21-17 at -2.0, then depth 13 refutes 21-17 on its first search while the
+# other move, 22-18, still holds at -2.0
+POSITION = "B:W1,2,3:B21,22"
+
+
+class NodeLimitTest(unittest.TestCase):
+    def test_stopped_iteration_keeps_the_completed_result(self):
+        for nodes in (16000, 17000, 18000):
+            position = position_from_fen(POSITION)
+            search = Search(position, SearchLimits(nodes=nodes), tt=TranspositionTable(16))
+            score, move, pv = search.run()
+            last = search.stats.iterations[-1]
+            self.assertEqual(last["depth"], 12)
+            self.assertEqual(score, last["score"])
+            self.assertEqual(move_to_text(move), move_to_text(pv[0]))
+            self.assertEqual(position_to_fen(position), POSITION)
+
+    def test_stops_near_the_node_limit(self):
+        search = Search(position_from_fen(POSITION), SearchLimits(nodes=5000))
+        score, move, pv = search.run()
+        self.assertLessEqual(search.nodes, 5000)
+        self.assertEqual(score, search.stats.iterations[-1]["score"])
+
+
+if __name__ == "__main__":
+    unittest.main()
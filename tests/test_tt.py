@@ -0,0 +1,53 @@
+import unittest
+from checkers.engine import make_move, position_from_fen
+from checkers.search import WIN_SCORE, Search, SearchLimits
+from checkers.tt import EXACT, LOWER, UPPER, TranspositionTable
+
+
+class TranspositionTableTest(unittest.TestCase):
+    def test_store_and_probe(self):
+        tt = TranspositionTable(1)
+        key = 0x123456789ABCDEF0
+        for depth, bound, score, move in ((5, EXACT, -1.25, 9 | 14 << 6),
+                                          (255, LOWER, 988.0, 0),
+                                          (0, UPPER, -0.001, None)):
+            tt.store(key, depth, bound, score, move)
+            self.assertEqual(tt.probe(key), (depth, bound, score, move))
+        self.assertIsNone(tt.probe(key ^ 1))
+
+    def test_move_keeps_origin_and_destination(self):
+        tt = TranspositionTable(1)
+        tt.store(7, 3, EXACT, 0.0, 9 | 18 << 6 | 1 << 13 << 12)  # a capture
+        self.assertEqual(tt.probe(7)[3], 9 | 18 << 6)
+
+    def test_replacement_keeps_the_deeper_entry(self):
+        tt = TranspositionTable(1)
+        first = 1
+        other = first + tt.buckets  # same bucket
+        tt.store(first, 8, EXACT, 1.0)
+        tt.store(other, 2, EXACT, 2.0)
+        self.assertEqual(tt.probe(first)[0], 8)
+        self.assertEqual(tt.probe(other)[0], 2)
+        third = first + 2 * tt.buckets
+        tt.store(third, 1, EXACT, 3.0)  # replaces the shallow entry only
+        self.assertIsNotNone(tt.probe(first))
+        self.assertIsNone(tt.probe(other))
+        tt.new_search()
+        tt.store(other, 1, EXACT, 2.0)  # a stale deep entry is replaced
+        self.assertIsNone(tt.probe(first))
+
+    def test_mate_scores_count_from_the_position(self):
+        # the winning side mates in 5 plies; after its first move, in 4, also when the
+        # second search reads the entries the first stored at other plies
+        tt = TranspositionTable(1)
+        position = position_from_fen("B:W1:B21,22")
+        score, move, pv = Search(position, SearchLimits(depth=8), tt=tt).run()
+        self.assertEqual(score, WIN_SCORE - 5)
+        make_move(position, move)
+        score, move, pv = Search(position, SearchLimits(depth=8), tt=tt).run()
+        self.assertEqual(score, -(WIN_SCORE - 4))
+        self.assertEqual(len(pv), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()